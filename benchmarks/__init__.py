@@ -0,0 +1 @@
+"""Benchmarks of Tidi's overhead, run each with `python -m benchmarks.<name>`."""
@@ -0,0 +1,50 @@
+"""Runs all of the benchmarks & writes their results as JSON.
+
+Run with `python -m benchmarks [--output results.json]`, then compare the
+files written for different versions of Tidi.
+"""
+
+import argparse
+import dataclasses
+import json
+import platform
+import sys
+
+import tidi
+from benchmarks import injection, registry_threads
+
+SUITES = {
+    "injection": injection.run,
+    "registry_threads": registry_threads.run,
+}
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__)
+    parser.add_argument("--output", "-o", help="file to write the JSON to, stdout if not given")
+    parser.add_argument(
+        "--suite", action="append", choices=SUITES, help="only run the given suite(s)"
+    )
+    args = parser.parse_args(argv)
+
+    results: list[dict] = []
+    for name in args.suite or SUITES:
+        print(f"running {name}...", file=sys.stderr)
+        results.extend(dataclasses.asdict(result) for result in SUITES[name]())
+    report = {
+        "tidi_version": tidi.__version__,
+        "python_version": platform.python_version(),
+        "python_implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output is None:
+        print(output)
+    else:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""The per-call overhead of `tidi.inject`, & of `tidi.field_factory`.
+
+Run with `python -m benchmarks.injection`.
+"""
+
+import contextlib
+import typing as t
+from dataclasses import dataclass, field
+
+from benchmarks.timing import Result, ns_per_call
+from tidi import decorator, registry, resolver
+
+PARAM_COUNTS = (1, 2, 4, 8)
+REGISTRY_OPTIONS = resolver.ResolverOptions(use_registry=True, initialise_missing=True)
+
+
+class Dep:
+    ...
+
+
+InjectedDep = t.Annotated[Dep, REGISTRY_OPTIONS]
+
+
+def provide_dep() -> Dep:
+    return Dep()
+
+
+@contextlib.contextmanager
+def provide_dep_from_context_manager() -> t.Iterator[Dep]:
+    yield Dep()
+
+
+def _registry_with_deps(*types: type) -> registry.TidiRegistry:
+    tidi_registry = registry.TidiRegistry(container_cls=registry.SharedContainer)
+    tidi_registry.register_many({type_: type_() for type_ in types})
+    return tidi_registry
+
+
+def bench_inject_overhead() -> list[Result]:
+    """A call to an injected function vs a direct call, with the dependency registered."""
+    inject = decorator.inject(registry=_registry_with_deps(Dep))
+
+    def direct(dep: Dep = Dep()) -> Dep:
+        return dep
+
+    @inject
+    def injected(dep: InjectedDep = decorator.UNSET) -> Dep:
+        return dep
+
+    return [
+        Result("inject_overhead", {"call": "direct"}, ns_per_call(direct), "ns/call"),
+        Result("inject_overhead", {"call": "injected"}, ns_per_call(injected), "ns/call"),
+    ]
+
+
+def bench_param_scaling() -> list[Result]:
+    """How the cost of a call grows with the number of injected parameters."""
+    types = [type(f"Dep{i}", (), {}) for i in range(max(PARAM_COUNTS))]
+    inject = decorator.inject(registry=_registry_with_deps(*types))
+    results = []
+    for num_params in PARAM_COUNTS:
+        namespace: dict[str, t.Any] = {
+            "Annotated": t.Annotated,
+            "options": REGISTRY_OPTIONS,
+            "types": types,
+            "UNSET": decorator.UNSET,
+        }
+        params = ", ".join(
+            f"dep_{i}: Annotated[types[{i}], options] = UNSET" for i in range(num_params)
+        )
+        exec(f"def injected({params}):\n    return None", namespace)
+        injected = inject(namespace["injected"])
+        results.append(
+            Result("param_scaling", {"num_params": num_params}, ns_per_call(injected), "ns/call")
+        )
+    return results
+
+
+def bench_registry_hit_vs_initialise() -> list[Result]:
+    """A dependency found in the registry vs one initialised because it's missing."""
+    registered = decorator.inject(registry=_registry_with_deps(Dep))
+    missing = decorator.inject(registry=registry.TidiRegistry())
+
+    def func(dep: InjectedDep = decorator.UNSET) -> Dep:
+        return dep
+
+    return [
+        Result("registry", {"found": "registered"}, ns_per_call(registered(func)), "ns/call"),
+        Result("registry", {"found": "initialised"}, ns_per_call(missing(func)), "ns/call"),
+    ]
+
+
+def bench_providers() -> list[Result]:
+    """A dependency from a plain function provider vs from a context manager."""
+    inject = decorator.inject(registry=None)
+    options = resolver.ResolverOptions(use_registry=False, initialise_missing=True)
+
+    @inject
+    def from_function(
+        dep: t.Annotated[Dep, options] = decorator.Provider(provide_dep),
+    ) -> Dep:
+        return dep
+
+    @inject
+    def from_context_manager(
+        dep: t.Annotated[Dep, options] = decorator.Provider[Dep](provide_dep_from_context_manager),
+    ) -> Dep:
+        return dep
+
+    return [
+        Result("provider", {"kind": "function"}, ns_per_call(from_function), "ns/call"),
+        Result(
+            "provider", {"kind": "context_manager"}, ns_per_call(from_context_manager), "ns/call"
+        ),
+    ]
+
+
+def bench_field_factory() -> list[Result]:
+    """Constructing a dataclass with an injected field vs a plain default factory."""
+    import tidi
+
+    tidi.register(Dep())
+
+    @dataclass
+    class Plain:
+        dep: Dep = field(default_factory=Dep)
+
+    @dataclass
+    class WithFieldFactory:
+        dep: Dep = field(default_factory=tidi.field_factory(Dep))
+
+    return [
+        Result("field_factory", {"factory": "plain"}, ns_per_call(Plain), "ns/call"),
+        Result("field_factory", {"factory": "tidi"}, ns_per_call(WithFieldFactory), "ns/call"),
+    ]
+
+
+BENCHMARKS = (
+    bench_inject_overhead,
+    bench_param_scaling,
+    bench_registry_hit_vs_initialise,
+    bench_providers,
+    bench_field_factory,
+)
+
+
+def run() -> list[Result]:
+    return [result for benchmark in BENCHMARKS for result in benchmark()]
+
+
+if __name__ == "__main__":
+    for result in run():
+        print(result)
@@ -0,0 +1,69 @@
+"""How `TidiRegistry.get` throughput scales with the number of reading threads.
+
+Compares the registry's containers, run with `python -m benchmarks.registry_threads`.
+"""
+
+import threading
+import time
+import typing as t
+
+from benchmarks.timing import Result
+from tidi import registry
+
+READS_PER_THREAD = 200_000
+THREAD_COUNTS = (1, 2, 4, 8)
+
+
+class Dep:
+    ...
+
+
+def time_reads(
+    container_cls: t.Type[registry._Container], num_threads: int, reads: int = READS_PER_THREAD
+) -> float:
+    """Returns the reads per second across `num_threads` threads reading concurrently."""
+    tidi_registry = registry.TidiRegistry(container_cls=container_cls)
+    barrier = threading.Barrier(num_threads + 1)
+
+    def read():
+        if container_cls is registry._PerThreadContainer:
+            tidi_registry.register(Dep())  # otherwise the thread can't see it
+        get = tidi_registry.get
+        barrier.wait()
+        for _ in range(reads):
+            get(Dep)
+        barrier.wait()
+
+    tidi_registry.register(Dep())
+    threads = [threading.Thread(target=read) for _ in range(num_threads)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    barrier.wait()
+    elapsed = time.perf_counter() - start
+    for thread in threads:
+        thread.join()
+    return num_threads * reads / elapsed
+
+
+def run() -> list[Result]:
+    containers: tuple[t.Type[registry._Container], ...] = (
+        registry._PerThreadContainer,
+        registry.SharedContainer,
+    )
+    return [
+        Result(
+            "registry_threads",
+            {"container": container_cls.__name__, "num_threads": num_threads},
+            time_reads(container_cls, num_threads),
+            "reads/s",
+        )
+        for container_cls in containers
+        for num_threads in THREAD_COUNTS
+    ]
+
+
+if __name__ == "__main__":
+    for result in run():
+        print(result)
@@ -0,0 +1,30 @@
+"""Helpers shared by the benchmarks."""
+
+import dataclasses
+import timeit
+import typing as t
+
+
+@dataclasses.dataclass(frozen=True)
+class Result:
+    """The outcome of one benchmark.
+
+    Args:
+        name (str): what was benchmarked, e.g. `inject_overhead`.
+        params (dict[str, typing.Any]): the variant of the benchmark, e.g. `{"num_params": 4}`.
+        value (float): the measurement.
+        unit (str): the unit of `value`, e.g. `ns/call`.
+    """
+
+    name: str
+    params: dict[str, t.Any]
+    value: float
+    unit: str
+
+
+def ns_per_call(func: t.Callable[[], t.Any], repeat: int = 5, min_time: float = 0.2) -> float:
+    """The fastest time of `repeat` runs of `func`, in nanoseconds per call."""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    number = max(number, int(number * min_time / 0.2))
+    return min(timer.repeat(repeat=repeat, number=number)) / number * 1e9
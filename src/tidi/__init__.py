@@ -1,7 +1,9 @@
 """A tiny dependecy injection library."""
+import concurrent.futures
+import dataclasses
 import typing as t
 
-from tidi import decorator, registry, resolver
+from tidi import decorator, keys, lazy, metrics, middleware, pools, registry, resolver, scopes
 
 __version__ = "0.3.0"
 
@@ -11,26 +13,131 @@ T = t.TypeVar("T")
 Unset = decorator.Unset
 UNSET = decorator.UNSET
 Provider = decorator.Provider
+Scope = scopes.Scope
+Pool = pools.Pool
+AsyncPool = pools.AsyncPool
 DEFAULT_RESOLVER_OPTIONS = resolver.ResolverOptions(use_registry=True, initialise_missing=True)
 
 Injected = t.Annotated[T | Unset | Provider, DEFAULT_RESOLVER_OPTIONS]
+Lazy = t.Annotated[T | Unset | Provider, DEFAULT_RESOLVER_OPTIONS, lazy.LAZY]
 
 
 default_tidi_registry = registry.TidiRegistry()
 register = default_tidi_registry.register
 inject = decorator.inject(registry=default_tidi_registry)
+active_registry = registry.ActiveRegistry(default_tidi_registry)
+inject_active = decorator.inject(registry=active_registry)
+preflight = decorator.preflight
+release = decorator.release
+request_scope = scopes.request_scope
+async_request_scope = scopes.async_request_scope
+stats = metrics.stats
+
+
+def shutdown() -> None:
+    """Tears down all `Scope.SINGLETON` & `Scope.THREAD` dependencies.
+
+    Any context managers they were provided by are exited, and they'll be
+    created again the next time they're needed.
+    """
+    scopes.default_instances.close()
+
+
+async def shutdown_async() -> None:
+    """Like `shutdown`, but also exits async context managers."""
+    await scopes.default_instances.aclose()
+
+
+def initialise_worker(snapshot: registry.RegistrySnapshot) -> None:
+    """Rebuilds the default registry from a snapshot, once per worker process.
+
+    Give it as the `initializer` of a `concurrent.futures.ProcessPoolExecutor`,
+    with the snapshot as its `initargs`, or use `process_pool`.
+    """
+    snapshot.restore(default_tidi_registry)
+
+
+def process_pool(
+    max_workers: int | None = None,
+    snapshot: registry.RegistrySnapshot | None = None,
+    **kwargs: t.Any,
+) -> concurrent.futures.ProcessPoolExecutor:
+    """A `concurrent.futures.ProcessPoolExecutor` whose workers start with the registry.
+
+    Module level injected functions can be submitted to it like any other, and
+    resolve their dependencies from a copy of the default registry, rebuilt
+    once when each worker process starts.
+
+    Args:
+        max_workers (int | None, optional): the most worker processes. Defaults to
+            None, the number of CPUs.
+        snapshot (tidi.registry.RegistrySnapshot | None, optional): the registrations
+            to give the workers, e.g. with factories for unpicklable ones. Defaults
+            to a snapshot of what the default registry has now.
+        **kwargs (typing.Any): passed on to `ProcessPoolExecutor`, e.g. `mp_context`.
+
+    Returns:
+        (concurrent.futures.ProcessPoolExecutor): the executor.
+
+    Examples:
+        >>> snapshot = tidi.default_tidi_registry.snapshot(factories={DBConn: connect})
+        >>> with tidi.process_pool(snapshot=snapshot) as executor:
+        ...     results = list(executor.map(score_record, records, chunksize=1000))
+    """
+    if snapshot is None:
+        snapshot = default_tidi_registry.snapshot()
+    return concurrent.futures.ProcessPoolExecutor(
+        max_workers, initializer=initialise_worker, initargs=(snapshot,), **kwargs
+    )
 
 
 def field_factory(
-    type_: t.Type[T], provider: t.Callable[..., T] | None = None
+    type_: t.Type[T],
+    provider: t.Callable[..., T] | None = None,
+    scope: Scope = Scope.TRANSIENT,
 ) -> t.Callable[..., T]:
-    def inner():
-        with resolver.resolve_dependency(
-            type_=type_,
-            resolver_options=DEFAULT_RESOLVER_OPTIONS,
-            registry=default_tidi_registry,
-            provider=provider,
-        ) as obj:
-            return obj
+    """Gives a dataclass field's `default_factory`, that injects the dependency.
+
+    How to resolve it is compiled once, on first use. If the provider gives a
+    context manager, the dataclass must be decorated with `tidi.inject` (above
+    `@dataclass`), so it stays open until the instance is `tidi.release`d or
+    garbage collected.
+
+    Args:
+        type_ (typing.Type[T]): the type of the dependency.
+        provider (typing.Callable[..., T] | None, optional): a function or context
+            manager that provides the dependency. Defaults to None.
+        scope (Scope, optional): how long the dependency lives. Defaults to
+            `Scope.TRANSIENT`.
+
+    Returns:
+        (typing.Callable[..., T]): the default factory.
+    """
+    resolver_options = dataclasses.replace(DEFAULT_RESOLVER_OPTIONS, scope=scope)
+    compiled: resolver.DependencyPlan[T] | None = None
+
+    def inner() -> T:
+        nonlocal compiled
+        if compiled is None:
+            compiled = _compile_field(type_, resolver_options, provider)
+        if compiled.needs_exit_stack:
+            return compiled.resolve(default_tidi_registry, decorator.instance_exit_stack())
+        try:
+            return compiled.resolve(default_tidi_registry)
+        except resolver.ExitStackRequiredError:  # gave a context manager after all
+            return compiled.resolve(default_tidi_registry, decorator.instance_exit_stack())
 
     return inner
+
+
+def _compile_field(
+    type_: t.Type[T], resolver_options: resolver.ResolverOptions, provider: t.Callable | None
+) -> resolver.DependencyPlan[T]:
+    dependency = decorator.compile_dependency(
+        type_, resolver_options, default_tidi_registry, provider
+    )
+    if dependency.is_async:
+        raise resolver.DependencyResolutionError(
+            f"Async providers can't be used for dataclass fields: {type_}"
+        )
+    return dependency
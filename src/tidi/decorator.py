@@ -4,12 +4,19 @@ Uses `tidi.parameters` to determine which parameters of the wrapped function to
 replace.
 """
 
+import collections
+import concurrent.futures
 import contextlib
+import contextvars
 import functools
 import inspect
+import threading
+import types
 import typing as t
+import weakref
+from dataclasses import dataclass, field
 
-from tidi import parameters, resolver
+from tidi import lazy, metrics, parameters, resolver, scopes
 
 T = t.TypeVar("T")
 R = t.TypeVar("R")
@@ -21,6 +28,24 @@ class Registry(t.Protocol):
         ...  # pragma: no cover
 
 
+@t.runtime_checkable
+class _GenerationalRegistry(Registry, t.Protocol):
+    """A registry whose lookups can be cached until its generation or view changes."""
+
+    generation: int
+
+    def current_view(self) -> object:
+        ...  # pragma: no cover
+
+
+@t.runtime_checkable
+class _PinnableRegistry(Registry, t.Protocol):
+    """A registry that can give a copy of what the caller sees, for use on other threads."""
+
+    def pinned(self) -> Registry:
+        ...  # pragma: no cover
+
+
 class Unset(t.Any):
     """Placeholder class for a dependency yet to be injected."""
 
@@ -88,16 +113,43 @@ class Provider(t.Generic[T], t.Any):  # inherit from Any to appease type checker
         self.provider_func = provider_func
 
 
-def inject(registry: Registry | None = None) -> t.Callable[[t.Callable[P, R]], t.Callable[P, R]]:
+defer_compilation = False
+"""Whether `inject` defers inspecting functions until they're first called, by default.
+
+Set it before the decorated modules are imported, e.g. to speed up cold starts.
+"""
+
+
+def inject(
+    registry: Registry | None = None,
+    *,
+    parallel: bool | int = False,
+    deferred: bool | None = None,
+) -> t.Callable[[t.Callable[P, R]], t.Callable[P, R]]:
     """A decorator that will replace certain keyword arguments with dependencies
 
     Args:
         registry (Registry | None, optional): Provide a `tidi.registry.Registry`
             if you have one. Defaults to None.
+        parallel (bool | int, optional): whether to provide the dependencies of
+            (sync) functions concurrently, on a pool of threads shared by the
+            functions this decorates. An `int` is the most threads to use.
+            Only worth it when providers spend time waiting, e.g. on I/O.
+            Defaults to False.
+        deferred (bool | None, optional): whether to wait until a decorated
+            function is first called to inspect its signature & compile how to
+            resolve its dependencies, making decorating it almost free. Errors
+            in its dependencies are then raised by that call rather than when
+            decorating. Defaults to None, using `defer_compilation`.
 
     Returns:
         (t.Callable[[t.Callable[P, R]], t.Callable[P, R]]): The decorator itself.
 
+    Raises:
+        DependencyResolutionError: when decorating a class without an `__init__`
+            written in Python to inject into, e.g. one decorated by
+            `@dataclass` after (above) `@tidi.inject`.
+
     Examples:
         Define your own inject decorator if you don't want to use the top level
         package defined one.
@@ -110,44 +162,1078 @@ def inject(registry: Registry | None = None) -> t.Callable[[t.Callable[P, R]], t
         ...    db_string: tidi.Injected = tidi.Provider(get_db_conn_string)
         ... ) -> db_library.DBConn:
         ...     return db_library.connect(db_string)
+
+        Decorate a class (or dataclass) to inject into its constructor, the
+        class is returned as it is, other than its `__init__`
+        >>> @tidi.inject
+        ... @dataclasses.dataclass
+        ... class UserService:
+        ...     db: tidi.Injected[Database] = tidi.UNSET
+
+        Call a decorated function many times, resolving its dependencies once
+        & keeping any context managers open until the batch is done
+        >>> with create_db_connection.bind() as bound:
+        ...     for record in records:
+        ...         bound(record)
+        >>> for result in create_db_connection.map(records):  # lazily
+        ...     ...
+
+        Or one that opens connections to slow services at the same time
+        >>> parallel_injector = tidi.decorator.inject(tidi.default_tidi_registry, parallel=8)
+
+        Or one that leaves the work until the functions are used, compiling any
+        that haven't been in the background once the app has started
+        >>> deferred_injector = tidi.decorator.inject(tidi.default_tidi_registry, deferred=True)
+        >>> tidi.decorator.compile_pending(background=True)
     """
+    executor = None
+    if parallel:
+        executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=None if parallel is True else parallel, thread_name_prefix="tidi"
+        )
 
     def decorator(func: t.Callable[P, R]) -> t.Callable[P, R]:
-        injectable_params = _get_injectable_parameters_from_func_signature(func)
-
-        @functools.wraps(func)
-        def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
-            with contextlib.ExitStack() as stack:
-                for param in injectable_params:
-                    obj = stack.enter_context(
-                        resolver.resolve_dependency(
-                            type_=param.base_type,
-                            resolver_options=next(
-                                metadata for metadata in param.annotated_metadata
-                            ),
-                            registry=registry,
-                            provider=(
-                                param.default.provider_func
-                                if isinstance(param.default, Provider)
-                                else None
-                            ),
-                        )
-                    )
-                    kwargs.setdefault(param.name, obj)
-                return func(*args, **kwargs)
-            assert False, "unreachable"  # pragma: no cover, to appease mypy with ExitStack
-
+        if inspect.isclass(func):
+            # inject into the constructor in place, so the class stays a class
+            if not isinstance(func.__init__, types.FunctionType):  # e.g. `object.__init__`
+                raise resolver.DependencyResolutionError(
+                    f"{func} has no `__init__` written in Python to inject into. If it's a "
+                    "dataclass, put `@tidi.inject` above `@dataclass`, so the dataclass's "
+                    "`__init__` exists by the time it's decorated"
+                )
+            func.__init__ = decorate(func.__init__, _wrap_constructor)
+            return func
+        wrapper = decorate(func, _wrap)
+        _add_batch_api(wrapper, func, _injected_functions[func])
         return wrapper
 
+    def decorate(func: t.Callable[P, R], wrap: _Wrap) -> t.Callable[P, R]:
+        pending = _PendingPlan(registry, executor)
+        with _injected_functions_lock:
+            _injected_functions[func] = pending
+        defer = defer_compilation if deferred is None else deferred
+        if inspect.iscoroutinefunction(func):
+            if defer:
+                return t.cast(t.Callable[P, R], _wrap_deferred_async(func, pending))
+            return t.cast(t.Callable[P, R], _wrap_async(func, pending.compile(func), registry))
+        if defer:
+            return _wrap_deferred(func, pending, wrap)
+        return wrap(func, pending.compile(func), registry)
+
     return decorator
 
 
-def _get_injectable_parameters_from_func_signature(
-    func: t.Callable,
+def _add_batch_api(wrapper: t.Callable, func: t.Callable, pending: "_PendingPlan") -> None:
+    """Gives the decorated function `bind` & `map`, to call it many times with one resolution.
+
+    `bind()` is a context manager giving `func` with its dependencies resolved,
+    which are passed by keyword, & `map(*iterables)` lazily calls that for each
+    item, like the builtin. Both are async for an async `func`.
+    """
+    if inspect.iscoroutinefunction(func):
+        wrapper.bind = functools.partial(_bind_async, func, pending)  # type: ignore[attr-defined]
+        wrapper.map = functools.partial(_map_async, func, pending)  # type: ignore[attr-defined]
+    else:
+        wrapper.bind = functools.partial(_bind, func, pending)  # type: ignore[attr-defined]
+        wrapper.map = functools.partial(_map, func, pending)  # type: ignore[attr-defined]
+
+
+@contextlib.contextmanager
+def _bind(func: t.Callable[..., R], pending: "_PendingPlan") -> t.Iterator[t.Callable[..., R]]:
+    plan = pending.compile(func)
+    with contextlib.ExitStack() as stack:
+        instances = _batch_request(plan)
+        if instances is None:
+            _, dependencies = plan.bind(pending.registry, stack, (), {})
+            yield functools.partial(func, **dependencies)
+            return
+        stack.callback(instances.close)
+        with scopes.within_request(instances):
+            _, dependencies = plan.bind(pending.registry, stack, (), {})
+        yield functools.partial(_call_within_request, instances, func, **dependencies)
+
+
+def _map(
+    func: t.Callable[..., R], pending: "_PendingPlan", *iterables: t.Iterable
+) -> t.Iterator[R]:
+    with _bind(func, pending) as bound:
+        yield from map(bound, *iterables)
+
+
+@contextlib.asynccontextmanager
+async def _bind_async(
+    func: t.Callable[..., t.Awaitable[R]], pending: "_PendingPlan"
+) -> t.AsyncIterator[t.Callable[..., t.Awaitable[R]]]:
+    plan = pending.compile(func)
+    async with contextlib.AsyncExitStack() as stack:
+        instances = _batch_request(plan)
+        if instances is None:
+            _, dependencies = await plan.bind_async(pending.registry, stack, (), {})
+            yield functools.partial(func, **dependencies)
+            return
+        stack.push_async_callback(instances.aclose)
+        with scopes.within_request(instances):
+            _, dependencies = await plan.bind_async(pending.registry, stack, (), {})
+        yield functools.partial(_call_within_request_async, instances, func, **dependencies)
+
+
+async def _map_async(
+    func: t.Callable[..., t.Awaitable[R]], pending: "_PendingPlan", *iterables: t.Iterable
+) -> t.AsyncIterator[R]:
+    async with _bind_async(func, pending) as bound:
+        for args in zip(*iterables):
+            yield await bound(*args)
+
+
+def _batch_request(plan: "_InjectionPlan") -> scopes.ScopedInstances | None:
+    """The request scope of its own for a batch, if it needs one & none is open.
+
+    Only open while each bound call runs, not in between, so calls made
+    meanwhile (e.g. by another batch) don't join it.
+    """
+    if not plan.opens_request or scopes.current_request() is not None:
+        return None
+    return scopes.ScopedInstances()
+
+
+def _call_within_request(
+    instances: scopes.ScopedInstances, func: t.Callable[..., R], *args: t.Any, **kwargs: t.Any
+) -> R:
+    with scopes.within_request(instances):
+        return func(*args, **kwargs)
+
+
+async def _call_within_request_async(
+    instances: scopes.ScopedInstances,
+    func: t.Callable[..., t.Awaitable[R]],
+    *args: t.Any,
+    **kwargs: t.Any,
+) -> R:
+    with scopes.within_request(instances):
+        return await func(*args, **kwargs)
+
+
+def compile_dependency(
+    type_: t.Type[T],
+    resolver_options: resolver.ResolverOptions,
+    registry: Registry | None,
+    provider: t.Callable | None = None,
+) -> resolver.DependencyPlan[T]:
+    """Like `tidi.resolver.compile_dependency`, but with the dependencies of its provider too.
+
+    The parameters of the provider (or of the type, if it's initialised) that
+    are marked to be injected are compiled recursively, as they are for `inject`.
+
+    Raises:
+        DependencyResolutionError: if the dependency (eventually) depends on itself.
+    """
+    return _compile_node(type_, resolver_options, provider, registry, ())
+
+
+def instance_exit_stack() -> contextlib.ExitStack:
+    """The exit stack of the instance being constructed by a class decorated with `inject`.
+
+    Context managers entered on it stay open for the lifetime of the instance,
+    being exited when it's garbage collected or passed to `release`. Used by
+    `tidi.field_factory` for context manager providers.
+
+    Raises:
+        DependencyResolutionError: if no such instance is being constructed.
+    """
+    constructing = _constructing.get()
+    if constructing is None:
+        raise resolver.DependencyResolutionError(
+            "Context manager providers can only be kept open for an instance of a class "
+            "decorated with `tidi.inject`, while it's being constructed"
+        )
+    return constructing.exit_stack()
+
+
+def release(instance: object) -> None:
+    """Exits the context managers entered for `instance`, when constructed by `inject`.
+
+    Otherwise they're exited when it's garbage collected. Does nothing if there
+    aren't any, or they've already been exited.
+
+    Examples:
+        Release them when the instance is closed, or used as a context manager
+        >>> @tidi.inject
+        ... @dataclasses.dataclass
+        ... class UserService:
+        ...     db: Connection = dataclasses.field(
+        ...         default_factory=tidi.field_factory(Connection, db_pool)
+        ...     )
+        ...
+        ...     def close(self) -> None:
+        ...         tidi.release(self)
+    """
+    finalizer = _instance_finalizers.get(id(instance))
+    if finalizer is not None:
+        finalizer()  # only exits the stack the first time
+
+
+class _Constructing:
+    """The exit stack of an instance being constructed, created the first time it's needed."""
+
+    __slots__ = ("stack",)
+
+    def __init__(self, stack: contextlib.ExitStack | None) -> None:
+        self.stack = stack
+
+    def exit_stack(self) -> contextlib.ExitStack:
+        if self.stack is None:
+            self.stack = contextlib.ExitStack()
+        return self.stack
+
+
+_constructing: contextvars.ContextVar[_Constructing | None] = contextvars.ContextVar(
+    "tidi_constructing", default=None
+)
+
+_instance_finalizers: dict[int, weakref.finalize] = {}
+"""The finalizer exiting each instance's exit stack, by the instance's id, while it's alive."""
+
+
+def _keep_open(instance: object, stack: contextlib.ExitStack) -> None:
+    key = id(instance)
+    finalizer = _instance_finalizers.get(key)
+    if finalizer is not None and (alive := finalizer.peek()) is not None:
+        # e.g. an injected subclass calling an injected base class's `__init__`, so
+        # its context managers are exited first, on the instance's one exit stack
+        _, _, (_, instance_stack), _ = alive
+        instance_stack.push(stack)
+        return
+    try:
+        _instance_finalizers[key] = weakref.finalize(instance, _exit_instance_stack, key, stack)
+    except TypeError:  # e.g. has `__slots__` without `__weakref__`
+        stack.close()
+        raise resolver.DependencyResolutionError(
+            f"Unable to keep context managers open for {type(instance)}, as it doesn't support "
+            "weak references"
+        ) from None
+
+
+def _exit_instance_stack(key: int, stack: contextlib.ExitStack) -> None:
+    try:
+        _instance_finalizers.pop(key, None)
+    finally:
+        stack.close()
+
+
+def compile_pending(background: bool = False) -> threading.Thread | None:
+    """Compiles every function decorated with `inject` that was deferred & isn't yet.
+
+    Errors are left to be raised when each function is called.
+
+    Args:
+        background (bool, optional): whether to compile them on a (daemon) thread,
+            returning straight away. Defaults to False.
+
+    Returns:
+        (threading.Thread | None): the thread compiling them, if in the background.
+
+    Examples:
+        Once the app has started, so its first requests don't pay for compiling
+        >>> tidi.decorator.compile_pending(background=True)
+    """
+    if background:
+        thread = threading.Thread(target=compile_pending, name="tidi-compile", daemon=True)
+        thread.start()
+        return thread
+    for func, pending in _snapshot_injected_functions():
+        if pending.plan is None:
+            with contextlib.suppress(Exception):
+                pending.compile(func)
+    return None
+
+
+class _PendingPlan:
+    """The `_InjectionPlan` of a decorated function, compiled once, the first time it's needed.
+
+    It doesn't hold onto the function, so it can be kept in `_injected_functions`.
+    """
+
+    def __init__(
+        self, registry: Registry | None, executor: concurrent.futures.Executor | None
+    ) -> None:
+        self.registry = registry
+        self.executor = executor
+        self.plan: _InjectionPlan | None = None
+        self._lock = threading.Lock()
+
+    def compile(self, func: t.Callable) -> "_InjectionPlan":
+        """The plan of `func`, compiling it if it hasn't been already.
+
+        Raises:
+            DependencyResolutionError: if the dependencies are unable to be resolved,
+                e.g. an async provider of a sync function.
+        """
+        plan = self.plan
+        if plan is not None:
+            return plan
+        with self._lock:
+            if self.plan is None:
+                plan = _InjectionPlan.from_func(func, self.registry, self.executor)
+                if plan.is_async and not inspect.iscoroutinefunction(func):
+                    raise resolver.DependencyResolutionError(
+                        f"Async providers can only be injected into async functions: {func}"
+                    )
+                self.plan = plan
+            return self.plan
+
+
+class PreflightError(resolver.DependencyResolutionError):
+    """Some injected functions' dependencies are unable to be resolved.
+
+    Args:
+        problems (list[str]): a description of each problem found.
+    """
+
+    def __init__(self, problems: list[str]) -> None:
+        super().__init__(
+            "Unable to resolve dependencies:\n"
+            + "\n".join(f"  - {problem}" for problem in problems)
+        )
+        self.problems = problems
+
+
+def preflight(*funcs: t.Callable, warm: bool = False) -> None:
+    """Checks that the dependencies of functions decorated with `inject` can be resolved.
+
+    Everything that can be checked without resolving is, e.g. whether they've
+    been registered or their types can be initialised, for all the functions,
+    so every problem is reported at once. Useful to fail fast at startup.
+
+    Args:
+        *funcs (typing.Callable): the decorated functions to check. Defaults to
+            every function decorated so far.
+        warm (bool, optional): whether to also create the (sync) `Scope.SINGLETON`
+            dependencies now, rather than on first use. Defaults to False.
+
+    Raises:
+        PreflightError: listing every problem found.
+
+    Examples:
+        >>> tidi.register(load_config())
+        >>> tidi.preflight(warm=True)
+    """
+    if funcs:
+        checking = []
+        for func in funcs:
+            unwrapped = _unwrap_injected(func)
+            checking.append((unwrapped, _injected_functions[unwrapped]))
+    else:
+        checking = _snapshot_injected_functions()
+    problems = []
+    warmed: set[t.Hashable] = set()
+    for func, pending in checking:
+        try:
+            plan = pending.compile(func)
+        except resolver.DependencyResolutionError as err:
+            problems.append(f"{func.__module__}.{func.__qualname__}: {err}")
+            continue
+        registry = pending.registry
+        for name, _, dependency in plan.dependencies:
+            where = f"{func.__module__}.{func.__qualname__}, parameter {name!r}"
+            found = resolver.check_dependency(dependency, registry)
+            if not found and warm:
+                found = _warm(dependency, registry, warmed)
+            problems += [f"{where}: {problem}" for problem in found]
+    if problems:
+        raise PreflightError(problems)
+
+
+_injected_functions: weakref.WeakKeyDictionary[
+    t.Callable, _PendingPlan
+] = weakref.WeakKeyDictionary()
+"""Each function decorated with `inject`, with how to resolve its dependencies."""
+_injected_functions_lock = threading.Lock()
+
+
+def _snapshot_injected_functions() -> list[tuple[t.Callable, _PendingPlan]]:
+    with _injected_functions_lock:
+        return list(_injected_functions.items())
+
+
+def _unwrap_injected(func: t.Callable) -> t.Callable:
+    unwrapped: t.Any = func.__init__ if inspect.isclass(func) else func
+    while unwrapped not in _injected_functions:
+        try:
+            unwrapped = unwrapped.__wrapped__
+        except AttributeError:
+            raise ValueError(f"Not decorated with `tidi.inject`: {func}") from None
+    return unwrapped
+
+
+def _warm(
+    dependency: resolver.DependencyPlan, registry: Registry | None, warmed: set[t.Hashable]
+) -> list[str]:
+    for node in _walk(dependency):
+        if (
+            node.resolver_options.scope is not scopes.Scope.SINGLETON
+            or node.is_async
+            or node.key in warmed
+        ):
+            continue
+        warmed.add(node.key)
+        try:
+            lazy.resolve(node.resolve(registry))
+        except Exception as err:
+            return [f"failed to create {node.type_} in advance: {err!r}"]
+    return []
+
+
+def _wrap(
+    func: t.Callable[P, R], plan: "_InjectionPlan", registry: Registry | None
+) -> t.Callable[P, R]:
+    @functools.wraps(func)
+    def wrapper_with_exit_stack(*args: P.args, **kwargs: P.kwargs) -> R:
+        with contextlib.ExitStack() as stack:
+            bound_args, bound_kwargs = plan.bind(registry, stack, args, kwargs)
+            return func(*bound_args, **bound_kwargs)
+        assert False, "unreachable"  # pragma: no cover, to appease mypy with ExitStack
+
+    @functools.wraps(func)
+    def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+        try:
+            bound_args, bound_kwargs = plan.bind(registry, None, args, kwargs)
+        except _ExitStackRequired:
+            return wrapper_with_exit_stack(*args, **kwargs)
+        return func(*bound_args, **bound_kwargs)
+
+    chosen = wrapper_with_exit_stack if plan.needs_exit_stack else wrapper
+    return _within_request(chosen) if plan.opens_request else chosen
+
+
+def _within_request(wrapper: t.Callable[P, R]) -> t.Callable[P, R]:
+    """Opens a request scope around calls of `wrapper`, unless one is already open."""
+
+    @functools.wraps(wrapper)
+    def wrapper_within_request(*args: P.args, **kwargs: P.kwargs) -> R:
+        if scopes.current_request() is not None:
+            return wrapper(*args, **kwargs)
+        with scopes.request_scope():
+            return wrapper(*args, **kwargs)
+        assert False, "unreachable"  # pragma: no cover, to appease mypy with the scope
+
+    return wrapper_within_request
+
+
+def _wrap_async(
+    func: t.Callable[P, t.Awaitable[R]], plan: "_InjectionPlan", registry: Registry | None
+) -> t.Callable[P, t.Awaitable[R]]:
+    @functools.wraps(func)
+    async def wrapper_with_exit_stack(*args: P.args, **kwargs: P.kwargs) -> R:
+        async with contextlib.AsyncExitStack() as stack:
+            bound_args, bound_kwargs = await plan.bind_async(registry, stack, args, kwargs)
+            return await func(*bound_args, **bound_kwargs)
+        assert False, "unreachable"  # pragma: no cover, to appease mypy with AsyncExitStack
+
+    @functools.wraps(func)
+    async def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+        try:
+            bound_args, bound_kwargs = await plan.bind_async(registry, None, args, kwargs)
+        except _ExitStackRequired:
+            return await wrapper_with_exit_stack(*args, **kwargs)
+        return await func(*bound_args, **bound_kwargs)
+
+    chosen = wrapper_with_exit_stack if plan.needs_exit_stack else wrapper
+    return _within_request_async(chosen) if plan.opens_request else chosen
+
+
+def _within_request_async(wrapper: t.Callable[P, t.Awaitable[R]]) -> t.Callable[P, t.Awaitable[R]]:
+    @functools.wraps(wrapper)
+    async def wrapper_within_request(*args: P.args, **kwargs: P.kwargs) -> R:
+        if scopes.current_request() is not None:
+            return await wrapper(*args, **kwargs)
+        async with scopes.async_request_scope():
+            return await wrapper(*args, **kwargs)
+        assert False, "unreachable"  # pragma: no cover, to appease mypy with the scope
+
+    return wrapper_within_request
+
+
+def _wrap_constructor(
+    func: t.Callable[P, R], plan: "_InjectionPlan", registry: Registry | None
+) -> t.Callable[P, R]:
+    """Like `_wrap`, but keeps context managers open until the instance is released.
+
+    They're entered on an exit stack created if & when needed, which is exited by
+    `release` or when the instance is garbage collected, rather than on return.
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+        constructing = _Constructing(contextlib.ExitStack() if plan.needs_exit_stack else None)
+        token = _constructing.set(constructing)
+        try:
+            try:
+                bound_args, bound_kwargs = plan.bind(registry, constructing.stack, args, kwargs)
+            except _ExitStackRequired:
+                bound_args, bound_kwargs = plan.bind(
+                    registry, constructing.exit_stack(), args, kwargs
+                )
+            result = func(*bound_args, **bound_kwargs)
+        except BaseException:
+            if constructing.stack is not None:
+                constructing.stack.close()
+            raise
+        finally:
+            _constructing.reset(token)
+        if constructing.stack is not None:
+            _keep_open(args[0], constructing.stack)
+        return result
+
+    return wrapper
+
+
+_Wrap = t.Callable[[t.Callable[P, R], "_InjectionPlan", Registry | None], t.Callable[P, R]]
+
+
+def _wrap_deferred(
+    func: t.Callable[P, R], pending: _PendingPlan, wrap: _Wrap = _wrap
+) -> t.Callable[P, R]:
+    compiled: t.Callable[P, R] | None = None
+
+    @functools.wraps(func)
+    def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+        nonlocal compiled
+        if compiled is None:
+            compiled = wrap(func, pending.compile(func), pending.registry)
+        return compiled(*args, **kwargs)
+
+    return wrapper
+
+
+def _wrap_deferred_async(
+    func: t.Callable[P, t.Awaitable[R]], pending: _PendingPlan
+) -> t.Callable[P, t.Awaitable[R]]:
+    compiled: t.Callable[P, t.Awaitable[R]] | None = None
+
+    @functools.wraps(func)
+    async def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+        nonlocal compiled
+        if compiled is None:
+            compiled = _wrap_async(func, pending.compile(func), pending.registry)
+        return await compiled(*args, **kwargs)
+
+    return wrapper
+
+
+_ExitStackRequired = resolver.ExitStackRequiredError
+"""A dependency needs entering on an exit stack, e.g. an explicitly passed `Provider`."""
+
+
+_Target = str | int
+"""Where a resolved dependency goes, a keyword argument's name or a positional index."""
+
+
+@dataclass(frozen=True)
+class _InjectionPlan:
+    """How to resolve every injectable parameter of a function, compiled once.
+
+    Each dependency is stored with the parameter's name and its position in
+    the signature, so passed arguments can be bound without `inspect`.
+
+    If the registry has a generation, the registered dependencies are also
+    cached per view of the registry, until the generation changes.
+
+    If the same dependency appears more than once in the dependency graph,
+    `shares_dependencies` is set so each call only resolves it once.
+
+    If there's an `executor`, dependencies that aren't registered are resolved
+    on it concurrently, each on its own exit stack. These are then pushed onto
+    the call's exit stack in parameter order, so they're exited in reverse.
+
+    If any dependency is `Scope.REQUEST`, `opens_request` is set so the call
+    opens a request scope, if there isn't one already, for nested calls to share.
+
+    `name` is the function's qualified name, used to label `tidi.metrics`.
+    """
+
+    dependencies: tuple[tuple[str, int, resolver.DependencyPlan], ...]
+    needs_exit_stack: bool
+    is_async: bool
+    caches_registry: bool = False
+    shares_dependencies: bool = False
+    opens_request: bool = False
+    executor: concurrent.futures.Executor | None = field(default=None, repr=False, compare=False)
+    name: str = ""
+    _registry_cache: dict[int, tuple[object, int, tuple]] = field(
+        default_factory=dict, repr=False, compare=False
+    )
+    _nothing_registered: tuple = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, "_nothing_registered", (None,) * len(self.dependencies))
+
+    @classmethod
+    def from_func(
+        cls,
+        func: t.Callable,
+        registry: Registry | None,
+        executor: concurrent.futures.Executor | None = None,
+    ) -> t.Self:
+        inspected = _inspect(func)
+        dependencies = tuple(
+            (param.name, inspected.positions[param.name], _compile_parameter(param, registry))
+            for param in inspected.injectable
+        )
+        nodes = [node for *_, dependency in dependencies for node in _walk(dependency)]
+        keys = [node.key for node in nodes]
+        shares_dependencies = len(set(keys)) < len(keys)
+        return cls(
+            dependencies=dependencies,
+            needs_exit_stack=any(dependency.needs_exit_stack for *_, dependency in dependencies),
+            is_async=any(dependency.is_async for *_, dependency in dependencies),
+            caches_registry=isinstance(registry, _GenerationalRegistry)
+            and any(dependency.uses_registry for *_, dependency in dependencies),
+            shares_dependencies=shares_dependencies,
+            opens_request=any(
+                node.resolver_options.scope is scopes.Scope.REQUEST for node in nodes
+            ),
+            # a shared dependency would have to be resolved on one thread & awaited on others
+            executor=None if shares_dependencies or len(dependencies) < 2 else executor,
+            name=f"{func.__module__}.{func.__qualname__}",
+        )
+
+    def registered(self, registry: Registry | None) -> tuple:
+        """The registered object for each dependency, or `None` if there isn't one.
+
+        Cached until the registry's generation changes, so normally costs a
+        comparison of integers rather than a lookup per dependency. Not cached
+        while `tidi.metrics` are enabled, so each lookup can be recorded.
+        """
+        if not self.caches_registry or metrics.collector is not None:
+            return self._nothing_registered
+        registry = t.cast(_GenerationalRegistry, registry)
+        generation = registry.generation
+        view = registry.current_view()
+        cached = self._registry_cache.get(id(view))
+        if cached is not None and cached[0] is view and cached[1] == generation:
+            return cached[2]
+        registered = tuple(
+            _get_registered(registry, dependency) for *_, dependency in self.dependencies
+        )
+        if len(self._registry_cache) >= _MAX_CACHED_REGISTRY_VIEWS:
+            self._registry_cache.clear()
+        self._registry_cache[id(view)] = (view, generation, registered)
+        return registered
+
+    def bind(
+        self,
+        registry: Registry | None,
+        stack: resolver.ExitStack | None,
+        args: tuple,
+        kwargs: dict[str, t.Any],
+        pending: list[tuple[_Target, t.Awaitable]] | None = None,
+    ) -> tuple[tuple, dict[str, t.Any]]:
+        """Resolves the dependencies that weren't passed in explicitly.
+
+        A dependency is only resolved if its parameter is missing from the call,
+        or was passed as `UNSET` or as a `Provider` (which is then used instead).
+
+        If a `pending` list is given, async dependencies are appended to it, to
+        be awaited by the caller, rather than resolved.
+
+        Raises:
+            _ExitStackRequired: if there's no `stack` for a passed in `Provider`
+                that may give a context manager.
+            DependencyResolutionError: if a passed in `Provider` is async but
+                there's no `pending` list.
+        """
+        if metrics.collector is None or pending is not None:  # `bind_async` records itself
+            return self._bind(registry, stack, args, kwargs, pending)
+        with metrics.recording(self.name):
+            return self._bind(registry, stack, args, kwargs, pending)
+
+    def _bind(
+        self,
+        registry: Registry | None,
+        stack: resolver.ExitStack | None,
+        args: tuple,
+        kwargs: dict[str, t.Any],
+        pending: list[tuple[_Target, t.Awaitable]] | None,
+    ) -> tuple[tuple, dict[str, t.Any]]:
+        positional = None
+        resolved: resolver.Resolved | None = {} if self.shares_dependencies else None
+        jobs: list[tuple[_Target, resolver.DependencyPlan]] | None = None
+        if self.executor is not None and pending is None and not _in_worker_thread():
+            jobs = []
+        for (name, position, dependency), registered in zip(
+            self.dependencies, self.registered(registry)
+        ):
+            if name in kwargs:
+                value = kwargs[name]
+            elif position < len(args):
+                value = args[position]
+            else:
+                if registered is not None:
+                    kwargs[name] = registered
+                elif pending is not None and dependency.is_async:
+                    pending.append((name, dependency.resolve_async(registry, stack, resolved)))
+                elif jobs is not None:
+                    jobs.append((name, dependency))
+                else:
+                    kwargs[name] = dependency.resolve(registry, stack, resolved)
+                continue
+            if isinstance(value, Provider):
+                dependency = _with_provider(dependency, value.provider_func, registry)
+                if dependency.needs_exit_stack and stack is None:
+                    raise _ExitStackRequired()
+                if dependency.is_async and pending is None:
+                    raise resolver.DependencyResolutionError(
+                        f"Async provider passed to a sync function for {name!r}"
+                    )
+            elif value is not UNSET:
+                continue
+            target: _Target = name if name in kwargs else position
+            if registered is not None:
+                obj = registered
+            elif pending is not None and dependency.is_async:
+                pending.append((target, dependency.resolve_async(registry, stack, resolved)))
+                continue
+            elif jobs is not None:
+                jobs.append((target, dependency))
+                continue
+            else:
+                obj = dependency.resolve(registry, stack, resolved)
+            if isinstance(target, str):
+                kwargs[target] = obj
+            else:
+                if positional is None:
+                    positional = list(args)
+                positional[target] = obj
+        if jobs:
+            results = _resolve_in_parallel(
+                t.cast(concurrent.futures.Executor, self.executor),
+                [dependency for _, dependency in jobs],
+                registry,
+                stack,
+            )
+            for (target, _), obj in zip(jobs, results):
+                if isinstance(target, str):
+                    kwargs[target] = obj
+                else:
+                    if positional is None:
+                        positional = list(args)
+                    positional[target] = obj
+        if positional is not None:
+            args = tuple(positional)
+        return args, kwargs
+
+    async def bind_async(
+        self,
+        registry: Registry | None,
+        stack: contextlib.AsyncExitStack | None,
+        args: tuple,
+        kwargs: dict[str, t.Any],
+    ) -> tuple[tuple, dict[str, t.Any]]:
+        """Like `bind`, but also resolves async dependencies, concurrently."""
+        if metrics.collector is None:
+            return await self._bind_async(registry, stack, args, kwargs)
+        with metrics.recording(self.name):
+            return await self._bind_async(registry, stack, args, kwargs)
+
+    async def _bind_async(
+        self,
+        registry: Registry | None,
+        stack: contextlib.AsyncExitStack | None,
+        args: tuple,
+        kwargs: dict[str, t.Any],
+    ) -> tuple[tuple, dict[str, t.Any]]:
+        pending: list[tuple[_Target, t.Awaitable]] = []
+        try:
+            args, kwargs = self.bind(registry, stack, args, kwargs, pending)
+        except BaseException:
+            for _, awaitable in pending:
+                t.cast(t.Coroutine, awaitable).close()
+            raise
+        if not pending:
+            return args, kwargs
+        results = await resolver.gather(*(awaitable for _, awaitable in pending))
+        positional = None
+        for (target, _), obj in zip(pending, results):
+            if isinstance(target, str):
+                kwargs[target] = obj
+            else:
+                if positional is None:
+                    positional = list(args)
+                positional[target] = obj
+        if positional is not None:
+            args = tuple(positional)
+        return args, kwargs
+
+
+_MAX_CACHED_REGISTRY_VIEWS = 64
+
+_worker_thread = threading.local()
+
+
+def _in_worker_thread() -> bool:
+    """If so, resolve in line, as waiting on the same pool for nested calls could deadlock."""
+    return getattr(_worker_thread, "active", False)
+
+
+def _resolve_in_parallel(
+    executor: concurrent.futures.Executor,
+    dependencies: list[resolver.DependencyPlan],
+    registry: Registry | None,
+    stack: resolver.ExitStack | None,
+) -> list[t.Any]:
+    """Resolves the `dependencies` concurrently, each on its own exit stack.
+
+    Once all are done, the exit stacks are pushed onto `stack` in order, then the
+    first error (in order) is raised, if there was one.
+    """
+    if isinstance(registry, _PinnableRegistry):
+        registry = registry.pinned()  # e.g. registrations may be per thread
+    futures = [
+        executor.submit(_resolve_on_own_stack, contextvars.copy_context(), dependency, registry)
+        for dependency in dependencies
+    ]
+    results: list[t.Any] = []
+    error: BaseException | None = None
+    for future in futures:
+        try:
+            obj, own_stack = future.result()
+        except BaseException as err:
+            error = error or err
+            continue
+        if stack is not None:
+            stack.push(own_stack)
+        results.append(obj)
+    if error is not None:
+        raise error
+    return results
+
+
+def _resolve_on_own_stack(
+    context: contextvars.Context, dependency: resolver.DependencyPlan, registry: Registry | None
+) -> tuple[t.Any, contextlib.ExitStack]:
+    _worker_thread.active = True
+    try:
+        with contextlib.ExitStack() as stack:
+            obj = context.run(dependency.resolve, registry, stack)
+            own_stack = stack.pop_all()
+        return obj, own_stack
+    finally:
+        _worker_thread.active = False
+
+
+def _get_registered(registry: Registry, dependency: resolver.DependencyPlan) -> t.Any:
+    if not dependency.uses_registry:
+        return None
+    try:
+        return registry.get(dependency.type_, None)
+    except LookupError:  # e.g. ambiguous, so leave it to be raised when resolving
+        return None
+
+
+def _compile_parameter(
+    param: parameters.AnnotatedParameter,
+    registry: Registry | None,
+    path: tuple[tuple[t.Any, t.Callable | None], ...] = (),
+) -> resolver.DependencyPlan:
+    provider = param.default.provider_func if isinstance(param.default, Provider) else None
+    dependency = _compile_node(
+        param.base_type,
+        resolver.options_from_metadata(param.annotated_metadata),
+        provider,
+        registry,
+        path,
+    )
+    if dependency.is_async and dependency.resolver_options.lazy:
+        raise resolver.DependencyResolutionError(
+            f"Lazy dependencies can't be async, as they're resolved on first use: {param.name!r}"
+        )
+    return dependency
+
+
+def _compile_node(
+    type_: t.Any,
+    resolver_options: resolver.ResolverOptions,
+    provider: t.Callable | None,
+    registry: Registry | None,
+    path: tuple[tuple[t.Any, t.Callable | None], ...],
+) -> resolver.DependencyPlan:
+    dependency = resolver.compile_dependency(
+        type_=type_, resolver_options=resolver_options, registry=registry, provider=provider
+    )
+    dependencies = _compile_dependencies(
+        type_, dependency.resolver_options, provider, registry, path
+    )
+    if dependencies:
+        dependency = dependency.with_dependencies(dependencies)
+    return dependency
+
+
+def _with_provider(
+    dependency: resolver.DependencyPlan, provider: t.Callable, registry: Registry | None
+) -> resolver.DependencyPlan:
+    return dependency.with_provider(
+        provider,
+        _compile_dependencies(dependency.type_, dependency.resolver_options, provider, registry),
+    )
+
+
+def _compile_dependencies(
+    type_: t.Any,
+    resolver_options: resolver.ResolverOptions,
+    provider: t.Callable | None,
+    registry: Registry | None,
+    path: tuple[tuple[t.Any, t.Callable | None], ...] = (),
+) -> tuple[tuple[str, resolver.DependencyPlan], ...]:
+    """Compiles the injectable parameters of the provider (or type) of a dependency, recursively.
+
+    Raises:
+        DependencyResolutionError: if the dependency (eventually) depends on itself.
+    """
+    node = (type_, provider)
+    if node in path:
+        cycle = " -> ".join(_describe_node(*node) for node in (*path[path.index(node) :], node))
+        raise resolver.DependencyResolutionError(f"Dependency cycle: {cycle}")
+    if provider is not None:
+        source: t.Callable = provider
+    elif resolver_options.initialise_missing and isinstance(type_, type):
+        source = type_
+    else:
+        return ()
+    try:
+        injectable = _inspect(source).injectable
+    except (TypeError, ValueError):  # e.g. some builtins
+        return ()
+    return tuple(
+        (param.name, _compile_parameter(param, registry, (*path, node))) for param in injectable
+    )
+
+
+def _describe_node(type_: t.Any, provider: t.Callable | None) -> str:
+    name = getattr(type_, "__name__", repr(type_))
+    if provider is None:
+        return name
+    return f"{name} (from {getattr(provider, '__name__', repr(provider))})"
+
+
+def _walk(dependency: resolver.DependencyPlan) -> t.Iterator[resolver.DependencyPlan]:
+    """The nodes of a dependency graph, dependencies first."""
+    for _, sub_dependency in dependency.dependencies:
+        yield from _walk(sub_dependency)
+    yield dependency
+
+
+class _Inspected(t.NamedTuple):
+    """What injecting into a callable needs from its signature.
+
+    `defaults` are the function defaults the parameters were inspected with.
+    """
+
+    positions: dict[str, int]
+    injectable: tuple[parameters.AnnotatedParameter, ...]
+    defaults: tuple | None = None
+
+    def with_defaults(self, func: types.FunctionType) -> "_Inspected":
+        """The same, with the parameter defaults of another function sharing the same code."""
+        defaults = func.__defaults__ or ()
+        if defaults is self.defaults:
+            return self
+        first = func.__code__.co_argcount - len(defaults)  # the first positional with a default
+        return self._replace(
+            injectable=tuple(
+                param.replace(default=defaults[self.positions[param.name] - first])
+                for param in self.injectable
+            ),
+            defaults=defaults,
+        )
+
+
+class _Identities:
+    """Compares equal to another with the very same objects, whether or not they're hashable."""
+
+    __slots__ = ("objs", "_hash")
+
+    def __init__(self, objs: t.Iterable[t.Any]) -> None:
+        self.objs = tuple(objs)  # kept so their ids can't be reused while cached
+        self._hash = hash(tuple(map(id, self.objs)))
+
+    def __hash__(self) -> int:
+        return self._hash
+
+    def __eq__(self, other: object) -> bool:
+        return (
+            isinstance(other, _Identities)
+            and len(self.objs) == len(other.objs)
+            and all(obj is other_obj for obj, other_obj in zip(self.objs, other.objs))
+        )
+
+
+_MAX_CACHED_SIGNATURES = 1024
+
+_inspected: collections.OrderedDict[t.Hashable, _Inspected] = collections.OrderedDict()
+"""The least recently used first, so the oldest can be evicted once there's too many."""
+_inspected_lock = threading.Lock()
+
+
+def _inspect(source: t.Callable) -> _Inspected:
+    """The parameter positions & injectable parameters of a callable.
+
+    Cached by `_inspection_key`, so decorating functions created at runtime,
+    e.g. closures returned by a factory, only inspects their code once.
+
+    Raises:
+        TypeError, ValueError: if `source` has no signature, see `inspect.signature`.
+    """
+    key = _inspection_key(source)
+    if key is not None:
+        with _inspected_lock:
+            inspected = _inspected.get(key)
+            if inspected is not None:
+                _inspected.move_to_end(key)
+        if inspected is not None:
+            if inspected.defaults is None:
+                return inspected
+            return inspected.with_defaults(t.cast(types.FunctionType, source))
+    signature = inspect.signature(source)
+    inspected = _Inspected(
+        positions={name: position for position, name in enumerate(signature.parameters)},
+        injectable=tuple(_get_injectable_parameters_from_signature(signature)),
+        defaults=(source.__defaults__ or ()) if isinstance(source, types.FunctionType) else None,
+    )
+    if key is not None:
+        with _inspected_lock:
+            _inspected[key] = inspected
+            if len(_inspected) > _MAX_CACHED_SIGNATURES:
+                _inspected.popitem(last=False)
+    return inspected
+
+
+def _inspection_key(source: t.Callable) -> t.Hashable | None:
+    """What the signature of `source` depends on, or `None` if it's not known so can't be cached.
+
+    For a function, its code, the number of its defaults & its annotations, so
+    closures made by the same factory share a key, whatever their defaults are,
+    e.g. a different `Provider` each. Keyword only defaults are left out, as
+    those parameters are never injected. For a class, the methods used to create it.
+    """
+    if isinstance(source, type):
+        return (source, source.__init__, source.__new__, type(source).__call__)  # type: ignore[misc]
+    if type(source) is not types.FunctionType or not source.__dict__.keys().isdisjoint(
+        ("__wrapped__", "__signature__")
+    ):
+        return None
+    return (
+        source.__code__,
+        len(source.__defaults__ or ()),
+        _Identities(obj for item in source.__annotations__.items() for obj in item),
+    )
+
+
+def _get_injectable_parameters_from_signature(
+    signature: inspect.Signature,
 ) -> parameters.AnnotatedParameters:
     return parameters.AnnotatedParameters(
         param
-        for param in parameters.AnnotatedParameters.from_func(func)
+        for param in parameters.AnnotatedParameters.from_signature(signature)
         if _is_injectable_param(param)
     )
 
@@ -0,0 +1,73 @@
+"""Provides `type_key`, turning type annotations into the keys dependencies are registered with.
+
+Used by `tidi.parameters` for injected parameters, and by `tidi.registry` for
+what's registered & looked up, so the same type written differently, e.g.
+`Foo | None` & `typing.Optional[Foo]`, gives the same key.
+"""
+
+import collections.abc
+import types
+import typing as t
+
+_keys: dict[t.Any, t.Any] = {}
+"""The key of each annotation seen so far, as working it out means inspecting it."""
+
+
+def type_key(annotation: t.Any) -> t.Any:
+    """The key that a dependency annotated with `annotation` is registered & looked up by.
+
+    * `typing.Annotated` is unwrapped, ignoring its metadata.
+    * `None` & placeholder types (that subclass `typing.Any`, like `tidi.Unset`)
+      are dropped from unions, using what's left, e.g. `Foo | None` gives `Foo`.
+      If more than one type is left, the first of them is used.
+    * Parametrised generics are kept as they are, e.g. `Repository[User]`, so
+      can be registered separately from each other. `typing` aliases of builtin
+      & abstract collections are normalised, e.g. `typing.List[Foo]` gives
+      `list[Foo]`.
+    * A `typing.NewType` is a key of its own, so different instances of the same
+      type can be registered for each.
+
+    Args:
+        annotation (typing.Any): the type annotation.
+
+    Returns:
+        (typing.Any): the key, cached so it's a single lookup next time.
+
+    Examples:
+        >>> type_key(t.Optional[Database])
+        <class 'Database'>
+        >>> type_key(t.List[User])
+        list[User]
+    """
+    try:
+        return _keys[annotation]
+    except KeyError:
+        pass
+    except TypeError:  # unhashable, e.g. `typing.Annotated` with unhashable metadata
+        return _normalise(annotation)
+    key = _keys[annotation] = _normalise(annotation)
+    return key
+
+
+def _normalise(annotation: t.Any) -> t.Any:
+    origin = t.get_origin(annotation)
+    if origin is t.Annotated:
+        return type_key(t.get_args(annotation)[0])
+    if origin in (t.Union, types.UnionType):
+        members = [
+            member
+            for member in t.get_args(annotation)
+            if member is not types.NoneType and not _is_placeholder(member)
+        ]
+        return type_key(members[0]) if members else types.NoneType
+    if (
+        isinstance(origin, type)
+        and annotation.__module__ == "typing"
+        and origin is not collections.abc.Callable
+    ):
+        return types.GenericAlias(origin, t.get_args(annotation))
+    return annotation
+
+
+def _is_placeholder(member: t.Any) -> bool:
+    return isinstance(member, type) and member is not t.Any and t.Any in member.__mro__
@@ -0,0 +1,117 @@
+"""Provides the `LazyProxy` injected in place of `tidi.Lazy` dependencies.
+
+The dependency is only resolved when the proxy is first used, e.g. an attribute
+is accessed, so calls that never use it don't pay for resolving it.
+"""
+
+import typing as t
+
+
+class _LazyMarker:
+    def __repr__(self) -> str:
+        return "tidi.lazy.LAZY"
+
+
+LAZY = _LazyMarker()
+"""Marks a dependency to be resolved lazily, in the metadata of `typing.Annotated`."""
+
+
+class LazyProxy:
+    """Stands in for a dependency, resolving it the first time it's used.
+
+    Attribute access, calls, comparisons, `str`, `len`, iteration & the like are
+    all passed on to the resolved dependency. `isinstance` checks work too, as
+    they look up `__class__`, but that means they resolve the dependency.
+
+    Any context manager entered to resolve it is exited when the injected call
+    returns, after which an unresolved proxy can no longer be resolved.
+
+    Args:
+        resolve (typing.Callable[[], typing.Any]): resolves the dependency.
+    """
+
+    __slots__ = ("_tidi_resolve", "_tidi_obj")
+
+    def __init__(self, resolve: t.Callable[[], t.Any]) -> None:
+        object.__setattr__(self, "_tidi_resolve", resolve)
+
+    def _tidi_get(self) -> t.Any:
+        try:
+            return object.__getattribute__(self, "_tidi_obj")
+        except AttributeError:
+            pass
+        obj = object.__getattribute__(self, "_tidi_resolve")()
+        object.__setattr__(self, "_tidi_obj", obj)
+        object.__setattr__(self, "_tidi_resolve", None)  # let go of the call's state
+        return obj
+
+    def _tidi_expire(self, expired: t.Callable[[], t.NoReturn]) -> None:
+        """Calls `expired` instead of resolving, once the call it was injected into returns."""
+        if object.__getattribute__(self, "_tidi_resolve") is not None:
+            object.__setattr__(self, "_tidi_resolve", expired)
+
+    @property  # type: ignore[misc]
+    def __class__(self) -> type:
+        return type(self._tidi_get())
+
+    def __getattr__(self, name: str) -> t.Any:
+        return getattr(self._tidi_get(), name)
+
+    def __setattr__(self, name: str, value: t.Any) -> None:
+        setattr(self._tidi_get(), name, value)
+
+    def __delattr__(self, name: str) -> None:
+        delattr(self._tidi_get(), name)
+
+    def __repr__(self) -> str:
+        try:
+            obj = object.__getattribute__(self, "_tidi_obj")
+        except AttributeError:
+            return "<tidi.lazy.LazyProxy (unresolved)>"
+        return repr(obj)
+
+    def __str__(self) -> str:
+        return str(self._tidi_get())
+
+    def __bool__(self) -> bool:
+        return bool(self._tidi_get())
+
+    def __eq__(self, other: object) -> bool:
+        return self._tidi_get() == other
+
+    def __ne__(self, other: object) -> bool:
+        return self._tidi_get() != other
+
+    def __hash__(self) -> int:
+        return hash(self._tidi_get())
+
+    def __call__(self, *args: t.Any, **kwargs: t.Any) -> t.Any:
+        return self._tidi_get()(*args, **kwargs)
+
+    def __len__(self) -> int:
+        return len(self._tidi_get())
+
+    def __iter__(self) -> t.Iterator:
+        return iter(self._tidi_get())
+
+    def __contains__(self, item: object) -> bool:
+        return item in self._tidi_get()
+
+    def __getitem__(self, key: t.Any) -> t.Any:
+        return self._tidi_get()[key]
+
+    def __setitem__(self, key: t.Any, value: t.Any) -> None:
+        self._tidi_get()[key] = value
+
+    def __delitem__(self, key: t.Any) -> None:
+        del self._tidi_get()[key]
+
+
+def resolve(obj: t.Any) -> t.Any:
+    """The resolved dependency if `obj` is a `LazyProxy`, otherwise `obj` itself.
+
+    Useful to pass the real dependency on to code that checks its exact type.
+    """
+    if type(obj) is LazyProxy:
+        return obj._tidi_get()
+    return obj
@@ -0,0 +1,243 @@
+"""Opt-in counters & latency histograms of how dependencies are resolved.
+
+Nothing is recorded until `enable` is called, and while disabled the only cost
+is checking whether `collector` is `None`.
+
+Examples:
+    >>> tidi.metrics.enable()
+    >>> handle_request()
+    >>> tidi.stats()["tidi_provider_calls_total"]
+    [{'labels': {'type': 'app.DBSession', 'function': 'app.handle_request'}, 'value': 1}]
+    >>> print(tidi.metrics.to_prometheus())
+"""
+
+import bisect
+import contextlib
+import contextvars
+import threading
+import time
+import typing as t
+
+DEFAULT_BUCKETS = (0.00001, 0.0001, 0.001, 0.01, 0.1, 1.0, 10.0)
+"""Upper bounds (in seconds) of the latency histograms' buckets."""
+
+COUNTERS = {
+    "tidi_injected_calls_total": "Calls of functions decorated with `tidi.inject`.",
+    "tidi_registry_hits_total": "Dependencies found in the registry.",
+    "tidi_registry_misses_total": "Dependencies looked for but not found in the registry.",
+    "tidi_constructions_total": "Dependencies initialised by calling their type.",
+    "tidi_provider_calls_total": "Dependencies provided by calling a `Provider`.",
+}
+HISTOGRAMS = {
+    "tidi_provider_setup_seconds": "Time taken to call (& enter) a `Provider`.",
+    "tidi_provider_teardown_seconds": "Time taken to exit a `Provider`'s context manager.",
+}
+
+_Labels = tuple[tuple[str, str], ...]
+
+current_function: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "tidi_current_function", default=""
+)
+"""The injected function whose dependencies are being resolved, to label metrics with."""
+
+
+class _Histogram:
+    def __init__(self, buckets: tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def snapshot(self) -> dict[str, t.Any]:
+        cumulative, total = {}, 0
+        for bound, count in zip((*map(str, self.buckets), "+Inf"), self.counts):
+            total += count
+            cumulative[bound] = total
+        return {"count": total, "sum": self.sum, "buckets": cumulative}
+
+
+class Collector:
+    """Thread-safe store of the recorded counters & histograms.
+
+    Args:
+        buckets (tuple[float, ...], optional): upper bounds of the latency
+            histograms' buckets, in seconds. Defaults to `DEFAULT_BUCKETS`.
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._counters: dict[str, dict[_Labels, int]] = {name: {} for name in COUNTERS}
+        self._histograms: dict[str, dict[_Labels, _Histogram]] = {name: {} for name in HISTOGRAMS}
+
+    def increment(self, name: str, type_: t.Any = None) -> None:
+        """Adds one to the counter `name`, labelled with `type_` & the current function."""
+        labels = _labels(type_)
+        with self._lock:
+            counter = self._counters[name]
+            counter[labels] = counter.get(labels, 0) + 1
+
+    def observe(
+        self, name: str, seconds: float, type_: t.Any = None, function: str | None = None
+    ) -> None:
+        """Records a latency in the histogram `name`, labelled like `increment`.
+
+        `function` overrides the current function, for latencies recorded after its call.
+        """
+        labels = _labels(type_, function)
+        with self._lock:
+            histograms = self._histograms[name]
+            if labels not in histograms:
+                histograms[labels] = _Histogram(self.buckets)
+            histograms[labels].observe(seconds)
+
+    def snapshot(self) -> dict[str, list[dict[str, t.Any]]]:
+        """A copy of everything recorded so far, keyed by metric name."""
+        with self._lock:
+            counters = {
+                name: [
+                    {"labels": dict(labels), "value": value} for labels, value in samples.items()
+                ]
+                for name, samples in self._counters.items()
+            }
+            histograms = {
+                name: [
+                    {"labels": dict(labels), **histogram.snapshot()}
+                    for labels, histogram in samples.items()
+                ]
+                for name, samples in self._histograms.items()
+            }
+        return counters | histograms
+
+
+collector: Collector | None = None
+"""Where metrics are recorded, or `None` while disabled."""
+
+
+def enable(buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+    """Starts recording metrics, if not already.
+
+    Args:
+        buckets (tuple[float, ...], optional): upper bounds of the latency
+            histograms' buckets, in seconds. Defaults to `DEFAULT_BUCKETS`.
+    """
+    global collector
+    if collector is None:
+        collector = Collector(buckets)
+
+
+def disable() -> None:
+    """Stops recording metrics & forgets what was recorded."""
+    global collector
+    collector = None
+
+
+def reset() -> None:
+    """Forgets what has been recorded so far, if enabled."""
+    global collector
+    if collector is not None:
+        collector = Collector(collector.buckets)
+
+
+def stats() -> dict[str, list[dict[str, t.Any]]]:
+    """A snapshot of the metrics recorded so far, empty if disabled.
+
+    Returns:
+        (dict[str, list[dict[str, typing.Any]]]): samples for each metric name,
+            each with its `labels` and either a `value` (for counters) or a
+            `count`, `sum` & cumulative `buckets` (for histograms).
+    """
+    return {} if collector is None else collector.snapshot()
+
+
+def to_prometheus() -> str:
+    """The metrics recorded so far, in the Prometheus text exposition format."""
+    snapshot = stats()
+    lines = []
+    for name, help_text in COUNTERS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+        for sample in snapshot.get(name, []):
+            lines.append(f"{name}{_format_labels(sample['labels'])} {sample['value']}")
+    for name, help_text in HISTOGRAMS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        for sample in snapshot.get(name, []):
+            for bound, count in sample["buckets"].items():
+                labels = _format_labels({**sample["labels"], "le": bound})
+                lines.append(f"{name}_bucket{labels} {count}")
+            lines.append(f"{name}_sum{_format_labels(sample['labels'])} {sample['sum']}")
+            lines.append(f"{name}_count{_format_labels(sample['labels'])} {sample['count']}")
+    return "\n".join(lines) + "\n"
+
+
+@contextlib.contextmanager
+def recording(function: str) -> t.Iterator[None]:
+    """Counts a call of the injected `function` & labels what's recorded within with it."""
+    token = current_function.set(function)
+    try:
+        if collector is not None:
+            collector.increment("tidi_injected_calls_total")
+        yield
+    finally:
+        current_function.reset(token)
+
+
+def timed_exit(exit_: t.Callable[..., t.Any], type_: t.Any) -> t.Callable[..., t.Any]:
+    """Wraps a context manager's `__exit__` to record how long it takes."""
+    function = current_function.get()
+
+    def _timed_exit(*exc_details: t.Any) -> t.Any:
+        start = time.perf_counter()
+        try:
+            return exit_(*exc_details)
+        finally:
+            if collector is not None:
+                collector.observe(
+                    "tidi_provider_teardown_seconds", time.perf_counter() - start, type_, function
+                )
+
+    return _timed_exit
+
+
+def timed_async_exit(
+    exit_: t.Callable[..., t.Awaitable[t.Any]], type_: t.Any
+) -> t.Callable[..., t.Awaitable[t.Any]]:
+    """Wraps an async context manager's `__aexit__` to record how long it takes."""
+    function = current_function.get()
+
+    async def _timed_exit(*exc_details: t.Any) -> t.Any:
+        start = time.perf_counter()
+        try:
+            return await exit_(*exc_details)
+        finally:
+            if collector is not None:
+                collector.observe(
+                    "tidi_provider_teardown_seconds", time.perf_counter() - start, type_, function
+                )
+
+    return _timed_exit
+
+
+def _labels(type_: t.Any, function: str | None = None) -> _Labels:
+    if function is None:
+        function = current_function.get()
+    labels: _Labels = (("function", function),)
+    if type_ is not None:
+        labels = (("type", _type_name(type_)), *labels)
+    return labels
+
+
+def _type_name(type_: t.Any) -> str:
+    if isinstance(type_, type):
+        return f"{type_.__module__}.{type_.__qualname__}"
+    return repr(type_)
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    escaped = (
+        key + '="' + value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for key, value in labels.items()
+    )
+    return "{" + ",".join(escaped) + "}"
@@ -0,0 +1,75 @@
+"""Provides WSGI & ASGI middleware that open a `request_scope` for each request.
+
+So every injected call made while handling a request shares its
+`Scope.REQUEST` dependencies, which are torn down once the response is done.
+"""
+
+import contextlib
+import typing as t
+
+from tidi import scopes
+
+
+class WSGIMiddleware:
+    """Wraps a WSGI app, handling each request within a `tidi.request_scope`.
+
+    The scope stays open until the server closes the response, so dependencies
+    can still be used while a streamed response is iterated over.
+
+    Args:
+        app (typing.Callable): the WSGI app to wrap.
+
+    Examples:
+        >>> app.wsgi_app = tidi.middleware.WSGIMiddleware(app.wsgi_app)
+    """
+
+    def __init__(self, app: t.Callable[[dict, t.Callable], t.Iterable[bytes]]) -> None:
+        self.app = app
+
+    def __call__(self, environ: dict, start_response: t.Callable) -> t.Iterable[bytes]:
+        stack = contextlib.ExitStack()
+        stack.enter_context(scopes.request_scope())
+        try:
+            response = self.app(environ, start_response)
+        except BaseException:
+            stack.close()
+            raise
+        return _ClosingResponse(response, stack)
+
+
+class _ClosingResponse:
+    """A WSGI response that closes the request scope once it's closed itself."""
+
+    def __init__(self, response: t.Iterable[bytes], stack: contextlib.ExitStack) -> None:
+        self._response = response
+        self._stack = stack
+
+    def __iter__(self) -> t.Iterator[bytes]:
+        return iter(self._response)
+
+    def close(self) -> None:
+        with self._stack:
+            close = getattr(self._response, "close", None)
+            if close is not None:
+                close()
+
+
+class ASGIMiddleware:
+    """Wraps an ASGI app, handling each HTTP request & websocket within a `tidi.request_scope`.
+
+    Args:
+        app (typing.Callable): the ASGI app to wrap.
+
+    Examples:
+        >>> app = tidi.middleware.ASGIMiddleware(app)
+    """
+
+    def __init__(self, app: t.Callable[[dict, t.Callable, t.Callable], t.Awaitable[None]]) -> None:
+        self.app = app
+
+    async def __call__(self, scope: dict, receive: t.Callable, send: t.Callable) -> None:
+        if scope["type"] not in ("http", "websocket"):  # e.g. lifespan, which outlives requests
+            await self.app(scope, receive, send)
+            return
+        async with scopes.async_request_scope():
+            await self.app(scope, receive, send)
@@ -1,9 +1,10 @@
 """Extends functionality of `inspect.Parameter` to help work with `typing.Annotated` function parameters."""
 
 import inspect
-import types
 import typing as t
 
+from tidi import keys
+
 
 class AnnotatedParameter(inspect.Parameter):
     """Subclass of `inspect.Parameter` aimed for parameters with `typing.Annotated` type.
@@ -47,12 +48,7 @@ class AnnotatedParameter(inspect.Parameter):
     def base_type(self) -> t.Type:
         """The _real_ type of the `typing.Annotated` parameter."""
         assert self.is_annotated_type
-        match t.get_args(self.annotation)[0]:
-            case union if t.get_origin(union) in (t.Union, types.UnionType):
-                return t.get_args(union)[0]
-            case base_type:
-                return base_type
-        t.assert_never(self.annotation)
+        return keys.type_key(t.get_args(self.annotation)[0])
 
     @property
     def annotated_metadata(self) -> tuple:
@@ -70,8 +66,13 @@ class AnnotatedParameters(list[AnnotatedParameter]):
     @classmethod
     def from_func(cls, func: t.Callable) -> t.Self:
         """Builds `AnnotatedParameters` by inspecting a function's signature."""
+        return cls.from_signature(inspect.signature(func))
+
+    @classmethod
+    def from_signature(cls, signature: inspect.Signature) -> t.Self:
+        """Builds `AnnotatedParameters` from an already inspected signature."""
         return cls(
             ann_param
-            for param in inspect.signature(func).parameters.values()
+            for param in signature.parameters.values()
             if (ann_param := AnnotatedParameter.from_parameter(param)).is_annotated_type
         )
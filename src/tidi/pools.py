@@ -0,0 +1,347 @@
+"""Provides `Pool`s that keep expensive dependencies to reuse between calls.
+
+A pool is used as the function of a `tidi.Provider`, so an instance is checked
+out for the duration of each injected call, then returned for the next one.
+"""
+
+import asyncio
+import collections
+import contextlib
+import inspect
+import threading
+import time
+import typing as t
+
+from tidi import resolver
+
+T = t.TypeVar("T")
+
+
+class PoolExhaustedError(resolver.DependencyResolutionError):
+    """Timed out waiting for an instance to be returned to a full pool."""
+
+
+class PoolClosedError(resolver.DependencyResolutionError):
+    """Trying to check out an instance from a closed pool."""
+
+
+class _Pooled(t.NamedTuple):
+    obj: t.Any
+    stack: contextlib.ExitStack | contextlib.AsyncExitStack
+    returned_at: float
+
+
+class _BasePool(t.Generic[T]):
+    """The bookkeeping shared by `Pool` & `AsyncPool`, done while holding their lock."""
+
+    def __init__(
+        self,
+        factory: t.Callable[[], t.Any],
+        max_size: int = 10,
+        timeout: float | None = None,
+        max_idle: float | None = None,
+        health_check: t.Callable[[T], t.Any] | None = None,
+    ) -> None:
+        if max_size < 1:
+            raise ValueError(f"A pool's max_size must be at least 1, not {max_size}")
+        self.factory = factory
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.health_check = health_check
+        self._idle: collections.deque[_Pooled] = collections.deque()  # oldest on the left
+        self._size = 0
+        self._closed = False
+
+    @property
+    def size(self) -> int:
+        """How many instances exist, checked out or idle."""
+        return self._size
+
+    @property
+    def idle(self) -> int:
+        """How many instances are waiting to be checked out."""
+        return len(self._idle)
+
+    def _deadline(self) -> float | None:
+        return None if self.timeout is None else time.monotonic() + self.timeout
+
+    def _take(self) -> _Pooled | None:
+        """An idle instance, or `None` if there's room to create one, else raises `_Full`."""
+        if self._closed:
+            raise PoolClosedError(f"Unable to check out from a closed pool of {self.factory}")
+        if self._idle:
+            return self._idle.pop()
+        if self._size < self.max_size:
+            self._size += 1
+            return None
+        raise _Full()
+
+    def _give_back(self, pooled: _Pooled) -> list[_Pooled]:
+        """Returns `pooled` to the idle instances, and gives the ones to discard."""
+        if self._closed:
+            self._size -= 1
+            return [pooled]
+        self._idle.append(pooled._replace(returned_at=time.monotonic()))
+        return self._evict_idle()
+
+    def _evict_idle(self) -> list[_Pooled]:
+        evicted: list[_Pooled] = []
+        if self.max_idle is None:
+            return evicted
+        expired = time.monotonic() - self.max_idle
+        while self._idle and self._idle[0].returned_at < expired:
+            evicted.append(self._idle.popleft())
+        self._size -= len(evicted)
+        return evicted
+
+    def _close_idle(self) -> list[_Pooled]:
+        self._closed = True
+        evicted = list(self._idle)
+        self._idle.clear()
+        self._size -= len(evicted)
+        return evicted
+
+    def _timed_out(self) -> t.NoReturn:
+        raise PoolExhaustedError(
+            f"Timed out after {self.timeout}s waiting for one of the {self.max_size} instances "
+            f"of {self.factory} to be returned"
+        )
+
+
+class _Full(Exception):
+    """Every instance the pool can have is checked out."""
+
+
+class Pool(_BasePool[T]):
+    """A thread-safe, bounded pool of instances for sync functions to share.
+
+    Instances are created by calling `factory` when none are idle. If `factory`
+    gives a context manager, it's entered to create the instance and exited
+    when the instance is discarded, e.g. to close a connection.
+
+    Args:
+        factory (typing.Callable[[], T | contextlib.AbstractContextManager[T]]):
+            creates a new instance, or a context manager that gives one.
+        max_size (int, optional): the most instances there can be, checked out
+            or idle. Defaults to 10.
+        timeout (float | None, optional): the most seconds to wait for an instance
+            when they're all checked out, before raising `PoolExhaustedError`.
+            Defaults to None, waiting as long as it takes.
+        max_idle (float | None, optional): seconds an instance can go unused before
+            it's discarded, checked whenever the pool is used. Defaults to None.
+        health_check (typing.Callable[[T], bool] | None, optional): called with an
+            idle instance before it's checked out, it's discarded if this returns
+            `False` (or raises). Defaults to None.
+
+    Examples:
+        >>> db_pool = tidi.Pool(connect_to_db, max_size=20, timeout=5, health_check=ping)
+        >>> @tidi.inject
+        ... def get_users(db: tidi.Injected[DBConnection] = tidi.Provider(db_pool)):
+        ...     return db.query(Users).all()
+
+        Discard the instances when they're no longer needed, e.g. at shutdown
+        >>> db_pool.close()
+    """
+
+    def __init__(
+        self,
+        factory: t.Callable[[], T] | t.Callable[[], contextlib.AbstractContextManager[T]],
+        max_size: int = 10,
+        timeout: float | None = None,
+        max_idle: float | None = None,
+        health_check: t.Callable[[T], bool] | None = None,
+    ) -> None:
+        super().__init__(factory, max_size, timeout, max_idle, health_check)
+        self._condition = threading.Condition()
+
+    def __call__(self) -> contextlib.AbstractContextManager[T]:
+        return self.checkout()
+
+    @contextlib.contextmanager
+    def checkout(self) -> t.Iterator[T]:
+        """Checks out an instance until the context manager exits."""
+        pooled = self._acquire()
+        try:
+            yield pooled.obj
+        finally:
+            with self._condition:
+                discarded = self._give_back(pooled)
+                self._condition.notify(1 + len(discarded))
+            _discard(discarded)
+
+    def close(self) -> None:
+        """Discards the idle instances, & any checked out ones once they're returned."""
+        with self._condition:
+            discarded = self._close_idle()
+            self._condition.notify_all()
+        _discard(discarded)
+
+    def _acquire(self) -> _Pooled:
+        deadline = self._deadline()
+        while True:
+            with self._condition:
+                discarded = self._evict_idle()
+                while True:
+                    try:
+                        pooled = self._take()
+                        break
+                    except _Full:
+                        remaining = None if deadline is None else deadline - time.monotonic()
+                        if (remaining is not None and remaining <= 0) or not self._condition.wait(
+                            remaining
+                        ):
+                            self._timed_out()
+            _discard(discarded)
+            if pooled is None:
+                return self._create()
+            if self._is_healthy(pooled):
+                return pooled
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            _discard([pooled])
+
+    def _create(self) -> _Pooled:
+        stack = contextlib.ExitStack()
+        try:
+            provided = self.factory()
+            if isinstance(provided, contextlib.AbstractContextManager):
+                provided = stack.enter_context(provided)
+        except BaseException:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+        return _Pooled(provided, stack, time.monotonic())
+
+    def _is_healthy(self, pooled: _Pooled) -> bool:
+        if self.health_check is None:
+            return True
+        try:
+            return bool(self.health_check(pooled.obj))
+        except Exception:
+            return False
+
+
+class AsyncPool(_BasePool[T]):
+    """Like `Pool`, but for async functions, within a single event loop.
+
+    `factory` can also be a coroutine function or give an async context manager,
+    and `health_check` can be a coroutine function.
+
+    Examples:
+        >>> channel_pool = tidi.AsyncPool(open_grpc_channel, max_size=8, max_idle=300)
+        >>> @tidi.inject
+        ... async def get_user(
+        ...     user_id: str,
+        ...     channel: tidi.Injected[Channel] = tidi.Provider(channel_pool),
+        ... ):
+        ...     return await UsersStub(channel).Get(user_id)
+
+        Discard the instances when they're no longer needed, e.g. at shutdown
+        >>> await channel_pool.aclose()
+    """
+
+    def __init__(
+        self,
+        factory: (
+            t.Callable[[], T]
+            | t.Callable[[], t.Awaitable[T]]
+            | t.Callable[[], contextlib.AbstractContextManager[T]]
+            | t.Callable[[], contextlib.AbstractAsyncContextManager[T]]
+        ),
+        max_size: int = 10,
+        timeout: float | None = None,
+        max_idle: float | None = None,
+        health_check: t.Callable[[T], bool] | t.Callable[[T], t.Awaitable[bool]] | None = None,
+    ) -> None:
+        super().__init__(factory, max_size, timeout, max_idle, health_check)
+        self._condition = asyncio.Condition()
+
+    def __call__(self) -> contextlib.AbstractAsyncContextManager[T]:
+        return self.checkout()
+
+    @contextlib.asynccontextmanager
+    async def checkout(self) -> t.AsyncIterator[T]:
+        """Checks out an instance until the async context manager exits."""
+        pooled = await self._acquire()
+        try:
+            yield pooled.obj
+        finally:
+            async with self._condition:
+                discarded = self._give_back(pooled)
+                self._condition.notify(1 + len(discarded))
+            await _discard_async(discarded)
+
+    async def aclose(self) -> None:
+        """Discards the idle instances, & any checked out ones once they're returned."""
+        async with self._condition:
+            discarded = self._close_idle()
+            self._condition.notify_all()
+        await _discard_async(discarded)
+
+    async def _acquire(self) -> _Pooled:
+        deadline = self._deadline()
+        while True:
+            async with self._condition:
+                discarded = self._evict_idle()
+                while True:
+                    try:
+                        pooled = self._take()
+                        break
+                    except _Full:
+                        remaining = None if deadline is None else deadline - time.monotonic()
+                        try:
+                            await asyncio.wait_for(self._condition.wait(), remaining)
+                        except asyncio.TimeoutError:
+                            self._timed_out()
+            await _discard_async(discarded)
+            if pooled is None:
+                return await self._create()
+            if await self._is_healthy(pooled):
+                return pooled
+            async with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            await _discard_async([pooled])
+
+    async def _create(self) -> _Pooled:
+        stack = contextlib.AsyncExitStack()
+        try:
+            provided = self.factory()
+            if inspect.isawaitable(provided):
+                provided = await provided
+            if isinstance(provided, contextlib.AbstractAsyncContextManager):
+                provided = await stack.enter_async_context(provided)
+            elif isinstance(provided, contextlib.AbstractContextManager):
+                provided = stack.enter_context(provided)
+        except BaseException:
+            async with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+        return _Pooled(provided, stack, time.monotonic())
+
+    async def _is_healthy(self, pooled: _Pooled) -> bool:
+        if self.health_check is None:
+            return True
+        try:
+            healthy = self.health_check(pooled.obj)
+            if inspect.isawaitable(healthy):
+                healthy = await healthy
+            return bool(healthy)
+        except Exception:
+            return False
+
+
+def _discard(discarded: list[_Pooled]) -> None:
+    for pooled in discarded:
+        with contextlib.suppress(Exception):  # a broken instance shouldn't fail the call
+            t.cast(contextlib.ExitStack, pooled.stack).close()
+
+
+async def _discard_async(discarded: list[_Pooled]) -> None:
+    for pooled in discarded:
+        with contextlib.suppress(Exception):  # a broken instance shouldn't fail the call
+            await t.cast(contextlib.AsyncExitStack, pooled.stack).aclose()
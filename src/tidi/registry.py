@@ -1,8 +1,21 @@
 """Provides a `TidiRegistry`, responsible for providing stored dependencies."""
 
+import asyncio
 import builtins
+import contextlib
+import contextvars
+import copy
+import dataclasses
+import gc
+import itertools
+import os
+import pickle
 import threading
 import typing as t
+import warnings
+import weakref
+
+from tidi import keys
 
 T = t.TypeVar("T")
 
@@ -13,6 +26,9 @@ class _Unknown:
 
 _unknown = _Unknown()
 
+_MAX_CACHED_VIEWS = 64
+"""The most views a registry caches anything for, e.g. one per thread, before starting afresh."""
+
 
 class RegistrationError(TypeError):
     """Error finding desired type in registry"""
@@ -22,13 +38,26 @@ class RegistryLookupError(LookupError):
     """Error finding desired type in registry"""
 
 
+class AmbiguousLookupError(RegistryLookupError):
+    """More than one registered type could be used for the desired type"""
+
+
 class _Container(t.Protocol):
     def add(self, obj: T, type_: t.Type[T]):
         ...  # pragma: no cover
 
+    def add_many(self, objs: t.Mapping[t.Type, t.Any]):
+        ...  # pragma: no cover
+
     def get(self, type_: t.Type[T], default: T | None = None) -> T:
         ...  # pragma: no cover
 
+    def items(self) -> t.Iterable[tuple[t.Type, t.Any]]:
+        ...  # pragma: no cover
+
+    def view(self) -> object:
+        ...  # pragma: no cover
+
 
 class _PerThreadContainer(threading.local):
     def __init__(self):
@@ -37,40 +66,447 @@ class _PerThreadContainer(threading.local):
     def add(self, obj: T, type_: t.Type[T]):
         self._map[type_] = obj
 
+    def add_many(self, objs: t.Mapping[t.Type, t.Any]):
+        self._map.update(objs)
+
     def get(self, type_: t.Type[T], default: T | None = None) -> T:
         return self._map.get(type_, default)
 
+    def items(self) -> t.Iterable[tuple[t.Type, t.Any]]:
+        return self._map.items()
+
+    def view(self) -> object:
+        return self._map
+
+
+class SharedContainer:
+    """A container shared by all threads, for registering dependencies once at startup.
+
+    Reads are a single lookup in an immutable snapshot of the map, without a lock.
+    Writes copy the snapshot & swap the new one in atomically.
+
+    Examples:
+        >>> tidi_registry = TidiRegistry(container_cls=SharedContainer)
+    """
+
+    def __init__(self) -> None:
+        self._map: dict[t.Type, t.Any] = {}
+        self._write_lock = threading.Lock()
+
+    def add(self, obj: T, type_: t.Type[T]):
+        with self._write_lock:
+            self._map = {**self._map, type_: obj}
+
+    def add_many(self, objs: t.Mapping[t.Type, t.Any]):
+        with self._write_lock:
+            self._map = {**self._map, **objs}
+
+    def get(self, type_: t.Type[T], default: T | None = None) -> T:
+        return self._map.get(type_, default)
+
+    def items(self) -> t.Iterable[tuple[t.Type, t.Any]]:
+        return self._map.items()
+
+    def view(self) -> object:
+        return self
+
+
+class ContextContainer:
+    """A container for asyncio apps, where each task has its own registrations.
+
+    Registrations made outside of an asyncio task go into a base layer shared by
+    every thread & task, like `SharedContainer`. Registrations made inside a task
+    go into a copy-on-write overlay held in a `contextvars.ContextVar`, so are
+    only seen by that task & the tasks it creates afterwards.
+
+    Tasks start without an overlay of their own, so there's nothing to set up
+    per task, and an overlay is only copied when a task registers something.
+
+    Examples:
+        >>> tidi_registry = TidiRegistry(container_cls=ContextContainer)
+        >>> tidi_registry.register(db_pool)  # at startup, seen by all tasks
+        >>> async def handle(request):
+        ...     tidi_registry.register(request.user)  # only seen by this task
+    """
+
+    def __init__(self) -> None:
+        self._base = SharedContainer()
+        self._overlay: contextvars.ContextVar[dict[t.Type, t.Any] | None] = contextvars.ContextVar(
+            f"tidi_overlay_{id(self)}", default=None
+        )
+
+    def add(self, obj: T, type_: t.Type[T]):
+        self.add_many({type_: obj})
+
+    def add_many(self, objs: t.Mapping[t.Type, t.Any]):
+        if not _in_asyncio_task():
+            self._base.add_many(objs)
+            return
+        self._overlay.set({**(self._overlay.get() or {}), **objs})
+
+    def get(self, type_: t.Type[T], default: T | None = None) -> T:
+        overlay = self._overlay.get()
+        if overlay and type_ in overlay:
+            return overlay[type_]
+        return self._base.get(type_, default)
+
+    def items(self) -> t.Iterable[tuple[t.Type, t.Any]]:
+        return {**dict(self._base.items()), **(self._overlay.get() or {})}.items()
+
+    def view(self) -> object:
+        return self._overlay.get() or self._base
+
+
+class FrozenContainer:
+    """An immutable container, that `TidiRegistry.freeze` switches to.
+
+    Reads are a single lookup in a map that never changes, so never need a lock.
+    """
+
+    def __init__(self, objs: t.Mapping[t.Type, t.Any] | None = None) -> None:
+        self._map: dict[t.Type, t.Any] = dict(objs or {})
+
+    def add(self, obj: T, type_: t.Type[T]):
+        raise RegistrationError(f"Trying to register in a frozen registry: {type_}")
+
+    def add_many(self, objs: t.Mapping[t.Type, t.Any]):
+        raise RegistrationError(
+            f"Trying to register in a frozen registry: {', '.join(map(str, objs))}"
+        )
+
+    def get(self, type_: t.Type[T], default: T | None = None) -> T:
+        return self._map.get(type_, default)
+
+    def items(self) -> t.Iterable[tuple[t.Type, t.Any]]:
+        return self._map.items()
+
+    def view(self) -> object:
+        return self
+
+
+def _in_asyncio_task() -> bool:
+    try:
+        return asyncio.current_task() is not None
+    except RuntimeError:  # no running event loop
+        return False
+
+
+_BUILTIN_TYPES = frozenset(type_ for type_ in builtins.__dict__.values() if isinstance(type_, type))
+"""The types banned from being registered by default."""
+
 
 class TidiRegistry:
-    """A simple registry of objects indexed by their type."""
+    """A simple registry of objects indexed by their type.
+
+    If nothing was registered with the exact type being looked for, an object
+    registered with a subclass of it is used instead. This includes subclasses
+    of ABCs and classes implementing a `typing.runtime_checkable` `Protocol`
+    that only has methods. Banned types are never looked up this way.
+
+    Types are normalised by `tidi.keys.type_key`, so e.g. `typing.List[User]`
+    finds what was registered with `list[User]`. If nothing was registered with
+    a parametrised generic, e.g. `Repository[User]`, its unparametrised class is
+    looked up instead.
+    """
 
     def __init__(
         self,
-        banned_types: list[t.Type] | None = None,
+        banned_types: t.Iterable[t.Type] | None = None,
         container_cls: t.Type[_Container] = _PerThreadContainer,
     ):
-        if banned_types is None:
-            banned_types = [
-                type_ for type_ in builtins.__dict__.values() if isinstance(type_, type)
-            ]
-        self.banned_types = banned_types
+        # shared by registries by default, as building it means scanning the builtins
+        self.banned_types = _BUILTIN_TYPES if banned_types is None else frozenset(banned_types)
         self._container = container_cls()
+        self._registered_types: set[t.Type] = set()
+        self._subtypes_index: dict[t.Any, tuple[t.Type, ...]] = {}
+        self._fork_unsafe: dict[t.Type, t.Callable[[], t.Any] | None] = {}
+        self._generations = itertools.count(1)
+        self._pinned: dict[int, tuple[object, int, TidiRegistry]] = {}
+        self.generation = 0
+        """Increases every time anything is registered, so lookups can be cached until it does."""
 
-    def register(self, obj: T, type_: t.Type[T] | None = None):
+    def register(
+        self,
+        obj: T,
+        type_: t.Type[T] | None = None,
+        fork_unsafe: bool | t.Callable[[], T] = False,
+    ):
         """Register an instance `obj` of class `T` to be available for injection.
 
         Args:
             obj (typing.Any): The instance to register
-
+            type_ (typing.Type[T] | None, optional): the type to register it with.
+                Defaults to None, the type of `obj`.
+            fork_unsafe (bool | typing.Callable[[], T], optional): whether `obj`
+                mustn't be used by a process forked from this one, e.g. a socket.
+                If so, forked children drop it, or if it's a function, call it to
+                create one of their own. Defaults to False, sharing `obj` with them.
 
         Raises:
-            RegistrationError: if trying to register a banned type (a builtin type by default).
+            RegistrationError: if trying to register a banned type (a builtin type by default),
+                or the registry is frozen.
+
+        Examples:
+            Under a pre-fork server, load a model once to share with every worker,
+            but connect to the database in each
+            >>> tidi.register(load_model())
+            >>> tidi.register(connect_to_db(), fork_unsafe=connect_to_db)
         """
-        if type_ is None:
-            type_ = type(obj)
+        if self.frozen:
+            raise RegistrationError(f"Trying to register in a frozen registry: {type(obj)}")
+        type_ = type(obj) if type_ is None else keys.type_key(type_)
         if type_ in self.banned_types:
             raise RegistrationError(f"Trying to register a banned type: {type_}")
+        self._index_types((type_,))
         self._container.add(obj, type_)
+        if fork_unsafe is False:
+            self._mark_fork_unsafe((type_,), {})
+        else:
+            self._mark_fork_unsafe((type_,), {type_: None if fork_unsafe is True else fork_unsafe})
+        self.generation = next(self._generations)
+
+    def register_many(
+        self,
+        objs: t.Iterable[t.Any] | t.Mapping[t.Type, t.Any],
+        fork_unsafe: bool | t.Mapping[t.Type, t.Callable[[], t.Any]] = False,
+    ):
+        """Register several instances at once, all of them or none become available.
+
+        Args:
+            objs (typing.Iterable | typing.Mapping): the instances to register,
+                or a mapping of the types to register them with to the instances.
+            fork_unsafe (bool | typing.Mapping[typing.Type, typing.Callable[[], typing.Any]], optional):
+                whether the instances mustn't be used by a process forked from
+                this one, like for `register`. If a mapping, of the types of those
+                that mustn't to functions their forked children call to create
+                their own. Defaults to False, sharing them all.
+
+        Raises:
+            RegistrationError: if trying to register a banned type (a builtin type by default),
+                or the registry is frozen.
+
+        Examples:
+            >>> tidi.default_tidi_registry.register_many(
+            ...     [load_model(), connect_to_db()], fork_unsafe={DBConnection: connect_to_db}
+            ... )
+        """
+        if self.frozen:
+            raise RegistrationError("Trying to register in a frozen registry")
+        if not isinstance(objs, t.Mapping):
+            objs = {type(obj): obj for obj in objs}
+        else:
+            objs = {keys.type_key(type_): obj for type_, obj in objs.items()}
+        for type_ in objs:
+            if type_ in self.banned_types:
+                raise RegistrationError(f"Trying to register a banned type: {type_}")
+        self._index_types(objs)
+        self._container.add_many(objs)
+        self._mark_fork_unsafe(
+            objs,
+            dict.fromkeys(objs, None)
+            if fork_unsafe is True
+            else {keys.type_key(type_): create for type_, create in (fork_unsafe or {}).items()},
+        )
+        self.generation = next(self._generations)
+
+    def _mark_fork_unsafe(
+        self, types: t.Iterable[t.Type], marks: t.Mapping[t.Type, t.Callable[[], t.Any] | None]
+    ):
+        """Replaces the `fork_unsafe` marks of the newly registered `types`."""
+        for type_ in types:
+            self._fork_unsafe.pop(type_, None)
+        if marks:
+            self._fork_unsafe.update(marks)
+            _fork_aware_registries.add(self)
+
+    def use_container(self, container_cls: t.Type[_Container]):
+        """Switch to a new type of container, keeping the current registrations.
+
+        Only the registrations visible from the calling thread are kept.
+
+        Args:
+            container_cls (typing.Type[_Container]): e.g. `SharedContainer`.
+
+        Examples:
+            Share the default registry between all threads
+            >>> tidi.default_tidi_registry.use_container(tidi.registry.SharedContainer)
+        """
+        container = container_cls()
+        container.add_many(dict(self._container.items()))
+        self._container = container
+        self.generation = next(self._generations)
+
+    @property
+    def frozen(self) -> bool:
+        """Whether `freeze` has been called, so nothing more can be registered."""
+        return isinstance(self._container, FrozenContainer)
+
+    def freeze(self, gc_freeze: bool = False):
+        """Stops anything more being registered, to only read from it from now on.
+
+        Switches to a `FrozenContainer` of the registrations visible from the
+        calling thread, which every thread then shares. As nothing can change,
+        lookups that `tidi.inject` caches stay valid for good.
+
+        Args:
+            gc_freeze (bool, optional): whether to also call `gc.freeze`, moving
+                every object the garbage collector tracks (not just what's
+                registered) out of its reach. Do it last thing before forking
+                workers, so their collections don't write to, & so copy, the
+                memory shared with them. Defaults to False.
+
+        Examples:
+            Register everything at startup, check it's enough, then freeze it
+            >>> tidi.register(load_config())
+            >>> tidi.preflight()
+            >>> tidi.default_tidi_registry.freeze()
+        """
+        if not self.frozen:
+            self._container = FrozenContainer(dict(self._container.items()))
+            self.generation = next(self._generations)
+        if gc_freeze:
+            gc.freeze()
+
+    def current_view(self) -> object:
+        """Identifies the set of registrations visible to the caller.
+
+        Together with `generation`, this tells whether a cached lookup is still
+        valid, e.g. the per-thread container has a different view per thread.
+        """
+        return self._container.view()
+
+    def pinned(self) -> "TidiRegistry":
+        """A copy of the registrations visible to the caller, that any thread sees.
+
+        Used to resolve dependencies on other threads on the caller's behalf.
+        If every thread sees the same registrations already, that's the registry
+        itself, otherwise the copy is cached until anything more is registered.
+        """
+        if isinstance(self._container, (SharedContainer, FrozenContainer)):
+            return self
+        return self._cached_pinned(self._container.view(), self._pin)
+
+    def _pin(self) -> "TidiRegistry":
+        pinned = copy.copy(self)
+        pinned._pinned = {}
+        pinned._container = SharedContainer()
+        pinned._container.add_many(dict(self._container.items()))
+        return pinned
+
+    def _cached_pinned(self, view: object, pin: t.Callable[[], "TidiRegistry"]) -> "TidiRegistry":
+        """The pinned copy for `view`, made by `pin` unless it's cached for this generation."""
+        generation = self.generation  # before copying, so a registration meanwhile misses
+        cached = self._pinned.get(id(view))
+        if cached is not None and cached[0] is view and cached[1] == generation:
+            return cached[2]
+        pinned = pin()
+        if len(self._pinned) >= _MAX_CACHED_VIEWS:
+            self._pinned.clear()
+        self._pinned[id(view)] = (view, generation, pinned)
+        return pinned
+
+    def child(self) -> "ChildRegistry":
+        """A registry of its own, that falls back to this one for what it hasn't registered.
+
+        Cheap enough to create one per request or tenant, as nothing is copied.
+
+        Returns:
+            (ChildRegistry): the new child registry.
+
+        Examples:
+            >>> tenant_registry = tidi.default_tidi_registry.child()
+            >>> tenant_registry.register(tenant_db)
+            >>> with tenant_registry.activate():
+            ...     handle(request)  # functions decorated with `tidi.inject_active` use it
+        """
+        return ChildRegistry(self)
+
+    def snapshot(
+        self,
+        factories: t.Mapping[t.Type, t.Callable[[], t.Any]] | None = None,
+        exclude: t.Iterable[t.Type] = (),
+        freeze: bool = False,
+    ) -> "RegistrySnapshot":
+        """The registrations visible to the caller, to rebuild the registry in another process.
+
+        Args:
+            factories (typing.Mapping[typing.Type, typing.Callable[[], typing.Any]] | None, optional):
+                picklable functions to create the objects to register in the other
+                process, by type, instead of pickling what's registered, e.g. for
+                connections. Defaults to None. Objects registered as `fork_unsafe`
+                are left out, or created by the function given for them.
+            exclude (typing.Iterable[typing.Type], optional): registered types to
+                leave out. Defaults to ().
+            freeze (bool, optional): whether to freeze the rebuilt registry.
+                Defaults to False.
+
+        Raises:
+            RegistrationError: if a registered object (that isn't excluded or
+                replaced by a factory) is unable to be pickled.
+
+        Returns:
+            (RegistrySnapshot): the snapshot, to pass to `RegistrySnapshot.restore`.
+
+        Examples:
+            >>> snapshot = tidi.default_tidi_registry.snapshot(factories={DBConn: connect})
+            >>> executor = ProcessPoolExecutor(initializer=tidi.initialise_worker, initargs=(snapshot,))
+        """
+        unsafe = self._fork_unsafe
+        factories = {
+            **{type_: create for type_, create in unsafe.items() if create is not None},
+            **(factories or {}),
+        }
+        skipped = {*factories, *exclude, *(type_ for type_, create in unsafe.items() if not create)}
+        instances = {type_: obj for type_, obj in self._container.items() if type_ not in skipped}
+        unpicklable = []
+        for type_, obj in instances.items():
+            try:
+                pickle.dumps(obj)
+            except Exception:
+                unpicklable.append(type_)
+        if unpicklable:
+            raise RegistrationError(
+                f"Unable to pickle the objects registered for {', '.join(map(str, unpicklable))}, "
+                "give factories to create them instead, or exclude them"
+            )
+        return RegistrySnapshot(instances, factories, freeze)
+
+    def _after_fork_in_child(self):
+        """Drops or re-creates the registrations marked `fork_unsafe`, in a forked child."""
+        objs = dict(self._container.items())
+        for type_, recreate in self._fork_unsafe.items():
+            if type_ not in objs:
+                continue
+            if recreate is None:
+                del objs[type_]
+                continue
+            try:
+                objs[type_] = recreate()
+            except Exception as err:
+                del objs[type_]
+                warnings.warn(
+                    f"Unable to re-create {type_} after forking, so it's no longer registered: "
+                    f"{err!r}",
+                    RuntimeWarning,
+                )
+        # a new container, as any of its locks could have been held by another thread
+        self._replace_container(objs, freeze=self.frozen)
+
+    def _restore(self, objs: t.Mapping[t.Type, t.Any], freeze: bool):
+        """Adds `objs` to what's registered, in a new container, even if the registry is frozen."""
+        for type_ in objs:
+            if type_ in self.banned_types:
+                raise RegistrationError(f"Trying to register a banned type: {type_}")
+        self._index_types(objs)
+        self._replace_container({**dict(self._container.items()), **objs}, freeze or self.frozen)
+
+    def _replace_container(self, objs: dict[t.Type, t.Any], freeze: bool):
+        if freeze:
+            self._container = FrozenContainer(objs)
+        else:
+            self._container = type(self._container)()
+            self._container.add_many(objs)
+        self.generation = next(self._generations)
 
     def get(self, type_: t.Type[T], default: t.Any = _unknown) -> T:
         """Get an instance of type `type_` from the regsitry.
@@ -82,11 +518,227 @@ class TidiRegistry:
         Raises:
             RegistryLookupError: if the instance hasn't been registered and a
                 default hasn't been provided.
+            AmbiguousLookupError: if `type_` wasn't registered but more than
+                one of its subclasses were.
 
         Returns:
             (type_ (T)): the registered object, or default value if it was provided.
         """
-        obj = self._container.get(type_, default)
+        if not isinstance(type_, type):
+            type_ = keys.type_key(type_)
+        obj: t.Any = self._container.get(type_, _unknown)
+        if isinstance(obj, _Unknown):
+            obj = self._get_from_subtype(type_, default)
         if isinstance(obj, _Unknown):
             raise RegistryLookupError(f"Type has not been registered: {type_}")
         return obj
+
+    def _get_from_subtype(self, type_: t.Type[T], default: t.Any) -> t.Any:
+        index = self._subtypes_index  # stays consistent if `register` replaces it meanwhile
+        try:
+            subtypes = index[type_]
+        except KeyError:
+            subtypes = index[type_] = self._find_subtypes(type_)
+        except TypeError:  # unhashable, so can't have been registered
+            return default
+        found = [
+            (subtype, obj)
+            for subtype in subtypes
+            if not isinstance(obj := self._container.get(subtype, _unknown), _Unknown)
+        ]
+        match found:
+            case []:
+                return default
+            case [(_, obj)]:
+                return obj
+            case _:
+                raise AmbiguousLookupError(
+                    f"Type has not been registered: {type_}, but more than one of its "
+                    f"subclasses have been: {', '.join(str(subtype) for subtype, _ in found)}. "
+                    "Register one with `type_` to choose which to use."
+                )
+
+    def _find_subtypes(self, type_: t.Any) -> tuple[t.Type, ...]:
+        if isinstance(origin := t.get_origin(type_), type):  # e.g. `Repository[User]`
+            if origin in self._registered_types:
+                return (origin,)
+            return self._find_subtypes(origin)
+        if not isinstance(type_, type) or type_ in self.banned_types:
+            return ()
+        return tuple(
+            registered_type
+            for registered_type in self._registered_types
+            if registered_type is not type_ and _is_subclass(registered_type, type_)
+        )
+
+    def _index_types(self, types: t.Iterable[t.Type]):
+        new_types = set(types) - self._registered_types
+        if new_types:
+            self._registered_types = self._registered_types | new_types
+            self._subtypes_index = {}
+
+
+class ChildRegistry(TidiRegistry):
+    """A registry layered over a parent, made by `TidiRegistry.child`.
+
+    Lookups try what's registered in the child first, like `TidiRegistry.get`,
+    then fall back to the parent, so registering in the child overrides the
+    parent without changing it. Its registrations are shared by all threads.
+
+    Args:
+        parent (TidiRegistry): the registry to fall back to.
+    """
+
+    def __init__(self, parent: TidiRegistry) -> None:
+        self.parent = parent
+        self.root: TidiRegistry = parent.root if isinstance(parent, ChildRegistry) else parent
+        self._own_generation = 0
+        self._views: dict[int, tuple[object, object]] = {}
+        super().__init__(banned_types=parent.banned_types, container_cls=SharedContainer)
+
+    @property
+    def generation(self) -> int:
+        """Increases whenever anything is registered in this registry or its parents."""
+        return self._own_generation + self.parent.generation
+
+    @generation.setter
+    def generation(self, generation: int) -> None:
+        self._own_generation = generation
+
+    def current_view(self) -> object:
+        # cached so it's the same object each time, bounded as the parent's views
+        # can be per thread or task
+        own_view, parent_view = self._container.view(), self.parent.current_view()
+        view = self._views.get(id(parent_view))
+        if view is None or view[1] is not parent_view or view[0] is not own_view:
+            if len(self._views) >= _MAX_CACHED_VIEWS:
+                self._views.clear()
+            view = self._views[id(parent_view)] = (own_view, parent_view)
+        return view
+
+    def pinned(self) -> "ChildRegistry":
+        parent = self.parent.pinned()
+        shared = isinstance(self._container, (SharedContainer, FrozenContainer))
+        if parent is self.parent and shared:
+            return self
+        if not shared:  # e.g. after `use_container`
+            return self._pin_over(parent)
+        # the parent's pinned copy stays the same until anything more is registered
+        return t.cast(ChildRegistry, self._cached_pinned(parent, lambda: self._pin_over(parent)))
+
+    def _pin_over(self, parent: TidiRegistry) -> "ChildRegistry":
+        pinned = copy.copy(self)
+        pinned.parent = parent
+        pinned._pinned = {}
+        pinned._views = {}
+        if not isinstance(self._container, (SharedContainer, FrozenContainer)):
+            pinned._container = SharedContainer()
+            pinned._container.add_many(dict(self._container.items()))
+        return pinned
+
+    def get(self, type_: t.Type[T], default: t.Any = _unknown) -> T:
+        if not isinstance(type_, type):
+            type_ = keys.type_key(type_)
+        obj: t.Any = self._container.get(type_, _unknown)
+        if isinstance(obj, _Unknown):
+            obj = self._get_from_subtype(type_, _unknown)
+        if isinstance(obj, _Unknown):
+            return self.parent.get(type_, default)
+        return obj
+
+    @contextlib.contextmanager
+    def activate(self) -> t.Iterator["ChildRegistry"]:
+        """Makes this the registry used by an `ActiveRegistry` of its root, in this context.
+
+        Examples:
+            >>> with tenant_registry.activate():
+            ...     handle(request)
+        """
+        token = _active_registry.set(self)
+        try:
+            yield self
+        finally:
+            _active_registry.reset(token)
+
+
+_active_registry: contextvars.ContextVar[ChildRegistry | None] = contextvars.ContextVar(
+    "tidi_active_registry", default=None
+)
+
+
+class ActiveRegistry:
+    """Looks things up in the child registry activated in the current context.
+
+    Falls back to the `root` registry if no child of it has been activated, see
+    `ChildRegistry.activate`. Give it to `tidi.decorator.inject` to have the
+    decorated functions use whichever child is active when they're called.
+
+    Args:
+        root (TidiRegistry): the registry whose children to use.
+
+    Examples:
+        >>> inject_tenant = tidi.decorator.inject(ActiveRegistry(tidi.default_tidi_registry))
+    """
+
+    def __init__(self, root: TidiRegistry) -> None:
+        self.root = root
+
+    def current(self) -> TidiRegistry:
+        """The active child of `root`, or `root` itself if there isn't one."""
+        active = _active_registry.get()
+        if active is not None and active.root is self.root:
+            return active
+        return self.root
+
+    def get(self, type_: t.Type[T], default: t.Any = _unknown) -> T:
+        return self.current().get(type_, default)
+
+    def pinned(self) -> TidiRegistry:
+        return self.current().pinned()
+
+
+_fork_aware_registries: weakref.WeakSet[TidiRegistry] = weakref.WeakSet()
+"""The registries with registrations marked `fork_unsafe`."""
+
+
+def _after_fork_in_child() -> None:
+    for registry in list(_fork_aware_registries):
+        registry._after_fork_in_child()
+
+
+if hasattr(os, "register_at_fork"):  # not on Windows
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def _is_subclass(cls: t.Type, class_or_protocol: t.Type) -> bool:
+    try:
+        return issubclass(cls, class_or_protocol)
+    except TypeError:  # e.g. a `Protocol` that isn't `runtime_checkable`, or has data members
+        return False
+
+
+@dataclasses.dataclass(frozen=True)
+class RegistrySnapshot:
+    """The registrations of a `TidiRegistry`, made by `TidiRegistry.snapshot`, to be pickled.
+
+    Attributes:
+        instances (typing.Mapping[typing.Type, typing.Any]): the registered objects,
+            by the type they were registered with.
+        factories (typing.Mapping[typing.Type, typing.Callable[[], typing.Any]]):
+            functions to create objects to register, by type, called by `restore`.
+        freeze (bool): whether `restore` freezes the registry.
+    """
+
+    instances: t.Mapping[t.Type, t.Any] = dataclasses.field(default_factory=dict)
+    factories: t.Mapping[t.Type, t.Callable[[], t.Any]] = dataclasses.field(default_factory=dict)
+    freeze: bool = False
+
+    def restore(self, registry: TidiRegistry) -> None:
+        """Registers the snapshot's objects in `registry`, calling the factories to create some.
+
+        They're added to a new container rather than registered, as a forked
+        worker inherits the parent's registry, which may be frozen. If it is,
+        it's frozen again afterwards.
+        """
+        objs = {**self.instances, **{type_: create() for type_, create in self.factories.items()}}
+        registry._restore(objs, self.freeze)
@@ -1,8 +1,16 @@
 """Finds or creates dependency instances based on availability and options."""
 
+import asyncio
+import collections.abc
 import contextlib
+import dataclasses
+import functools
+import inspect
+import time
 import typing as t
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+
+from tidi import lazy, metrics, scopes
 
 T = t.TypeVar("T")
 
@@ -16,6 +24,10 @@ class DependencyResolutionError(Exception):
     """Unable to resolve dependency"""
 
 
+class ExitStackRequiredError(DependencyResolutionError):
+    """A provider gave a context manager, but there's no exit stack to enter it on."""
+
+
 @dataclass(frozen=True)
 class ResolverOptions:
     """Options that control how resolving is done.
@@ -23,11 +35,295 @@ class ResolverOptions:
     Args:
         use_registry (bool): whether to try using the registry or not.
         initialise_missing (bool): whether to try to initialise the dependency or not.
+        scope (tidi.scopes.Scope): how long an initialised dependency lives for.
+            Defaults to `Scope.TRANSIENT`.
+        lazy (bool): whether to give a `tidi.lazy.LazyProxy` that resolves the
+            dependency when it's first used. Defaults to False.
 
     """
 
     use_registry: bool
     initialise_missing: bool
+    scope: scopes.Scope = scopes.Scope.TRANSIENT
+    lazy: bool = False
+
+
+def options_from_metadata(metadata: t.Iterable) -> ResolverOptions:
+    """Finds the `ResolverOptions` in `typing.Annotated` metadata.
+
+    A `tidi.scopes.Scope` anywhere in the metadata overrides the options' scope,
+    e.g. `typing.Annotated[tidi.Injected[Config], tidi.Scope.SINGLETON]`, and
+    `tidi.lazy.LAZY` makes the dependency lazy (which is what `tidi.Lazy` does).
+
+    Raises:
+        StopIteration: if there aren't any `ResolverOptions` in the metadata.
+    """
+    metadata = tuple(metadata)
+    resolver_options = next(item for item in metadata if isinstance(item, ResolverOptions))
+    for item in metadata:
+        if isinstance(item, scopes.Scope):
+            resolver_options = dataclasses.replace(resolver_options, scope=item)
+        elif item is lazy.LAZY:
+            resolver_options = dataclasses.replace(resolver_options, lazy=True)
+    return resolver_options
+
+
+ProviderFunc = (
+    t.Callable[..., T]
+    | t.Callable[..., contextlib.AbstractContextManager[T]]
+    | t.Callable[..., t.Awaitable[T]]
+    | t.Callable[..., contextlib.AbstractAsyncContextManager[T]]
+)
+ExitStack = contextlib.ExitStack | contextlib.AsyncExitStack
+Resolved = dict[t.Hashable, t.Any]
+"""Dependencies already resolved during a call, so shared ones are only resolved once."""
+_Strategy = t.Callable[
+    ["DependencyPlan", Registry | None, ExitStack | None, Resolved | None], t.Any
+]
+
+
+@dataclass(frozen=True)
+class DependencyPlan(t.Generic[T]):
+    """Precompiled, immutable instructions for resolving a single dependency.
+
+    Built once by `compile_dependency` (e.g. when `tidi.inject` decorates a
+    function), so resolving only has to follow the already chosen strategy.
+
+    The plans in `dependencies` are resolved first, when the dependency has to
+    be provided or initialised, and passed to it as keyword arguments. So a
+    plan is a node of an (acyclic) dependency graph, resolved depth first.
+
+    Args:
+        type_ (typing.Type[T]): the type of the dependency being looked for.
+        resolver_options (ResolverOptions): options dictating how to resolve
+            the dependency.
+        provider (ProviderFunc | None): an optional function or context
+            manager that provides the dependency.
+        is_context_manager (bool): `True` if the provider may give a context
+            manager that has to be entered, `False` if it definitely won't.
+        is_async (bool): `True` if the provider is a coroutine function or
+            gives an async context manager (or any of `dependencies` are async),
+            so can only be used via `resolve_async`.
+        uses_registry (bool): `True` if a registered dependency, when there is one,
+            is what will be resolved.
+        dependencies (tuple[tuple[str, DependencyPlan], ...]): the plans for the
+            provider's (or type's) own injectable parameters, by parameter name.
+        needs_exit_stack (bool): `True` if this or any of `dependencies` may
+            enter a context manager.
+    """
+
+    type_: t.Type[T]
+    resolver_options: ResolverOptions
+    provider: ProviderFunc | None
+    is_context_manager: bool
+    is_async: bool
+    uses_registry: bool
+    dependencies: tuple[tuple[str, "DependencyPlan"], ...]
+    needs_exit_stack: bool
+    _strategy: _Strategy = field(repr=False, compare=False)
+
+    def resolve(
+        self,
+        registry: Registry | None,
+        stack: ExitStack | None = None,
+        resolved: Resolved | None = None,
+    ) -> T:
+        """Resolves the dependency.
+
+        Args:
+            registry (Registry | None): the registry to look the dependency up in.
+            stack (contextlib.ExitStack | None, optional): the stack to enter any
+                provided context manager on. Only required if `needs_exit_stack`.
+            resolved (Resolved | None, optional): the dependencies resolved so far
+                in this call, to reuse & add to. Defaults to not sharing any.
+
+        Returns:
+            (type requested (T)): an instance of the dependency requested.
+        """
+        if resolved is None:
+            return self._strategy(self, registry, stack, None)
+        key = self.key
+        try:
+            return resolved[key]
+        except KeyError:
+            pass
+        obj = self._strategy(self, registry, stack, resolved)
+        if isinstance(obj, _Pending):  # so it can be awaited by each dependant
+            obj = _Pending(asyncio.ensure_future(obj.awaitable))
+        resolved[key] = obj
+        return obj
+
+    async def resolve_async(
+        self,
+        registry: Registry | None,
+        stack: ExitStack | None = None,
+        resolved: Resolved | None = None,
+    ) -> T:
+        """Resolves the dependency, awaiting any async provider.
+
+        Args:
+            registry (Registry | None): the registry to look the dependency up in.
+            stack (contextlib.AsyncExitStack | None, optional): the stack to enter
+                any provided (async) context manager on. Only required if
+                `needs_exit_stack`.
+            resolved (Resolved | None, optional): the dependencies resolved so far
+                in this call, to reuse & add to. Defaults to not sharing any.
+
+        Returns:
+            (type requested (T)): an instance of the dependency requested.
+        """
+        obj = self.resolve(registry, stack, resolved)
+        if isinstance(obj, _Pending):
+            return await obj.awaitable
+        return obj
+
+    @property
+    def key(self) -> t.Hashable:
+        """Identifies the node in a dependency graph, equal for plans that resolve the same."""
+        return (self.type_, self.provider, self.resolver_options)
+
+    def with_provider(
+        self,
+        provider: ProviderFunc,
+        dependencies: tuple[tuple[str, "DependencyPlan"], ...] = (),
+    ) -> "DependencyPlan[T]":
+        """Returns a copy of the plan that uses a different provider (& its dependencies)."""
+        return dataclasses.replace(
+            self, provider=provider, is_context_manager=_is_context_manager_provider(provider)
+        ).with_dependencies(dependencies)
+
+    def with_dependencies(
+        self, dependencies: tuple[tuple[str, "DependencyPlan"], ...]
+    ) -> "DependencyPlan[T]":
+        """Returns a copy of the plan that resolves `dependencies` to provide the dependency."""
+        return dataclasses.replace(
+            self,
+            dependencies=dependencies,
+            is_async=_is_async_provider(self.provider)
+            or any(dependency.is_async for _, dependency in dependencies),
+            needs_exit_stack=self.is_context_manager
+            or any(dependency.needs_exit_stack for _, dependency in dependencies),
+        )
+
+
+def compile_dependency(
+    type_: t.Type[T],
+    resolver_options: ResolverOptions,
+    registry: Registry | None = None,
+    provider: ProviderFunc | None = None,
+    instances: scopes.ScopedInstances | None = None,
+) -> DependencyPlan[T]:
+    """Chooses how to resolve a dependency, ahead of it being resolved.
+
+    Args:
+        type_ (typing.Type[T]): the type of the dependency being looked for.
+        resolver_options (ResolverOptions): options dictating how to resolve
+            the dependency.
+        registry (Registry | None, optional): the registry that will be used
+            when resolving. Defaults to None.
+        provider: (ProviderFunc | None): an optional function or context
+            manager that provides the dependency. Defaults to None.
+        instances (tidi.scopes.ScopedInstances | None, optional): where to cache
+            dependencies that aren't `Scope.TRANSIENT`. Defaults to
+            `tidi.scopes.default_instances`.
+
+    Returns:
+        (DependencyPlan[T]): the plan to resolve the dependency with.
+    """
+    is_context_manager = _is_context_manager_provider(provider)
+    initialise: _Strategy = _initialise_dependency
+    match resolver_options:
+        case ResolverOptions(scope=scopes.Scope.TRANSIENT):
+            pass
+        case ResolverOptions(scope=scopes.Scope.REQUEST):
+            initialise = _request_scoped
+        case ResolverOptions(scope=scope):
+            initialise = _scoped(scope, instances or scopes.default_instances)
+    strategy: _Strategy
+    uses_registry = False
+    match resolver_options:
+        case ResolverOptions(use_registry=True, initialise_missing=False) if registry is not None:
+            strategy, uses_registry = _from_registry, True
+        case ResolverOptions(use_registry=True, initialise_missing=False) if registry is None:
+            strategy = _registry_required
+        case ResolverOptions(use_registry=True, initialise_missing=True) if registry is not None:
+            strategy, uses_registry = _from_registry_or(initialise), True
+        case ResolverOptions(initialise_missing=True) if registry is None:
+            strategy = initialise
+        case _:
+            strategy = _unresolvable
+    match resolver_options:
+        case ResolverOptions(lazy=True):
+            strategy = _lazily(strategy)
+    return DependencyPlan(
+        type_=type_,
+        resolver_options=resolver_options,
+        provider=provider,
+        is_context_manager=is_context_manager,
+        is_async=_is_async_provider(provider),
+        uses_registry=uses_registry,
+        dependencies=(),
+        needs_exit_stack=is_context_manager,
+        _strategy=strategy,
+    )
+
+
+def check_dependency(plan: DependencyPlan, registry: Registry | None) -> list[str]:
+    """Finds what would stop the dependency from being resolved, without resolving it.
+
+    Only what can be known beforehand is checked, e.g. whether it's registered or
+    its type can be initialised, not whether calling a provider will succeed.
+
+    Args:
+        plan (DependencyPlan): the plan to check, along with its dependencies.
+        registry (Registry | None): the registry it will be resolved with.
+
+    Returns:
+        (list[str]): a description of each problem, empty if there aren't any.
+    """
+    # mirrors the choice of strategy in `compile_dependency`
+    match plan.resolver_options:
+        case ResolverOptions(use_registry=True) if registry is not None:
+            try:
+                if registry.get(plan.type_, None) is not None:
+                    return []
+            except LookupError as err:
+                return [str(err)]
+            if not plan.resolver_options.initialise_missing:
+                return [f"{_describe(plan.type_)} has not been registered"]
+        case ResolverOptions(use_registry=True, initialise_missing=False) if registry is None:
+            return [f"{_describe(plan.type_)} requires a registry but there isn't one"]
+        case ResolverOptions(initialise_missing=True) if registry is None:
+            pass
+        case _:
+            return [f"{_describe(plan.type_)} is unable to be resolved with these options"]
+    problems = [] if plan.provider is not None else _check_initialisable(plan)
+    for name, dependency in plan.dependencies:
+        problems += [
+            f"{problem}, needed for {name!r} of {_describe(plan.provider or plan.type_)}"
+            for problem in check_dependency(dependency, registry)
+        ]
+    return problems
+
+
+def _check_initialisable(plan: DependencyPlan) -> list[str]:
+    if not isinstance(plan.type_, type):
+        return [f"{_describe(plan.type_)} is unable to be initialised as it isn't a class"]
+    if inspect.isabstract(plan.type_) or getattr(plan.type_, "_is_protocol", False):
+        return [f"{_describe(plan.type_)} is abstract so is unable to be initialised"]
+    try:
+        signature = inspect.signature(plan.type_)
+    except (TypeError, ValueError):  # e.g. some builtins, so assume it's fine
+        return []
+    try:
+        signature.bind(**{name: None for name, _ in plan.dependencies})
+    except TypeError as err:
+        return [f"{_describe(plan.type_)} is unable to be initialised: {err}"]
+    return []
+
+
+def _describe(obj: t.Any) -> str:
+    return getattr(obj, "__qualname__", repr(obj))
 
 
 @contextlib.contextmanager
@@ -35,9 +331,7 @@ def resolve_dependency(
     type_: t.Type[T],
     resolver_options: ResolverOptions,
     registry: Registry | None = None,
-    provider: t.Callable[..., T]
-    | t.Callable[..., contextlib.AbstractContextManager[T]]
-    | None = None,
+    provider: ProviderFunc | None = None,
 ) -> t.Iterator[T]:
     """Returns a dependency according to configured options.
 
@@ -53,46 +347,335 @@ def resolve_dependency(
 
     Raises:
         DependencyResolutionError: if a registry is required but not provided
+        DependencyResolutionError: if the provider is async
         DependencyResolutionError: if the function doesn't know how to handle the situation
 
     Returns:
         (type requested (T)): an instance of the dependency requested.
     """
-    match resolver_options:
-        case ResolverOptions(use_registry=True, initialise_missing=False) if registry is not None:
-            yield registry.get(type_)
-        case ResolverOptions(use_registry=True, initialise_missing=False) if registry is None:
-            raise DependencyResolutionError("Registry required but not provided.")
-        case ResolverOptions(use_registry=True, initialise_missing=True) if registry is not None:
-            obj = registry.get(type_, None)
-            if obj is not None:
-                yield obj
-            else:
-                yield from _initialise_dependency(type_, provider)
-        case ResolverOptions(initialise_missing=True) if registry is None:
-            yield from _initialise_dependency(type_, provider)
-        case _:
-            raise DependencyResolutionError("Unable to resolve dependency.")
+    plan = compile_dependency(type_, resolver_options, registry=registry, provider=provider)
+    if plan.is_async:
+        raise DependencyResolutionError(
+            f"Async provider for {type_} requires `resolve_dependency_async`."
+        )
+    with contextlib.ExitStack() as stack:
+        yield plan.resolve(registry, stack)
 
 
-def _initialise_dependency(
+@contextlib.asynccontextmanager
+async def resolve_dependency_async(
     type_: t.Type[T],
-    provider: t.Callable[..., contextlib.AbstractContextManager[T]] | t.Callable[..., T] | None,
-) -> t.Iterator[T]:
+    resolver_options: ResolverOptions,
+    registry: Registry | None = None,
+    provider: ProviderFunc | None = None,
+) -> t.AsyncIterator[T]:
+    """Async version of `resolve_dependency`, that also accepts async providers.
+
+    Async providers can be coroutine functions or give async context managers.
+
+    Raises:
+        DependencyResolutionError: if a registry is required but not provided
+        DependencyResolutionError: if the function doesn't know how to handle the situation
+
+    Returns:
+        (type requested (T)): an instance of the dependency requested.
+    """
+    plan = compile_dependency(type_, resolver_options, registry=registry, provider=provider)
+    async with contextlib.AsyncExitStack() as stack:
+        yield await plan.resolve_async(registry, stack)
+
+
+async def gather(*awaitables: t.Awaitable[T]) -> list[T]:
+    """Awaits the `awaitables` concurrently, raising the first error once all are done.
+
+    Unlike a plain `asyncio.gather`, nothing keeps running in the background after
+    an error, so any context managers that were entered can be safely exited.
+    """
+    if len(awaitables) == 1:
+        return [await awaitables[0]]
+    results = await asyncio.gather(*awaitables, return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return t.cast(list[T], results)
+
+
+def _from_registry(plan: DependencyPlan[T], registry: t.Any, *_: t.Any) -> T:
+    if metrics.collector is None:
+        return registry.get(plan.type_)
+    obj = registry.get(plan.type_, None)
+    _record_registry_lookup(plan, obj)
+    if obj is None:
+        return registry.get(plan.type_)  # raises as it would have without metrics
+    return obj
+
+
+def _registry_required(*_: t.Any) -> t.NoReturn:
+    raise DependencyResolutionError("Registry required but not provided.")
+
+
+def _from_registry_or(initialise: "_Strategy") -> "_Strategy":
+    def _from_registry_or_initialise(
+        plan: DependencyPlan, registry: t.Any, stack: ExitStack | None, resolved: Resolved | None
+    ) -> t.Any:
+        obj = registry.get(plan.type_, None)
+        if metrics.collector is not None:
+            _record_registry_lookup(plan, obj)
+        if obj is not None:
+            return obj
+        return initialise(plan, registry, stack, resolved)
+
+    return _from_registry_or_initialise
+
+
+def _scoped(scope: scopes.Scope, instances: scopes.ScopedInstances) -> "_Strategy":
+    # what it depends on is resolved afresh, as it's entered on the scope's exit stack
+    # so has to live as long as the scoped instance, rather than the current call
+    def _initialise_scoped_dependency(plan: DependencyPlan, registry: t.Any, *_: t.Any) -> t.Any:
+        return _get_or_create(scope, instances, plan, registry)
+
+    return _initialise_scoped_dependency
+
+
+def _request_scoped(
+    plan: DependencyPlan, registry: t.Any, stack: ExitStack | None, resolved: Resolved | None
+) -> t.Any:
+    request = scopes.current_request()
+    if request is None:  # e.g. resolving outside an injected call, so just for the caller
+        return _initialise_dependency(plan, registry, stack, resolved)
+    return _get_or_create(scopes.Scope.REQUEST, request, plan, registry)
+
+
+def _get_or_create(
+    scope: scopes.Scope, instances: scopes.ScopedInstances, plan: DependencyPlan, registry: t.Any
+) -> t.Any:
+    key = (plan.type_, plan.provider)
+    if plan.is_async:
+        return _Pending(
+            instances.get_or_create_async(scope, key, _initialise_dependency_async, plan, registry)
+        )
+    return instances.get_or_create(scope, key, _initialise_scoped, plan, registry)
+
+
+def _lazily(strategy: "_Strategy") -> "_Strategy":
+    def _resolve_lazily(
+        plan: DependencyPlan, registry: t.Any, stack: ExitStack | None, resolved: Resolved | None
+    ) -> t.Any:
+        if plan.is_async:
+            raise DependencyResolutionError(f"Lazy dependencies can't be async: {plan.type_}")
+        proxy = lazy.LazyProxy(functools.partial(strategy, plan, registry, stack, resolved))
+        if stack is not None:
+            stack.callback(proxy._tidi_expire, _expired)
+        return proxy
+
+    return _resolve_lazily
+
+
+def _expired() -> t.NoReturn:
+    raise DependencyResolutionError(
+        "Unable to resolve a lazy dependency after the call it was injected into returned."
+    )
+
+
+def _unresolvable(*_: t.Any) -> t.NoReturn:
+    raise DependencyResolutionError("Unable to resolve dependency.")
+
+
+def _initialise_dependency(
+    plan: DependencyPlan, registry: t.Any, stack: ExitStack | None, resolved: Resolved | None
+) -> t.Any:
+    collector = metrics.collector
+    if collector is not None:
+        if plan.provider is not None:
+            return _provide_recorded(collector, plan, registry, stack, resolved)
+        collector.increment("tidi_constructions_total", plan.type_)
+    return _provide(plan, registry, stack, resolved)
+
+
+def _initialise_scoped(plan: DependencyPlan, registry: t.Any, stack: ExitStack) -> t.Any:
+    return _initialise_dependency(plan, registry, stack, {})
+
+
+async def _initialise_dependency_async(
+    plan: DependencyPlan[T], registry: t.Any, stack: contextlib.AsyncExitStack
+) -> T:
+    return await t.cast(_Pending, _initialise_dependency(plan, registry, stack, {})).awaitable
+
+
+def _provide(
+    plan: DependencyPlan, registry: t.Any, stack: ExitStack | None, resolved: Resolved | None
+) -> t.Any:
+    if plan.is_async:
+        return _Pending(_provide_async(plan, registry, stack, resolved))
+    kwargs = {}
+    if plan.dependencies:
+        if resolved is None:
+            resolved = {}
+        for name, dependency in plan.dependencies:
+            kwargs[name] = dependency.resolve(registry, stack, resolved)
+    if plan.provider is None:
+        return _new_dependency(plan.type_, kwargs)
+    maybe_a_context_manager = plan.provider(**kwargs)
+    # `is_context_manager` is only a hint from annotations, so check what was given
+    if isinstance(maybe_a_context_manager, contextlib.AbstractContextManager):
+        return _enter_context(_require_stack(plan, stack), maybe_a_context_manager, plan.type_)
+    return maybe_a_context_manager
+
+
+async def _provide_async(
+    plan: DependencyPlan[T], registry: t.Any, stack: ExitStack | None, resolved: Resolved | None
+) -> T:
+    if resolved is None:
+        resolved = {}
+    kwargs = {}
+    pending: list[tuple[str, t.Awaitable]] = []
+    try:
+        for name, dependency in plan.dependencies:
+            obj = dependency.resolve(registry, stack, resolved)
+            if isinstance(obj, _Pending):  # a task, as `resolved` is shared
+                pending.append((name, obj.awaitable))
+            else:
+                kwargs[name] = obj
+    except BaseException:
+        for _, awaitable in pending:
+            t.cast(asyncio.Future, awaitable).cancel()
+        raise
+    if pending:
+        results = await gather(*(awaitable for _, awaitable in pending))
+        kwargs.update(zip((name for name, _ in pending), results))
+    if plan.provider is None:
+        return _new_dependency(plan.type_, kwargs)
+    return await _await_provided(plan, plan.provider(**kwargs), stack)
+
+
+def _provide_recorded(
+    collector: metrics.Collector,
+    plan: DependencyPlan,
+    registry: t.Any,
+    stack: ExitStack | None,
+    resolved: Resolved | None,
+) -> t.Any:
+    collector.increment("tidi_provider_calls_total", plan.type_)
+    start = time.perf_counter()
+    obj = _provide(plan, registry, stack, resolved)
+    if isinstance(obj, _Pending):
+        return _Pending(_observe_setup_async(collector, plan, obj.awaitable, start))
+    collector.observe("tidi_provider_setup_seconds", time.perf_counter() - start, plan.type_)
+    return obj
+
+
+async def _observe_setup_async(
+    collector: metrics.Collector, plan: DependencyPlan[T], awaitable: t.Awaitable[T], start: float
+) -> T:
+    obj = await awaitable
+    collector.observe("tidi_provider_setup_seconds", time.perf_counter() - start, plan.type_)
+    return obj
+
+
+def _record_registry_lookup(plan: DependencyPlan, obj: t.Any) -> None:
+    collector = metrics.collector
+    if collector is not None:
+        name = "tidi_registry_misses_total" if obj is None else "tidi_registry_hits_total"
+        collector.increment(name, plan.type_)
+
+
+class _Pending(t.NamedTuple):
+    """A dependency from an async provider, still to be awaited."""
+
+    awaitable: t.Awaitable
+
+
+async def _await_provided(plan: DependencyPlan[T], provided: t.Any, stack: ExitStack | None) -> T:
+    if inspect.isawaitable(provided) and not isinstance(
+        provided, contextlib.AbstractAsyncContextManager
+    ):
+        provided = await provided
+    if isinstance(provided, contextlib.AbstractAsyncContextManager):
+        stack = t.cast(contextlib.AsyncExitStack, _require_stack(plan, stack))
+        exit_: t.Callable[..., t.Awaitable] = provided.__aexit__
+        obj = await provided.__aenter__()
+        if metrics.collector is not None:
+            exit_ = metrics.timed_async_exit(exit_, plan.type_)
+        stack.push_async_exit(lambda *exc_details: exit_(*exc_details))
+        return obj
+    if isinstance(provided, contextlib.AbstractContextManager):
+        return _enter_context(_require_stack(plan, stack), provided, plan.type_)
+    return provided
+
+
+def _require_stack(plan: DependencyPlan, stack: ExitStack | None) -> ExitStack:
+    if stack is None:
+        raise ExitStackRequiredError(
+            f"Unable to enter the context manager provided for {plan.type_}"
+        )
+    return stack
+
+
+def _enter_context(stack: ExitStack, context_manager: t.Any, type_: t.Any) -> t.Any:
+    # same lookup as a `with` statement, so class-level `__enter__`s work too
+    exit_ = context_manager.__exit__
+    obj = context_manager.__enter__()
+    if metrics.collector is not None:
+        exit_ = metrics.timed_exit(exit_, type_)
+    stack.push(lambda *exc_details: exit_(*exc_details))
+    return obj
+
+
+def _is_context_manager_provider(provider: ProviderFunc | None) -> bool:
+    """`False` only if `provider` definitely doesn't give a context manager."""
+    if provider is None:
+        return False
+    if isinstance(provider, type):
+        return issubclass(provider, _CONTEXT_MANAGER_TYPES)
+    unwrapped = _unwrap(provider)
+    if inspect.isgeneratorfunction(unwrapped) or inspect.isasyncgenfunction(unwrapped):
+        return True  # e.g. decorated with `contextlib.contextmanager`
+    return_type = _return_type(provider)
+    if return_type is None:
+        return True
+    return issubclass(return_type, _CONTEXT_MANAGER_TYPES)
+
+
+def _is_async_provider(provider: ProviderFunc | None) -> bool:
     if provider is None:
-        yield _new_dependency(type_)
-        return
-    maybe_a_context_manager = provider()
-    match maybe_a_context_manager:
-        case contextlib.AbstractContextManager() as context_manager:
-            with context_manager as obj:
-                yield obj
-        case obj:
-            yield obj
-
-
-def _new_dependency(type_: t.Type[T]) -> T:
+        return False
+    if isinstance(provider, type):
+        return issubclass(provider, contextlib.AbstractAsyncContextManager)
+    unwrapped = _unwrap(provider)
+    if inspect.iscoroutinefunction(unwrapped) or inspect.isasyncgenfunction(unwrapped):
+        return True  # e.g. decorated with `contextlib.asynccontextmanager`
+    return_type = _return_type(provider)
+    return return_type is not None and issubclass(
+        return_type, (contextlib.AbstractAsyncContextManager, collections.abc.Awaitable)
+    )
+
+
+_CONTEXT_MANAGER_TYPES = (contextlib.AbstractContextManager, contextlib.AbstractAsyncContextManager)
+
+
+def _return_type(provider: t.Callable) -> type | None:
+    """The class `provider` is annotated to return, or `None` if it's not known."""
+    try:
+        return_type = inspect.signature(provider).return_annotation
+    except (TypeError, ValueError):
+        return None
+    return_type = t.get_origin(return_type) or return_type
+    if not isinstance(return_type, type) or return_type is inspect.Signature.empty:
+        return None
+    return return_type
+
+
+def _unwrap(provider: t.Callable) -> t.Callable:
+    """The function underneath any decorators & `functools.partial`s."""
+    while True:
+        provider = inspect.unwrap(provider)
+        if not isinstance(provider, functools.partial):
+            return provider
+        provider = provider.func
+
+
+def _new_dependency(type_: t.Type[T], kwargs: dict[str, t.Any]) -> T:
     try:
-        return type_()
+        return type_(**kwargs)
     except TypeError as err:
         raise DependencyResolutionError(f"Unable to instantiate {type_}") from err
@@ -0,0 +1,278 @@
+"""Provides lifetime `Scope`s & the `ScopedInstances` cache that backs them."""
+
+import asyncio
+import contextlib
+import contextvars
+import enum
+import threading
+import typing as t
+import weakref
+
+T = t.TypeVar("T")
+
+
+class Scope(enum.Enum):
+    """How long a provided or initialised dependency lives for.
+
+    Attributes:
+        TRANSIENT: a new instance each time it's resolved (the default).
+        REQUEST: one instance per `request_scope`, shared by every injected
+            call within it. An injected call opens one if none is open yet, so
+            the injected calls it makes share its instances.
+        THREAD: one instance per thread.
+        SINGLETON: one instance per process.
+    """
+
+    TRANSIENT = "transient"
+    REQUEST = "request"
+    THREAD = "thread"
+    SINGLETON = "singleton"
+
+
+class _ThreadExitStack(contextlib.ExitStack):
+    """The exit stack for one thread's instances, only kept track of once something's pushed."""
+
+    def __init__(self, on_first_push: t.Callable[[contextlib.ExitStack], None]) -> None:
+        super().__init__()
+        self._on_first_push: t.Callable[[contextlib.ExitStack], None] | None = on_first_push
+
+    def enter_context(self, cm: contextlib.AbstractContextManager[T]) -> T:
+        self._pushing()
+        return super().enter_context(cm)
+
+    def push(self, exit: t.Any) -> t.Any:
+        self._pushing()
+        return super().push(exit)
+
+    def callback(self, callback: t.Callable[..., T], /, *args: t.Any, **kwds: t.Any) -> t.Any:
+        self._pushing()
+        return super().callback(callback, *args, **kwds)
+
+    def _pushing(self) -> None:
+        on_first_push, self._on_first_push = self._on_first_push, None
+        if on_first_push is not None:
+            on_first_push(self)
+
+
+class _ThreadAlive:
+    """Kept by a thread while it's alive, to close its exit stack once it's gone."""
+
+
+def _close_thread_exit_stack(
+    exit_stacks: set[contextlib.ExitStack], exit_stack: contextlib.ExitStack
+) -> None:
+    try:
+        exit_stacks.remove(exit_stack)  # unless `close` got to it first
+    except KeyError:
+        return
+    exit_stack.close()
+
+
+class ScopedInstances:
+    """A thread-safe cache of dependency instances for the non-transient scopes.
+
+    Any context managers entered to create an instance stay open until `close`
+    (or `aclose` if any were async) is called, or for `Scope.THREAD` instances,
+    until their thread exits.
+
+    Each `request_scope` has one of its own, for its `Scope.REQUEST` instances.
+
+    Examples:
+        >>> instances = ScopedInstances()
+        >>> config = instances.get_or_create(Scope.SINGLETON, Config, lambda stack: load_config())
+        >>> config is instances.get_or_create(Scope.SINGLETON, Config, lambda stack: load_config())
+        True
+        >>> instances.close()
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.RLock()
+        self._singletons: dict[t.Hashable, t.Any] = {}
+        self._per_thread = threading.local()
+        self._singleton_exit_stack = contextlib.ExitStack()
+        self._thread_exit_stacks: set[contextlib.ExitStack] = set()
+        self._async_exit_stack = contextlib.AsyncExitStack()
+        self._async_locks: dict[t.Hashable, asyncio.Lock] = {}
+        self._creation_locks: dict[t.Hashable, threading.RLock] = {}
+
+    def get_or_create(
+        self,
+        scope: Scope,
+        key: t.Hashable,
+        create: t.Callable[..., T],
+        *args: t.Any,
+    ) -> T:
+        """Gets the instance for `key` in `scope`, calling `create` if there isn't one yet.
+
+        Args:
+            scope (Scope): the scope to cache the instance in.
+            key (typing.Hashable): identifies the instance within the scope.
+            create (typing.Callable[..., T]): called with `*args` & a
+                `contextlib.ExitStack` to create the instance with.
+            *args (typing.Any): passed to `create` first.
+
+        Returns:
+            (T): the cached instance.
+        """
+        instances = self._instances(scope)
+        try:
+            return instances[key]
+        except KeyError:
+            pass
+        # only lock while creating this instance, so a slow one doesn't hold up the others
+        with self._lock:
+            exit_stack = self._exit_stack(scope)
+            if scope is Scope.THREAD:  # only ever created by this thread
+                lock = None
+            else:
+                lock = self._creation_locks.setdefault((scope, key), threading.RLock())
+        with lock or contextlib.nullcontext():
+            if key not in instances:
+                instances[key] = create(*args, exit_stack)
+            return instances[key]
+
+    async def get_or_create_async(
+        self,
+        scope: Scope,
+        key: t.Hashable,
+        create: t.Callable[..., t.Awaitable[T]],
+        *args: t.Any,
+    ) -> T:
+        """Async version of `get_or_create`, `create` is given a `contextlib.AsyncExitStack`."""
+        instances = self._instances(scope)
+        try:
+            return instances[key]
+        except KeyError:
+            pass
+        with self._lock:
+            lock = self._async_locks.setdefault((scope, key), asyncio.Lock())
+        async with lock:
+            if key not in instances:
+                instances[key] = await create(*args, self._async_exit_stack)
+            return instances[key]
+
+    def close(self) -> None:
+        """Forgets all instances, exiting any (sync) context managers they were created in."""
+        with self._lock:
+            singleton_exit_stack = self._singleton_exit_stack
+            thread_exit_stacks = self._thread_exit_stacks
+            self._singleton_exit_stack = contextlib.ExitStack()
+            self._thread_exit_stacks = set()
+            self._singletons = {}
+            self._per_thread = threading.local()
+            self._creation_locks = {}
+        with contextlib.ExitStack() as stack:
+            stack.push(singleton_exit_stack)
+            while thread_exit_stacks:
+                try:  # taken one at a time, as exiting threads take their own
+                    stack.push(thread_exit_stacks.pop())
+                except KeyError:
+                    break
+
+    async def aclose(self) -> None:
+        """Like `close`, but also exits any async context managers."""
+        with self._lock:
+            async_exit_stack, self._async_exit_stack = (
+                self._async_exit_stack,
+                contextlib.AsyncExitStack(),
+            )
+            self._async_locks = {}
+        try:
+            await async_exit_stack.aclose()
+        finally:
+            self.close()
+
+    def _instances(self, scope: Scope) -> dict[t.Hashable, t.Any]:
+        if scope is not Scope.THREAD:
+            return self._singletons
+        try:
+            return self._per_thread.instances
+        except AttributeError:
+            self._per_thread.instances = {}
+            return self._per_thread.instances
+
+    def _exit_stack(self, scope: Scope) -> contextlib.ExitStack:
+        if scope is not Scope.THREAD:
+            return self._singleton_exit_stack
+        try:
+            return self._per_thread.exit_stack
+        except AttributeError:
+            self._per_thread.exit_stack = _ThreadExitStack(self._track_thread_exit_stack)
+            return self._per_thread.exit_stack
+
+    def _track_thread_exit_stack(self, exit_stack: contextlib.ExitStack) -> None:
+        # held weakly by way of the thread, so it's closed & dropped once the thread exits
+        with self._lock:
+            exit_stacks = self._thread_exit_stacks
+            exit_stacks.add(exit_stack)
+        self._per_thread.alive = _ThreadAlive()
+        weakref.finalize(self._per_thread.alive, _close_thread_exit_stack, exit_stacks, exit_stack)
+
+
+default_instances = ScopedInstances()
+"""The `ScopedInstances` used when resolving, unless told otherwise."""
+
+
+_current_request: contextvars.ContextVar[ScopedInstances | None] = contextvars.ContextVar(
+    "tidi_current_request", default=None
+)
+
+
+def current_request() -> ScopedInstances | None:
+    """The instances of the open `request_scope`, or `None` if there isn't one."""
+    return _current_request.get()
+
+
+@contextlib.contextmanager
+def within_request(instances: ScopedInstances) -> t.Iterator[ScopedInstances]:
+    """Makes `instances` those of the open request scope, without closing them on exit.
+
+    Used to open the same request scope again & again, e.g. for each call of a
+    bound function, without it being open in between.
+    """
+    token = _current_request.set(instances)
+    try:
+        yield instances
+    finally:
+        _current_request.reset(token)
+
+
+@contextlib.contextmanager
+def request_scope() -> t.Iterator[ScopedInstances]:
+    """Shares `Scope.REQUEST` dependencies between the injected calls made within it.
+
+    Each is created the first time it's resolved, then torn down when the scope
+    exits. If a request scope is already open, this just uses that one, so it's
+    only torn down by the outermost.
+
+    Examples:
+        >>> with tidi.request_scope():
+        ...     handle_request(request)  # its injected calls share one session
+    """
+    current = _current_request.get()
+    if current is not None:
+        yield current
+        return
+    instances = ScopedInstances()
+    token = _current_request.set(instances)
+    try:
+        yield instances
+    finally:
+        _current_request.reset(token)
+        instances.close()
+
+
+@contextlib.asynccontextmanager
+async def async_request_scope() -> t.AsyncIterator[ScopedInstances]:
+    """Like `request_scope`, but also exits async context managers."""
+    current = _current_request.get()
+    if current is not None:
+        yield current
+        return
+    instances = ScopedInstances()
+    token = _current_request.set(instances)
+    try:
+        yield instances
+    finally:
+        _current_request.reset(token)
+        await instances.aclose()
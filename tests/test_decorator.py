@@ -1,10 +1,13 @@
+import asyncio
+import concurrent.futures
+import inspect
 import typing as t
 from unittest import mock
 
 import pytest
 import pytest_mock
 
-from tidi import decorator
+from tidi import decorator, resolver
 
 T = t.TypeVar("T")
 
@@ -28,8 +31,10 @@ class FakeResolverOptions:
 
 @pytest.fixture
 def mock_resolver(mocker: pytest_mock.MockerFixture) -> t.Callable:
-    mock_resolver = mocker.patch("tidi.resolver.resolve_dependency")
-    mock_resolver.return_value.__enter__.return_value = TEST_DEP
+    mock_resolver = mocker.patch("tidi.resolver.compile_dependency")
+    mock_resolver.return_value.resolve.return_value = TEST_DEP
+    mock_resolver.return_value.is_context_manager = False
+    mock_resolver.return_value.is_async = False
     return mock_resolver
 
 
@@ -121,3 +126,192 @@ def test_inject_class___init___method(mock_resolver):
 
     obj = UnitTest()
     assert obj.value.value == "world"
+
+
+def test_inject_without_context_managers_skips_exit_stack(mocker: pytest_mock.MockerFixture):
+    mock_exit_stack = mocker.patch("contextlib.ExitStack")
+
+    @decorator.inject()
+    def injectable_func(
+        kwarg_1: t.Annotated[Dep | decorator.Unset, resolver.ResolverOptions(False, True)] = (
+            decorator.UNSET
+        ),
+    ):
+        return kwarg_1.value
+
+    assert injectable_func() == "world"
+    mock_exit_stack.assert_not_called()
+
+
+class GenerationalRegistry:
+    def __init__(self) -> None:
+        self.generation = 0
+        self.objs: dict[t.Type, t.Any] = {}
+        self.lookups = 0
+
+    def register(self, obj: t.Any) -> None:
+        self.objs[type(obj)] = obj
+        self.generation += 1
+
+    def get(self, type_: t.Type[T], default: t.Any = ...) -> T:
+        self.lookups += 1
+        return self.objs.get(type_, default)
+
+    def current_view(self) -> object:
+        return self
+
+
+def test_inject_caches_registry_lookups_until_generation_changes():
+    registry = GenerationalRegistry()
+    first_dep, second_dep = Dep(), Dep()
+    registry.register(first_dep)
+
+    @decorator.inject(registry=registry)
+    def injectable_func(
+        kwarg_1: t.Annotated[Dep | decorator.Unset, resolver.ResolverOptions(True, True)] = (
+            decorator.UNSET
+        ),
+    ):
+        return kwarg_1
+
+    assert injectable_func() is first_dep
+    assert injectable_func() is first_dep
+    assert registry.lookups == 1
+    registry.register(second_dep)
+    assert injectable_func() is second_dep
+    assert registry.lookups == 2
+
+
+def test_deferred_inject_inspects_on_first_call(mocker: pytest_mock.MockerFixture):
+    spy = mocker.spy(inspect, "signature")
+
+    @decorator.inject(deferred=True)
+    def injectable_func(
+        kwarg_1: t.Annotated[Dep | decorator.Unset, resolver.ResolverOptions(False, True)] = (
+            decorator.UNSET
+        ),
+    ):
+        return kwarg_1.value
+
+    spy.assert_not_called()
+    assert injectable_func() == "world"
+    calls = spy.call_count
+    assert injectable_func() == "world"
+    assert spy.call_count == calls > 0
+
+
+def test_deferred_inject_compiles_once_across_threads(mocker: pytest_mock.MockerFixture):
+    spy = mocker.spy(decorator._InjectionPlan, "from_func")
+
+    @decorator.inject(deferred=True)
+    def injectable_func(
+        kwarg_1: t.Annotated[Dep | decorator.Unset, resolver.ResolverOptions(False, True)] = (
+            decorator.UNSET
+        ),
+    ):
+        return kwarg_1.value
+
+    with concurrent.futures.ThreadPoolExecutor(8) as executor:
+        assert list(executor.map(lambda _: injectable_func(), range(32))) == ["world"] * 32
+    spy.assert_called_once()
+
+
+def test_deferred_async_provider_into_sync_func_fails_on_call():
+    async def provide() -> Dep:
+        return Dep()
+
+    @decorator.inject(deferred=True)
+    def injectable_func(
+        kwarg_1: t.Annotated[Dep | decorator.Unset, resolver.ResolverOptions(False, True)] = (
+            decorator.Provider(provide)
+        ),
+    ):
+        ...
+
+    with pytest.raises(resolver.DependencyResolutionError):
+        injectable_func()
+
+
+def test_compile_pending_in_background(mocker: pytest_mock.MockerFixture):
+    mocker.patch.object(decorator, "defer_compilation", True)
+
+    @decorator.inject()
+    async def injectable_func(
+        kwarg_1: t.Annotated[Dep | decorator.Unset, resolver.ResolverOptions(False, True)] = (
+            decorator.UNSET
+        ),
+    ):
+        return kwarg_1.value
+
+    pending = decorator._injected_functions[inspect.unwrap(injectable_func)]
+    assert pending.plan is None
+    thread = decorator.compile_pending(background=True)
+    assert thread is not None
+    thread.join()
+    assert pending.plan is not None
+    assert asyncio.run(injectable_func()) == "world"
+
+
+def make_handler(provide: t.Callable[[], Dep]) -> t.Callable[[], str]:
+    def handler(
+        kwarg_1: t.Annotated[Dep | decorator.Unset, resolver.ResolverOptions(False, True)] = (
+            decorator.UNSET
+        ),
+        kwarg_2: t.Annotated[
+            Dep | decorator.Provider, resolver.ResolverOptions(False, True)
+        ] = decorator.Provider(provide),
+    ) -> str:
+        return f"{kwarg_1.value} {kwarg_2.value}"
+
+    return handler
+
+
+def test_closures_from_the_same_factory_are_inspected_once(mocker: pytest_mock.MockerFixture):
+    provide = Dep
+    decorator.inject()(make_handler(provide))
+    spy = mocker.spy(inspect, "signature")
+
+    assert decorator.inject()(make_handler(provide))() == "world world"
+    spy.assert_not_called()
+
+
+def test_closures_with_different_defaults_arent_mixed_up():
+    def provide_other() -> Dep:
+        dep = Dep()
+        dep.value = "other"
+        return dep
+
+    assert decorator.inject()(make_handler(Dep))() == "world world"
+    assert decorator.inject()(make_handler(provide_other))() == "world other"
+
+
+def test_class_is_inspected_again_when_its_init_changes():
+    class Changing:
+        def __init__(self) -> None:
+            self.value = "before"
+
+    @decorator.inject()
+    def injectable_func(
+        kwarg_1: t.Annotated[Changing | decorator.Unset, resolver.ResolverOptions(False, True)] = (
+            decorator.UNSET
+        ),
+    ) -> str:
+        return kwarg_1.value
+
+    def init(self, dep: t.Annotated[Dep, resolver.ResolverOptions(False, True)] = Dep()) -> None:
+        self.value = dep.value
+
+    assert injectable_func() == "before"
+    Changing.__init__ = init
+
+    assert decorator.inject()(injectable_func.__wrapped__)() == "world"
+
+
+def test_inspected_signatures_are_evicted(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(decorator, "_MAX_CACHED_SIGNATURES", 2)
+    monkeypatch.setattr(decorator, "_inspected", decorator.collections.OrderedDict())
+
+    for provide in (Dep, Dep, lambda: Dep(), lambda: Dep()):
+        decorator.inject()(make_handler(provide))
+
+    assert len(decorator._inspected) == 2
@@ -0,0 +1,77 @@
+import collections.abc
+import types
+import typing as t
+
+import pytest
+
+import tidi
+from tidi import keys
+
+T = t.TypeVar("T")
+
+
+class Database:
+    ...
+
+
+class Repository(t.Generic[T]):
+    ...
+
+
+UserId = t.NewType("UserId", str)
+
+
+@pytest.mark.parametrize(
+    "annotation",
+    [
+        Database,
+        Database | None,
+        None | Database,
+        t.Optional[Database],
+        t.Union[None, Database],
+        Database | tidi.Unset | tidi.Provider,
+        t.Annotated[Database, "metadata"],
+        t.Annotated[Database | None, "metadata"],
+    ],
+)
+def test_optional_and_annotated_types_give_the_type(annotation):
+    assert keys.type_key(annotation) is Database
+
+
+@pytest.mark.parametrize(
+    ("annotation", "expected"),
+    [
+        (t.List[Database], list[Database]),
+        (t.Dict[str, Database], dict[str, Database]),
+        (t.Sequence[Database], collections.abc.Sequence[Database]),
+        (t.Optional[t.List[Database]], list[Database]),
+    ],
+)
+def test_typing_aliases_are_normalised(annotation, expected):
+    assert keys.type_key(annotation) == expected
+
+
+def test_parametrised_generics_are_kept():
+    assert keys.type_key(Repository[Database]) == Repository[Database]
+    assert keys.type_key(Repository[Database]) != keys.type_key(Repository[int])
+
+
+def test_new_type_is_its_own_key():
+    assert keys.type_key(UserId) is UserId
+    assert keys.type_key(t.Optional[UserId]) is UserId
+
+
+def test_only_none_gives_none_type():
+    assert keys.type_key(None | tidi.Unset) is types.NoneType
+
+
+def test_keys_are_cached():
+    annotation = t.Optional[t.List[Database]]
+
+    assert keys.type_key(annotation) is keys.type_key(annotation)
+
+
+def test_unhashable_annotation_isnt_cached():
+    annotation = t.Annotated[Database, ["unhashable"]]
+
+    assert keys.type_key(annotation) is Database
@@ -0,0 +1,76 @@
+import pytest
+
+from tidi import lazy
+
+
+class Dep:
+    def __init__(self) -> None:
+        self.value = "world"
+        self.items = [1, 2]
+
+    def greet(self, name: str) -> str:
+        return f"hello {name}"
+
+
+def test_proxy_resolves_once_on_first_use():
+    resolved = []
+
+    def resolve() -> Dep:
+        resolved.append(Dep())
+        return resolved[-1]
+
+    proxy = lazy.LazyProxy(resolve)
+    assert resolved == []
+    assert repr(proxy) == "<tidi.lazy.LazyProxy (unresolved)>"
+
+    assert proxy.value == "world"
+    assert proxy.greet("there") == "hello there"
+    assert len(resolved) == 1
+    assert lazy.resolve(proxy) is resolved[0]
+
+
+def test_proxy_passes_on_attribute_changes():
+    dep = Dep()
+    proxy = lazy.LazyProxy(lambda: dep)
+
+    proxy.value = "changed"
+    del proxy.items
+
+    assert dep.value == "changed"
+    assert not hasattr(dep, "items")
+
+
+def test_proxy_passes_on_operators():
+    proxy = lazy.LazyProxy(lambda: [1, 2, 3])
+
+    assert proxy == [1, 2, 3]
+    assert len(proxy) == 3
+    assert list(proxy) == [1, 2, 3]
+    assert 2 in proxy
+    assert proxy[0] == 1
+    assert isinstance(proxy, list)
+
+
+def test_expired_proxy_calls_expired_instead():
+    def expired():
+        raise RuntimeError("expired")
+
+    proxy = lazy.LazyProxy(Dep)
+    proxy._tidi_expire(expired)
+
+    with pytest.raises(RuntimeError, match="expired"):
+        proxy.value
+
+
+def test_resolved_proxy_doesnt_expire():
+    proxy = lazy.LazyProxy(Dep)
+    assert proxy.value == "world"
+
+    proxy._tidi_expire(lambda: None)
+
+    assert proxy.value == "world"
+
+
+def test_resolve_returns_other_objects_as_they_are():
+    dep = Dep()
+    assert lazy.resolve(dep) is dep
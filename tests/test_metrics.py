@@ -0,0 +1,143 @@
+import asyncio
+import contextlib
+import typing as t
+
+import pytest
+
+import tidi
+from tidi import decorator, metrics, registry
+
+
+class Dep:
+    ...
+
+
+class Registered:
+    ...
+
+
+@pytest.fixture
+def enabled() -> t.Iterator[None]:
+    metrics.enable()
+    yield
+    metrics.disable()
+
+
+def type_name(type_: type) -> str:
+    return f"{type_.__module__}.{type_.__qualname__}"
+
+
+def values(name: str) -> dict[tuple, int]:
+    return {
+        tuple(sorted(sample["labels"].items())): sample["value"] for sample in tidi.stats()[name]
+    }
+
+
+def test_nothing_is_recorded_when_disabled():
+    @decorator.inject()
+    def func(dep: tidi.Injected[Dep] = tidi.UNSET) -> Dep:
+        return dep
+
+    func()
+
+    assert metrics.collector is None
+    assert tidi.stats() == {}
+
+
+def test_counts_are_labelled_by_type_and_function(enabled):
+    reg = registry.TidiRegistry()
+    reg.register(Registered())
+
+    @decorator.inject(reg)
+    def func(
+        registered: tidi.Injected[Registered] = tidi.UNSET,
+        dep: tidi.Injected[Dep] = tidi.UNSET,
+        provided: tidi.Injected[Dep] = tidi.Provider(Dep),
+    ):
+        ...
+
+    func()
+    func()
+
+    function = f"{__name__}.{func.__qualname__}"
+    assert values("tidi_injected_calls_total") == {(("function", function),): 2}
+    assert values("tidi_registry_hits_total") == {
+        (("function", function), ("type", type_name(Registered))): 2
+    }
+    assert values("tidi_registry_misses_total") == {
+        (("function", function), ("type", type_name(Dep))): 4
+    }
+    assert values("tidi_constructions_total") == {
+        (("function", function), ("type", type_name(Dep))): 2
+    }
+    assert values("tidi_provider_calls_total") == {
+        (("function", function), ("type", type_name(Dep))): 2
+    }
+
+
+def test_provider_setup_and_teardown_are_timed(enabled):
+    @contextlib.contextmanager
+    def provide() -> t.Iterator[Dep]:
+        yield Dep()
+
+    @decorator.inject()
+    def func(dep: tidi.Injected[Dep] = tidi.Provider(provide)):
+        ...
+
+    func()
+
+    setup, teardown = (
+        tidi.stats()[name]
+        for name in ("tidi_provider_setup_seconds", "tidi_provider_teardown_seconds")
+    )
+    for histogram in (setup, teardown):
+        assert len(histogram) == 1
+        assert histogram[0]["labels"]["function"] == f"{__name__}.{func.__qualname__}"
+        assert histogram[0]["count"] == 1
+        assert histogram[0]["buckets"]["+Inf"] == 1
+
+
+def test_async_provider_setup_and_teardown_are_timed(enabled):
+    @contextlib.asynccontextmanager
+    async def provide() -> t.AsyncIterator[Dep]:
+        yield Dep()
+
+    @decorator.inject()
+    async def func(dep: tidi.Injected[Dep] = tidi.Provider(provide)):
+        ...
+
+    asyncio.run(func())
+
+    stats = tidi.stats()
+    assert stats["tidi_provider_setup_seconds"][0]["count"] == 1
+    assert stats["tidi_provider_teardown_seconds"][0]["count"] == 1
+    assert stats["tidi_provider_teardown_seconds"][0]["labels"]["function"] == (
+        f"{__name__}.{func.__qualname__}"
+    )
+
+
+def test_reset_forgets_recorded_metrics(enabled):
+    @decorator.inject()
+    def func(dep: tidi.Injected[Dep] = tidi.UNSET):
+        ...
+
+    func()
+    metrics.reset()
+
+    assert values("tidi_injected_calls_total") == {}
+
+
+def test_prometheus_export(enabled):
+    @decorator.inject()
+    def func(dep: tidi.Injected[Dep] = tidi.Provider(Dep)):
+        ...
+
+    func()
+
+    text = metrics.to_prometheus()
+    labels = f'type="{type_name(Dep)}",function="{__name__}.{func.__qualname__}"'
+    assert "# TYPE tidi_provider_calls_total counter" in text
+    assert f"tidi_provider_calls_total{{{labels}}} 1" in text
+    assert "# TYPE tidi_provider_setup_seconds histogram" in text
+    assert f'tidi_provider_setup_seconds_bucket{{{labels},le="+Inf"}} 1' in text
+    assert f"tidi_provider_setup_seconds_count{{{labels}}} 1" in text
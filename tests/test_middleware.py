@@ -0,0 +1,49 @@
+import asyncio
+import typing as t
+
+from tidi import middleware, scopes
+
+
+class Dep:
+    ...
+
+
+def create_dep(stack: t.Any) -> Dep:
+    return Dep()
+
+
+def test_wsgi_request_scope_lasts_until_response_is_closed():
+    seen = []
+
+    def app(environ: dict, start_response: t.Callable) -> t.Iterator[bytes]:
+        start_response("200 OK", [])
+        request = scopes.current_request()
+        assert request is not None
+        seen.append(request.get_or_create(scopes.Scope.REQUEST, Dep, create_dep))
+        yield b"hello"
+        seen.append(request.get_or_create(scopes.Scope.REQUEST, Dep, create_dep))
+
+    response = middleware.WSGIMiddleware(app)({}, lambda *_: None)
+    assert list(response) == [b"hello"]
+    assert scopes.current_request() is not None
+    t.cast(t.Any, response).close()
+
+    assert seen[0] is seen[1]
+    assert scopes.current_request() is None
+
+
+def test_asgi_opens_a_request_scope_per_http_request():
+    seen = []
+
+    async def app(scope: dict, receive: t.Callable, send: t.Callable) -> None:
+        seen.append(scopes.current_request())
+
+    async def main():
+        wrapped = middleware.ASGIMiddleware(app)
+        for scope_type in ("http", "http", "lifespan"):
+            await wrapped({"type": scope_type}, None, None)
+
+    asyncio.run(main())
+    assert seen[0] is not None and seen[1] is not None
+    assert seen[0] is not seen[1]
+    assert seen[2] is None
@@ -108,3 +108,15 @@ def test_create_annotated_parameter_from_annotated_union_type_hinted_kwarg_param
     assert param.is_annotated_type
     assert param.base_type is str
     assert param.annotated_metadata == (METADATA_OBJ,)
+
+
+def test_annotated_parameter_base_type_skips_none_first_in_union():
+    param = parameters.AnnotatedParameter.from_parameter(
+        inspect.Parameter(
+            name="kwarg_1",
+            kind=inspect.Parameter.POSITIONAL_OR_KEYWORD,
+            default=None,
+            annotation=t.Annotated[None | t.List[str], METADATA_OBJ],
+        )
+    )
+    assert param.base_type == list[str]
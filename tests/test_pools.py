@@ -0,0 +1,195 @@
+import asyncio
+import contextlib
+import threading
+import time
+import typing as t
+
+import pytest
+
+import tidi
+from tidi import decorator, pools
+
+
+class Connection:
+    def __init__(self) -> None:
+        self.closed = False
+
+
+def counting_factory() -> (
+    tuple[list[Connection], t.Callable[[], contextlib.AbstractContextManager[Connection]]]
+):
+    created: list[Connection] = []
+
+    @contextlib.contextmanager
+    def connect() -> t.Iterator[Connection]:
+        connection = Connection()
+        created.append(connection)
+        try:
+            yield connection
+        finally:
+            connection.closed = True
+
+    return created, connect
+
+
+def test_instance_is_reused_between_injected_calls():
+    created, connect = counting_factory()
+    pool = pools.Pool(connect, max_size=2)
+
+    @decorator.inject()
+    def my_func(connection: tidi.Injected[Connection] = tidi.Provider(pool)) -> Connection:
+        return connection
+
+    assert my_func() is my_func()
+    assert len(created) == 1
+    assert (pool.size, pool.idle) == (1, 1)
+
+
+def test_close_exits_idle_instances():
+    created, connect = counting_factory()
+    pool = pools.Pool(connect)
+    with pool.checkout():
+        ...
+
+    pool.close()
+
+    assert created[0].closed
+    with pytest.raises(pools.PoolClosedError):
+        with pool.checkout():
+            ...
+
+
+def test_checked_out_instance_is_closed_when_returned_to_closed_pool():
+    created, connect = counting_factory()
+    pool = pools.Pool(connect)
+
+    with pool.checkout() as connection:
+        pool.close()
+        assert not connection.closed
+    assert connection.closed
+
+
+def test_exhausted_pool_times_out():
+    pool = pools.Pool(Connection, max_size=1, timeout=0.01)
+
+    with pool.checkout():
+        with pytest.raises(pools.PoolExhaustedError):
+            with pool.checkout():
+                ...
+
+
+def test_exhausted_pool_blocks_until_an_instance_is_returned():
+    pool = pools.Pool(Connection, max_size=1)
+    checked_out = threading.Event()
+    found = []
+
+    def hold():
+        with pool.checkout():
+            checked_out.set()
+            time.sleep(0.05)
+
+    thread = threading.Thread(target=hold)
+    thread.start()
+    checked_out.wait()
+    with pool.checkout() as connection:
+        found.append(connection)
+    thread.join()
+
+    assert pool.size == 1
+    assert isinstance(found[0], Connection)
+
+
+def test_idle_instances_are_evicted():
+    created, connect = counting_factory()
+    pool = pools.Pool(connect, max_idle=0.01)
+    with pool.checkout():
+        ...
+
+    time.sleep(0.02)
+    with pool.checkout() as connection:
+        assert connection is created[1]
+
+    assert created[0].closed
+    assert pool.size == 1
+
+
+def test_unhealthy_instances_are_replaced_on_checkout():
+    created, connect = counting_factory()
+    pool = pools.Pool(connect, health_check=lambda connection: connection is not created[0])
+    with pool.checkout():
+        ...
+
+    with pool.checkout() as connection:
+        assert connection is created[1]
+
+    assert created[0].closed
+    assert pool.size == 1
+
+
+def test_failing_factory_frees_its_place():
+    def fail() -> Connection:
+        raise ValueError("unable to connect")
+
+    pool = pools.Pool(fail, max_size=1)
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            with pool.checkout():
+                ...
+    assert pool.size == 0
+
+
+def test_async_instance_is_reused_between_injected_calls():
+    created = []
+
+    @contextlib.asynccontextmanager
+    async def connect() -> t.AsyncIterator[Connection]:
+        connection = Connection()
+        created.append(connection)
+        try:
+            yield connection
+        finally:
+            connection.closed = True
+
+    pool = pools.AsyncPool(connect, max_size=1)
+
+    @decorator.inject()
+    async def my_func(connection: tidi.Injected[Connection] = tidi.Provider(pool)) -> Connection:
+        await asyncio.sleep(0)
+        return connection
+
+    async def main():
+        first, second = await asyncio.gather(my_func(), my_func())
+        await pool.aclose()
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert first is second is created[0]
+    assert created[0].closed
+
+
+def test_async_exhausted_pool_times_out():
+    async def connect() -> Connection:
+        return Connection()
+
+    async def main():
+        pool = pools.AsyncPool(connect, max_size=1, timeout=0.01)
+        async with pool.checkout():
+            with pytest.raises(pools.PoolExhaustedError):
+                async with pool.checkout():
+                    ...
+
+    asyncio.run(main())
+
+
+def test_async_health_check():
+    async def is_open(connection: Connection) -> bool:
+        return not connection.closed
+
+    async def main():
+        pool = pools.AsyncPool(Connection, health_check=is_open)
+        async with pool.checkout() as first:
+            first.closed = True
+        async with pool.checkout() as second:
+            assert second is not first
+
+    asyncio.run(main())
@@ -1,3 +1,8 @@
+import abc
+import asyncio
+import os
+import pickle
+import threading
 import typing as t
 from dataclasses import dataclass
 
@@ -35,7 +40,7 @@ def test_register_dataclass(tidi_registry: registry.TidiRegistry):
     assert tidi_registry.get(TestDataClass).default_field == 2
 
 
-def test_register_inheritted_class_without_specifying_type_key_fails(
+def test_register_inheritted_class_without_specifying_type_key_falls_back_to_subclass(
     tidi_registry: registry.TidiRegistry,
 ):
     class ParentClass:
@@ -46,6 +51,19 @@ def test_register_inheritted_class_without_specifying_type_key_fails(
 
     obj = ChildClass()
     tidi_registry.register(obj)
+    assert tidi_registry.get(ParentClass) == obj
+
+
+def test_register_unrelated_class_without_specifying_type_key_fails(
+    tidi_registry: registry.TidiRegistry,
+):
+    class ParentClass:
+        ...
+
+    class UnrelatedClass:
+        ...
+
+    tidi_registry.register(UnrelatedClass())
     with pytest.raises(registry.RegistryLookupError):
         tidi_registry.get(ParentClass)
 
@@ -104,3 +122,427 @@ def test_get_missing_type_with_default_of_same_type(tidi_registry: registry.Tidi
 
 def test_get_missing_type_with_None_default(tidi_registry: registry.TidiRegistry):
     assert tidi_registry.get(int, None) is None
+
+
+class Dep:
+    ...
+
+
+class OtherDep:
+    ...
+
+
+def _get_from_other_thread(tidi_registry: registry.TidiRegistry, type_: t.Type) -> t.Any:
+    found = []
+    thread = threading.Thread(target=lambda: found.append(tidi_registry.get(type_, None)))
+    thread.start()
+    thread.join()
+    return found[0]
+
+
+def test_per_thread_container_isnt_shared_between_threads(tidi_registry: registry.TidiRegistry):
+    tidi_registry.register(Dep())
+    assert _get_from_other_thread(tidi_registry, Dep) is None
+
+
+def test_shared_container_is_shared_between_threads():
+    tidi_registry = registry.TidiRegistry(container_cls=registry.SharedContainer)
+    obj = Dep()
+    tidi_registry.register(obj)
+    assert _get_from_other_thread(tidi_registry, Dep) is obj
+
+
+def test_register_many(tidi_registry: registry.TidiRegistry):
+    obj, other_obj = Dep(), OtherDep()
+    tidi_registry.register_many([obj, other_obj])
+    assert tidi_registry.get(Dep) is obj
+    assert tidi_registry.get(OtherDep) is other_obj
+
+
+def test_register_many_with_banned_type_registers_nothing(tidi_registry: registry.TidiRegistry):
+    with pytest.raises(registry.RegistrationError):
+        tidi_registry.register_many({Dep: Dep(), str: "unit test"})
+    assert tidi_registry.get(Dep, None) is None
+
+
+def test_use_container_keeps_registrations(tidi_registry: registry.TidiRegistry):
+    obj = Dep()
+    tidi_registry.register(obj)
+    tidi_registry.use_container(registry.SharedContainer)
+    assert tidi_registry.get(Dep) is obj
+    assert _get_from_other_thread(tidi_registry, Dep) is obj
+
+
+def test_context_container_isolates_tasks():
+    tidi_registry = registry.TidiRegistry(container_cls=registry.ContextContainer)
+    base_obj = OtherDep()
+    tidi_registry.register(base_obj)
+
+    async def handle(obj: Dep) -> tuple[Dep, OtherDep]:
+        tidi_registry.register(obj)
+        await asyncio.sleep(0.01)
+        return tidi_registry.get(Dep), tidi_registry.get(OtherDep)
+
+    async def run():
+        return await asyncio.gather(handle(Dep()), handle(Dep()))
+
+    (first_dep, first_base), (second_dep, second_base) = asyncio.run(run())
+    assert first_dep is not second_dep
+    assert first_base is second_base is base_obj
+    assert tidi_registry.get(Dep, None) is None
+    assert _get_from_other_thread(tidi_registry, OtherDep) is base_obj
+
+
+def test_context_container_tasks_inherit_overlay():
+    tidi_registry = registry.TidiRegistry(container_cls=registry.ContextContainer)
+    obj = Dep()
+
+    async def child() -> Dep:
+        return tidi_registry.get(Dep)
+
+    async def parent() -> Dep:
+        tidi_registry.register(obj)
+        return await asyncio.create_task(child())
+
+    assert asyncio.run(parent()) is obj
+
+
+def test_get_falls_back_to_abc_implementation(tidi_registry: registry.TidiRegistry):
+    class Repo(abc.ABC):
+        @abc.abstractmethod
+        def query(self):
+            ...
+
+    class PostgresRepo(Repo):
+        def query(self):
+            return "postgres"
+
+    obj = PostgresRepo()
+    tidi_registry.register(obj)
+    assert tidi_registry.get(Repo) is obj  # type: ignore[type-abstract]
+
+
+def test_get_falls_back_to_runtime_checkable_protocol_implementation(
+    tidi_registry: registry.TidiRegistry,
+):
+    @t.runtime_checkable
+    class Queryable(t.Protocol):
+        def query(self):
+            ...
+
+    class PostgresRepo:
+        def query(self):
+            return "postgres"
+
+    obj = PostgresRepo()
+    tidi_registry.register(obj)
+    assert tidi_registry.get(Queryable) is obj  # type: ignore[type-abstract]
+
+
+def test_get_ambiguous_subclasses_fails(tidi_registry: registry.TidiRegistry):
+    class ParentClass:
+        ...
+
+    class ChildClass(ParentClass):
+        ...
+
+    class OtherChildClass(ParentClass):
+        ...
+
+    tidi_registry.register(ChildClass())
+    tidi_registry.register(OtherChildClass())
+    with pytest.raises(registry.AmbiguousLookupError):
+        tidi_registry.get(ParentClass)
+
+
+def test_get_exact_type_is_preferred_over_subclass(tidi_registry: registry.TidiRegistry):
+    class ParentClass:
+        ...
+
+    class ChildClass(ParentClass):
+        ...
+
+    obj = ParentClass()
+    tidi_registry.register(ChildClass())
+    tidi_registry.register(obj)
+    assert tidi_registry.get(ParentClass) is obj
+
+
+def test_get_subclass_registered_after_lookup(tidi_registry: registry.TidiRegistry):
+    class ParentClass:
+        ...
+
+    class ChildClass(ParentClass):
+        ...
+
+    assert tidi_registry.get(ParentClass, None) is None
+    obj = ChildClass()
+    tidi_registry.register(obj)
+    assert tidi_registry.get(ParentClass) is obj
+
+
+def test_get_banned_type_doesnt_fall_back_to_subclass(tidi_registry: registry.TidiRegistry):
+    class MyString(str):
+        ...
+
+    tidi_registry.register(MyString("unit test"))
+    assert tidi_registry.get(str, None) is None
+
+
+def test_generation_increases_on_register(tidi_registry: registry.TidiRegistry):
+    generation = tidi_registry.generation
+    tidi_registry.register(Dep())
+    assert tidi_registry.generation > generation
+    generation = tidi_registry.generation
+    tidi_registry.register_many([OtherDep()])
+    assert tidi_registry.generation > generation
+
+
+def test_current_view_is_per_thread_for_per_thread_container(
+    tidi_registry: registry.TidiRegistry,
+):
+    view = tidi_registry.current_view()
+    assert tidi_registry.current_view() is view
+    other_views = []
+    thread = threading.Thread(target=lambda: other_views.append(tidi_registry.current_view()))
+    thread.start()
+    thread.join()
+    assert other_views[0] is not view
+
+
+def test_pinned_registry_is_seen_from_other_threads(tidi_registry: registry.TidiRegistry):
+    dep = Dep()
+    tidi_registry.register(dep)
+    pinned = tidi_registry.pinned()
+    tidi_registry.register(OtherDep())
+
+    assert _get_from_other_thread(pinned, Dep) is dep
+    assert _get_from_other_thread(pinned, OtherDep) is None
+
+
+def test_pinned_copy_is_reused_until_anything_is_registered(
+    tidi_registry: registry.TidiRegistry,
+):
+    tidi_registry.register(Dep())
+    pinned = tidi_registry.pinned()
+
+    assert tidi_registry.pinned() is pinned
+    tidi_registry.register(OtherDep())
+    assert tidi_registry.pinned() is not pinned
+    assert tidi_registry.pinned().get(OtherDep) is not None
+
+
+def test_shared_registry_is_its_own_pinned_copy():
+    tidi_registry = registry.TidiRegistry(container_cls=registry.SharedContainer)
+
+    assert tidi_registry.pinned() is tidi_registry
+
+
+def test_frozen_registry_refuses_registrations(tidi_registry: registry.TidiRegistry):
+    dep = Dep()
+    tidi_registry.register(dep)
+    generation = tidi_registry.generation
+    tidi_registry.freeze()
+
+    assert tidi_registry.frozen
+    assert tidi_registry.generation > generation
+    with pytest.raises(registry.RegistrationError):
+        tidi_registry.register(OtherDep())
+    with pytest.raises(registry.RegistrationError):
+        tidi_registry.register_many([OtherDep()])
+    assert tidi_registry.get(Dep) is dep
+    assert _get_from_other_thread(tidi_registry, Dep) is dep
+    assert tidi_registry.pinned() is tidi_registry
+
+
+def test_snapshot_is_restored_from_a_pickle(tidi_registry: registry.TidiRegistry):
+    tidi_registry.register(Dep())
+    tidi_registry.register(threading.Lock(), type_=OtherDep)  # a lock can't be pickled
+    snapshot = tidi_registry.snapshot(factories={OtherDep: OtherDep}, freeze=True)
+
+    restored = registry.TidiRegistry()
+    pickle.loads(pickle.dumps(snapshot)).restore(restored)
+
+    assert isinstance(restored.get(Dep), Dep)
+    assert isinstance(restored.get(OtherDep), OtherDep)
+    assert restored.frozen
+
+
+def test_snapshot_of_unpicklable_object_fails(tidi_registry: registry.TidiRegistry):
+    tidi_registry.register(threading.Lock(), type_=Dep)
+
+    with pytest.raises(registry.RegistrationError):
+        tidi_registry.snapshot()
+    assert tidi_registry.snapshot(exclude=[Dep]).instances == {}
+
+
+class Connection:
+    ...
+
+
+def test_fork_unsafe_registrations_are_dropped_or_recreated_in_child(
+    tidi_registry: registry.TidiRegistry,
+):
+    shared, connection = Dep(), Connection()
+    tidi_registry.register(shared)
+    tidi_registry.register(connection, fork_unsafe=Connection)
+    tidi_registry.register(OtherDep(), fork_unsafe=True)
+    generation = tidi_registry.generation
+
+    tidi_registry._after_fork_in_child()
+
+    assert tidi_registry.get(Dep) is shared
+    assert isinstance(tidi_registry.get(Connection), Connection)
+    assert tidi_registry.get(Connection) is not connection
+    assert tidi_registry.get(OtherDep, None) is None
+    assert tidi_registry.generation > generation
+    assert set(tidi_registry.snapshot().factories) == {Connection}
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="forking isn't supported")
+def test_forked_child_recreates_fork_unsafe_registrations(tidi_registry: registry.TidiRegistry):
+    connection = Connection()
+    tidi_registry.register(connection, fork_unsafe=Connection)
+    tidi_registry.freeze()
+
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:  # pragma: no cover, in the child
+        recreated = tidi_registry.frozen and tidi_registry.get(Connection) is not connection
+        os.write(write, b"1" if recreated else b"0")
+        os._exit(0)
+    os.waitpid(pid, 0)
+    reply = os.read(read, 1)
+    os.close(read)
+    os.close(write)
+
+    assert reply == b"1"
+    assert tidi_registry.get(Connection) is connection
+
+
+def test_register_many_replaces_fork_unsafe_marks(tidi_registry: registry.TidiRegistry):
+    tidi_registry.register(Connection(), fork_unsafe=True)
+    tidi_registry.register_many({Dep: Dep()}, fork_unsafe={Dep: Dep})
+    snapshot = tidi_registry.snapshot()
+    assert Connection not in snapshot.instances
+    assert snapshot.factories == {Dep: Dep}
+
+    replacement = Connection()
+    tidi_registry.register_many([replacement])
+    tidi_registry.register_many([OtherDep()], fork_unsafe=True)
+    snapshot = tidi_registry.snapshot()
+
+    assert isinstance(snapshot.instances[Connection], Connection)
+    assert OtherDep not in snapshot.instances
+
+
+def test_child_falls_back_to_parent(tidi_registry: registry.TidiRegistry):
+    class SubDep(Dep):
+        ...
+
+    parent_dep, child_dep = Dep(), Dep()
+    tidi_registry.register(parent_dep)
+    tidi_registry.register(OtherDep())
+    child = tidi_registry.child()
+    grandchild = child.child()
+    child.register(child_dep)
+
+    assert child.get(Dep) is child_dep
+    assert tidi_registry.get(Dep) is parent_dep
+    assert isinstance(grandchild.get(OtherDep), OtherDep)
+    assert grandchild.get(Dep) is child_dep
+    assert grandchild.root is tidi_registry
+    assert child.banned_types is tidi_registry.banned_types
+    with pytest.raises(registry.RegistryLookupError):
+        child.get(Connection)
+    grandchild.register(SubDep())
+    assert isinstance(grandchild.get(Dep), SubDep)  # its own subclass comes before the parent's
+
+
+def test_child_views_are_bounded(tidi_registry: registry.TidiRegistry):
+    child = tidi_registry.child()
+    views = []
+    for _ in range(registry._MAX_CACHED_VIEWS + 10):
+        thread = threading.Thread(target=lambda: views.append(child.current_view()))
+        thread.start()
+        thread.join()
+
+    assert len(child._views) <= registry._MAX_CACHED_VIEWS
+    assert child.current_view() is child.current_view()
+
+
+def test_child_generation_follows_parent(tidi_registry: registry.TidiRegistry):
+    child = tidi_registry.child()
+    generation = child.generation
+    tidi_registry.register(Dep())
+    assert child.generation > generation
+    generation = child.generation
+    child.register(OtherDep())
+    assert child.generation > generation
+
+
+def test_child_pinned_is_seen_from_other_threads(tidi_registry: registry.TidiRegistry):
+    dep = Dep()
+    tidi_registry.register(dep)
+    child = tidi_registry.child()
+
+    assert _get_from_other_thread(child, Dep) is None  # the parent is per thread
+    assert _get_from_other_thread(child.pinned(), Dep) is dep
+
+
+def test_active_registry_uses_activated_child(tidi_registry: registry.TidiRegistry):
+    parent_dep, child_dep = Dep(), Dep()
+    tidi_registry.register(parent_dep)
+    child = tidi_registry.child()
+    child.register(child_dep)
+    active = registry.ActiveRegistry(tidi_registry)
+
+    assert active.get(Dep) is parent_dep
+    with child.activate():
+        assert active.get(Dep) is child_dep
+        assert registry.ActiveRegistry(registry.TidiRegistry()).get(Dep, None) is None
+    assert active.get(Dep) is parent_dep
+
+
+def test_register_and_get_normalise_types(tidi_registry: registry.TidiRegistry):
+    class Plugin:
+        ...
+
+    plugins = [Plugin()]
+    tidi_registry.register(plugins, t.List[Plugin])
+
+    assert tidi_registry.get(list[Plugin]) is plugins
+    assert tidi_registry.get(t.cast(t.Any, t.Optional[t.List[Plugin]])) is plugins
+    with pytest.raises(registry.RegistryLookupError):
+        tidi_registry.get(list)
+
+
+def test_get_parametrised_generic_falls_back_to_its_class(tidi_registry: registry.TidiRegistry):
+    T = t.TypeVar("T")
+
+    class Repository(t.Generic[T]):
+        ...
+
+    class SqlRepository(Repository[T]):
+        ...
+
+    repository: SqlRepository = SqlRepository()
+    tidi_registry.register(repository)
+    assert tidi_registry.get(Repository[int]) is repository
+
+    int_repository: Repository[int] = Repository()
+    tidi_registry.register(int_repository, Repository[int])
+    assert tidi_registry.get(Repository[int]) is int_repository
+    assert tidi_registry.get(Repository[str]) is repository
+
+
+def test_new_types_are_registered_separately(tidi_registry: registry.TidiRegistry):
+    class Database:
+        ...
+
+    ReadReplica = t.NewType("ReadReplica", Database)
+    primary, replica = Database(), Database()
+    tidi_registry.register_many({Database: primary, ReadReplica: replica})
+
+    assert tidi_registry.get(Database) is primary
+    assert tidi_registry.get(ReadReplica) is replica
@@ -1,3 +1,4 @@
+import asyncio
 import contextlib
 import typing as t
 
@@ -202,3 +203,84 @@ def test_resolve_dependency_unhandled_pattern():
             type_=DepWithArgs,
             resolver_options=None,
         ).__enter__()
+
+
+def test_compile_dependency_plain_provider_function_is_not_a_context_manager():
+    plan = resolver.compile_dependency(
+        Dep,
+        resolver.ResolverOptions(use_registry=False, initialise_missing=True),
+        provider=provide_dep_func,
+    )
+    assert not plan.is_context_manager
+    assert plan.resolve(None) == PROVIDED_DEP
+
+
+def test_compile_dependency_context_manager_providers_are_context_managers():
+    for provider in (provide_dep_from_context_manager, ProviderContextManager):
+        plan = resolver.compile_dependency(
+            Dep,
+            resolver.ResolverOptions(use_registry=False, initialise_missing=True),
+            provider=provider,
+        )
+        assert plan.is_context_manager
+
+
+def test_compile_dependency_unannotated_provider_may_be_a_context_manager():
+    plan = resolver.compile_dependency(
+        Dep,
+        resolver.ResolverOptions(use_registry=False, initialise_missing=True),
+        provider=lambda: ProviderContextManager(),
+    )
+    assert plan.is_context_manager
+    with contextlib.ExitStack() as stack:
+        assert plan.resolve(None, stack) == PROVIDED_DEP
+
+
+def test_compile_dependency_defers_errors_until_resolved():
+    plan = resolver.compile_dependency(
+        Dep,
+        resolver.ResolverOptions(use_registry=True, initialise_missing=False),
+        registry=None,
+    )
+    with pytest.raises(resolver.DependencyResolutionError):
+        plan.resolve(None)
+
+
+def test_dependencies_are_resolved_once_and_passed_to_the_provider():
+    options = resolver.ResolverOptions(use_registry=False, initialise_missing=True)
+    shared = resolver.compile_dependency(Dep, options)
+    plan = resolver.compile_dependency(
+        DepWithArgs, options, provider=lambda a, b: (a, b)
+    ).with_dependencies((("a", shared), ("b", shared)))
+
+    resolved: resolver.Resolved = {}
+    a, b = plan.resolve(None, None, resolved)
+
+    assert isinstance(a, Dep)
+    assert a is b
+    assert resolved[shared.key] is a
+
+
+async def provide_dep_async() -> Dep:
+    return PROVIDED_DEP
+
+
+def test_resolve_dependency_async_from_coroutine_function():
+    async def resolve():
+        async with resolver.resolve_dependency_async(
+            Dep,
+            resolver.ResolverOptions(use_registry=False, initialise_missing=True),
+            provider=provide_dep_async,
+        ) as resolved_dep:
+            return resolved_dep
+
+    assert asyncio.run(resolve()) == PROVIDED_DEP
+
+
+def test_resolve_dependency_with_async_provider_fails():
+    with pytest.raises(resolver.DependencyResolutionError):
+        resolver.resolve_dependency(
+            Dep,
+            resolver.ResolverOptions(use_registry=False, initialise_missing=True),
+            provider=provide_dep_async,
+        ).__enter__()
@@ -0,0 +1,209 @@
+import asyncio
+import contextlib
+import threading
+import typing as t
+import weakref
+
+import pytest
+
+from tidi import scopes
+
+
+class Dep:
+    ...
+
+
+@pytest.fixture
+def instances() -> scopes.ScopedInstances:
+    return scopes.ScopedInstances()
+
+
+def create_dep(stack: contextlib.ExitStack) -> Dep:
+    return Dep()
+
+
+def test_singleton_is_created_once(instances: scopes.ScopedInstances):
+    obj = instances.get_or_create(scopes.Scope.SINGLETON, Dep, create_dep)
+    assert instances.get_or_create(scopes.Scope.SINGLETON, Dep, create_dep) is obj
+
+
+def test_singleton_is_shared_between_threads(instances: scopes.ScopedInstances):
+    objs = []
+    threads = [
+        threading.Thread(
+            target=lambda: objs.append(
+                instances.get_or_create(scopes.Scope.SINGLETON, Dep, create_dep)
+            )
+        )
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(objs) == 4
+    assert all(obj is objs[0] for obj in objs)
+
+
+def test_slow_singleton_doesnt_hold_up_others(instances: scopes.ScopedInstances):
+    creating, created = threading.Event(), threading.Event()
+    waited: list[bool] = []
+
+    def create_slowly(stack: contextlib.ExitStack) -> Dep:
+        creating.set()
+        waited.append(created.wait(2))
+        return Dep()
+
+    thread = threading.Thread(
+        target=lambda: instances.get_or_create(scopes.Scope.SINGLETON, "slow", create_slowly)
+    )
+    thread.start()
+    assert creating.wait(5)
+    try:
+        instances.get_or_create(scopes.Scope.SINGLETON, Dep, create_dep)
+        instances.get_or_create(scopes.Scope.THREAD, Dep, create_dep)
+    finally:
+        created.set()
+        thread.join()
+    assert waited == [True]
+
+
+def test_per_thread_instances_are_created_once_per_thread(instances: scopes.ScopedInstances):
+    obj = instances.get_or_create(scopes.Scope.THREAD, Dep, create_dep)
+    assert instances.get_or_create(scopes.Scope.THREAD, Dep, create_dep) is obj
+    other_thread_objs = []
+    thread = threading.Thread(
+        target=lambda: other_thread_objs.append(
+            instances.get_or_create(scopes.Scope.THREAD, Dep, create_dep)
+        )
+    )
+    thread.start()
+    thread.join()
+    assert other_thread_objs[0] is not obj
+
+
+def test_close_exits_context_managers_and_forgets_instances(instances: scopes.ScopedInstances):
+    exited: list[str] = []
+
+    def create_entered_dep(stack: contextlib.ExitStack) -> Dep:
+        stack.callback(exited.append, "singleton")
+        return Dep()
+
+    obj = instances.get_or_create(scopes.Scope.SINGLETON, Dep, create_entered_dep)
+    assert exited == []
+    instances.close()
+    assert exited == ["singleton"]
+    assert instances.get_or_create(scopes.Scope.SINGLETON, Dep, create_dep) is not obj
+
+
+def test_per_thread_context_managers_are_exited_when_their_thread_exits(
+    instances: scopes.ScopedInstances,
+):
+    exited: list[str] = []
+    stacks: list[weakref.ref[contextlib.ExitStack]] = []
+
+    def create_entered_dep(stack: contextlib.ExitStack) -> Dep:
+        stack.callback(exited.append, threading.current_thread().name)
+        stacks.append(weakref.ref(stack))
+        return Dep()
+
+    def use_dep() -> None:
+        instances.get_or_create(scopes.Scope.THREAD, Dep, create_entered_dep)
+
+    threads = [threading.Thread(target=use_dep, name=f"short-lived-{i}") for i in range(50)]
+    for thread in threads:
+        thread.start()
+        thread.join()
+    assert sorted(exited) == sorted(thread.name for thread in threads)
+    assert all(stack() is None for stack in stacks)
+    instances.close()
+    assert len(exited) == len(threads)
+
+
+def test_per_thread_context_managers_are_exited_on_close(instances: scopes.ScopedInstances):
+    exited: list[str] = []
+    created = threading.Event()
+    release = threading.Event()
+
+    def create_entered_dep(stack: contextlib.ExitStack) -> Dep:
+        stack.callback(exited.append, "thread")
+        return Dep()
+
+    def use_dep() -> None:
+        instances.get_or_create(scopes.Scope.THREAD, Dep, create_entered_dep)
+        created.set()
+        release.wait(5)
+
+    thread = threading.Thread(target=use_dep)
+    thread.start()
+    assert created.wait(5)
+    try:
+        instances.get_or_create(scopes.Scope.THREAD, Dep, create_dep)  # pushes nothing
+        instances.close()
+        assert exited == ["thread"]
+    finally:
+        release.set()
+        thread.join()
+    assert exited == ["thread"]
+
+
+def test_async_singleton_is_created_once(instances: scopes.ScopedInstances):
+    exited: list[str] = []
+
+    async def create_dep_async(stack: contextlib.AsyncExitStack) -> Dep:
+        stack.callback(exited.append, "singleton")
+        await asyncio.sleep(0.01)
+        return Dep()
+
+    async def run() -> t.List[Dep]:
+        objs = await asyncio.gather(
+            *(
+                instances.get_or_create_async(scopes.Scope.SINGLETON, Dep, create_dep_async)
+                for _ in range(3)
+            )
+        )
+        await instances.aclose()
+        return objs
+
+    objs = asyncio.run(run())
+    assert all(obj is objs[0] for obj in objs)
+    assert exited == ["singleton"]
+
+
+def test_request_scope_is_only_closed_by_the_outermost():
+    exited: list[str] = []
+
+    def create(stack: contextlib.ExitStack) -> Dep:
+        stack.callback(exited.append, "exited")
+        return Dep()
+
+    with scopes.request_scope() as outer:
+        obj = outer.get_or_create(scopes.Scope.REQUEST, Dep, create)
+        with scopes.request_scope() as inner:
+            assert inner is outer
+            assert inner.get_or_create(scopes.Scope.REQUEST, Dep, create) is obj
+        assert not exited
+        assert scopes.current_request() is outer
+
+    assert exited == ["exited"]
+    assert scopes.current_request() is None
+
+
+def test_async_request_scope_exits_async_context_managers():
+    exited: list[str] = []
+
+    @contextlib.asynccontextmanager
+    async def provide() -> t.AsyncIterator[Dep]:
+        yield Dep()
+        exited.append("exited")
+
+    async def create(stack: contextlib.AsyncExitStack) -> Dep:
+        return await stack.enter_async_context(provide())
+
+    async def main():
+        async with scopes.async_request_scope() as request:
+            await request.get_or_create_async(scopes.Scope.REQUEST, Dep, create)
+            assert not exited
+
+    asyncio.run(main())
+    assert exited == ["exited"]
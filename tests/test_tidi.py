@@ -1,4 +1,11 @@
+import asyncio
 import contextlib
+import dataclasses
+import functools
+import multiprocessing
+import os
+import threading
+import time
 import typing as t
 from dataclasses import dataclass, field
 
@@ -112,6 +119,61 @@ def test_injecting_into_func_from_decorator_context_manager():
     assert mutatable_var["state"] == "after_exiting_context"
 
 
+def test_injecting_into_func_from_partial_context_managers():
+    class Conn(str):
+        ...
+
+    states = []
+
+    @contextlib.contextmanager
+    def open_conn(url: str) -> t.Iterator[Conn]:
+        states.append("entered")
+        yield Conn(url)
+        states.append("exited")
+
+    @contextlib.asynccontextmanager
+    async def open_conn_async(url: str) -> t.AsyncIterator[Conn]:
+        states.append("entered async")
+        yield Conn(url)
+        states.append("exited async")
+
+    @tidi.inject
+    def my_func(conn: tidi.Injected[Conn] = tidi.Provider(functools.partial(open_conn, "db://"))):
+        return conn
+
+    @tidi.inject
+    async def my_async_func(
+        conn: tidi.Injected[Conn] = tidi.Provider(functools.partial(open_conn_async, "db://"))
+    ):
+        return conn
+
+    assert my_func() == "db://"
+    assert asyncio.run(my_async_func()) == "db://"
+    assert states == ["entered", "exited", "entered async", "exited async"]
+
+
+def test_injecting_context_manager_from_provider_annotated_otherwise():
+    class Conn(str):
+        ...
+
+    exited = []
+
+    @contextlib.contextmanager
+    def open_conn() -> t.Iterator[Conn]:
+        yield Conn("conn")
+        exited.append(True)
+
+    def provide() -> Conn:  # annotated as not a context manager, but gives one
+        return t.cast(Conn, open_conn())
+
+    @tidi.inject
+    def my_func(conn: tidi.Injected[Conn] = tidi.Provider(provide)):
+        return conn
+
+    assert my_func() == "conn"
+    assert exited == [True]
+
+
 def test_injecting_into_func_from_class_context_manager():
     class LoadedDependency(str):
         ...
@@ -171,6 +233,30 @@ def test_injecting_into_func_from_subclass():
     assert my_func("👋") == "hello child 👋"
 
 
+def test_injecting_new_types_and_generics_from_registry():
+    T = t.TypeVar("T")
+
+    class Database:
+        ...
+
+    class Repository(t.Generic[T]):
+        ...
+
+    ReadReplica = t.NewType("ReadReplica", Database)
+    replica, repository = Database(), Repository()
+    tidi.register(replica, type_=ReadReplica)
+    tidi.register(repository, type_=Repository[Database])
+
+    @tidi.inject
+    def my_func(
+        db: tidi.Injected[ReadReplica | None] = tidi.UNSET,
+        repo: tidi.Injected[t.Optional[Repository[Database]]] = tidi.UNSET,
+    ) -> tuple:
+        return db, repo
+
+    assert my_func() == (replica, repository)
+
+
 def test_injecting_into_func_from_subclass_doesnt_work_when_type_kwarg_not_specified():
     class ParentClassDependency:
         def __init__(self):
@@ -209,3 +295,1051 @@ def test_injecting_into_func_from_subclass_fails_when_not_specified():
 
     with pytest.raises(tidi.resolver.DependencyResolutionError):
         my_func("👋")
+
+
+def test_explicitly_passed_dependencies_are_not_resolved():
+    class PassedDependency(str):
+        ...
+
+    calls = []
+
+    def load_dependency() -> PassedDependency:
+        calls.append("called")
+        return PassedDependency("provided")
+
+    @tidi.inject
+    def my_func(a: str, b: tidi.Injected[PassedDependency] = tidi.Provider(load_dependency)) -> str:
+        return f"{a} {b}"
+
+    assert my_func("hello", b=PassedDependency("keyword")) == "hello keyword"
+    assert my_func("hello", PassedDependency("positional")) == "hello positional"
+    assert calls == []
+    assert my_func("hello") == "hello provided"
+    assert calls == ["called"]
+
+
+def test_explicitly_passed_unset_or_provider_is_resolved():
+    class PassedDependency(str):
+        ...
+
+    @contextlib.contextmanager
+    def passed_ctx_mgr() -> t.Iterator[PassedDependency]:
+        yield PassedDependency("passed provider")
+
+    def load_default() -> PassedDependency:
+        return PassedDependency("default")
+
+    @tidi.inject
+    def my_func(a: str, b: tidi.Injected[PassedDependency] = tidi.Provider(load_default)) -> str:
+        return f"{a} {b}"
+
+    assert my_func("hello", tidi.UNSET) == "hello default"
+    assert my_func("hello", b=tidi.UNSET) == "hello default"
+    assert my_func("hello", tidi.Provider(passed_ctx_mgr)) == "hello passed provider"
+
+
+def test_injecting_into_async_func_from_async_providers():
+    class AsyncFuncDependency(str):
+        ...
+
+    class AsyncCtxDependency(str):
+        ...
+
+    mutatable_var = {"state": "before_entering_context"}
+
+    async def load_dependency() -> AsyncFuncDependency:
+        return AsyncFuncDependency("async world")
+
+    @contextlib.asynccontextmanager
+    async def dependency_ctx_mgr() -> t.AsyncIterator[AsyncCtxDependency]:
+        mutatable_var["state"] = "after_entering_context"
+        yield AsyncCtxDependency("async ctx world")
+        mutatable_var["state"] = "after_exiting_context"
+
+    @tidi.inject
+    async def my_func(
+        a: str,
+        b: tidi.Injected[AsyncFuncDependency] = tidi.Provider(load_dependency),
+        c: tidi.Injected[AsyncCtxDependency] = tidi.Provider(dependency_ctx_mgr),
+    ) -> str:
+        assert mutatable_var["state"] == "after_entering_context"
+        await asyncio.sleep(0)
+        return f"{a} {b}, {a} {c}"
+
+    assert asyncio.run(my_func("hello")) == "hello async world, hello async ctx world"
+    assert mutatable_var["state"] == "after_exiting_context"
+
+
+def test_async_providers_are_resolved_concurrently():
+    class SlowDependency(str):
+        ...
+
+    class OtherSlowDependency(str):
+        ...
+
+    async def load_slow_dependency() -> SlowDependency:
+        await asyncio.sleep(0.1)
+        return SlowDependency("slow")
+
+    async def load_other_slow_dependency() -> OtherSlowDependency:
+        await asyncio.sleep(0.1)
+        return OtherSlowDependency("slower")
+
+    @tidi.inject
+    async def my_func(
+        a: tidi.Injected[SlowDependency] = tidi.Provider(load_slow_dependency),
+        b: tidi.Injected[OtherSlowDependency] = tidi.Provider(load_other_slow_dependency),
+    ) -> str:
+        return f"{a} {b}"
+
+    start = time.perf_counter()
+    assert asyncio.run(my_func()) == "slow slower"
+    assert time.perf_counter() - start < 0.19
+
+
+def test_async_provider_sub_dependencies_are_resolved_concurrently():
+    class SlowDependency(str):
+        ...
+
+    class OtherSlowDependency(str):
+        ...
+
+    class CombinedDependency(str):
+        ...
+
+    async def load_slow_dependency() -> SlowDependency:
+        await asyncio.sleep(0.1)
+        return SlowDependency("slow")
+
+    async def load_other_slow_dependency() -> OtherSlowDependency:
+        await asyncio.sleep(0.1)
+        return OtherSlowDependency("slower")
+
+    async def combine(
+        a: tidi.Injected[SlowDependency] = tidi.Provider(load_slow_dependency),
+        b: tidi.Injected[OtherSlowDependency] = tidi.Provider(load_other_slow_dependency),
+    ) -> CombinedDependency:
+        return CombinedDependency(f"{a} {b}")
+
+    @tidi.inject
+    async def my_func(
+        combined: tidi.Injected[CombinedDependency] = tidi.Provider(combine),
+    ) -> str:
+        return combined
+
+    start = time.perf_counter()
+    assert asyncio.run(my_func()) == "slow slower"
+    assert time.perf_counter() - start < 0.19
+
+
+def test_async_providers_entered_are_exited_when_another_fails():
+    class GoodDependency(str):
+        ...
+
+    class BadDependency(str):
+        ...
+
+    mutatable_var = {"state": "before_entering_context"}
+
+    @contextlib.asynccontextmanager
+    async def good_ctx_mgr() -> t.AsyncIterator[GoodDependency]:
+        mutatable_var["state"] = "after_entering_context"
+        try:
+            yield GoodDependency("good")
+        finally:
+            mutatable_var["state"] = "after_exiting_context"
+
+    async def load_bad_dependency() -> BadDependency:
+        raise RuntimeError("unit test")
+
+    @tidi.inject
+    async def my_func(
+        a: tidi.Injected[GoodDependency] = tidi.Provider(good_ctx_mgr),
+        b: tidi.Injected[BadDependency] = tidi.Provider(load_bad_dependency),
+    ) -> str:
+        return f"{a} {b}"
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(my_func())
+    assert mutatable_var["state"] == "after_exiting_context"
+
+
+def test_injecting_async_provider_into_sync_func_fails():
+    class AsyncOnlyDependency(str):
+        ...
+
+    async def load_dependency() -> AsyncOnlyDependency:
+        return AsyncOnlyDependency("async world")
+
+    with pytest.raises(tidi.resolver.DependencyResolutionError):
+
+        @tidi.inject
+        def my_func(b: tidi.Injected[AsyncOnlyDependency] = tidi.Provider(load_dependency)):
+            return b
+
+
+def test_singleton_provider_is_only_called_once():
+    class SingletonDependency(str):
+        ...
+
+    calls = []
+
+    def load_dependency() -> SingletonDependency:
+        calls.append("called")
+        return SingletonDependency("singleton")
+
+    @tidi.inject
+    def my_func(
+        b: t.Annotated[tidi.Injected[SingletonDependency], tidi.Scope.SINGLETON] = tidi.Provider(
+            load_dependency
+        ),
+    ) -> SingletonDependency:
+        return b
+
+    assert my_func() is my_func()
+    assert calls == ["called"]
+
+
+def test_singleton_context_manager_provider_is_exited_at_shutdown():
+    class SingletonDependency(str):
+        ...
+
+    mutatable_var = {"state": "before_entering_context"}
+
+    @contextlib.contextmanager
+    def dependency_ctx_mgr() -> t.Iterator[SingletonDependency]:
+        mutatable_var["state"] = "after_entering_context"
+        yield SingletonDependency("singleton")
+        mutatable_var["state"] = "after_exiting_context"
+
+    @tidi.inject
+    def my_func(
+        b: t.Annotated[tidi.Injected[SingletonDependency], tidi.Scope.SINGLETON] = tidi.Provider(
+            dependency_ctx_mgr
+        ),
+    ) -> SingletonDependency:
+        return b
+
+    assert my_func() == "singleton"
+    assert mutatable_var["state"] == "after_entering_context"
+    tidi.shutdown()
+    assert mutatable_var["state"] == "after_exiting_context"
+
+
+def test_singleton_scope_in_field_factory():
+    class SingletonFieldDependency:
+        ...
+
+    @dataclass
+    class MyDataClass:
+        b: SingletonFieldDependency = field(
+            default_factory=tidi.field_factory(SingletonFieldDependency, scope=tidi.Scope.SINGLETON)
+        )
+
+    assert MyDataClass().b is MyDataClass().b
+
+
+def test_cached_registry_lookups_are_per_thread():
+    class PerThreadDependency(str):
+        ...
+
+    @tidi.inject
+    def my_func(b: tidi.Injected[PerThreadDependency] = tidi.UNSET) -> str:
+        return b
+
+    results = {}
+
+    def run(name: str):
+        tidi.register(PerThreadDependency(name))
+        results[name] = [my_func(), my_func()]
+
+    threads = [threading.Thread(target=run, args=(name,)) for name in ("first", "second")]
+    for thread in threads:
+        thread.start()
+        thread.join()
+    assert results == {"first": ["first", "first"], "second": ["second", "second"]}
+
+
+def test_providers_dependencies_are_injected():
+    class Config(str):
+        ...
+
+    class Pool:
+        def __init__(self, config: Config) -> None:
+            self.config = config
+
+    class Repository:
+        def __init__(self, pool: Pool) -> None:
+            self.pool = pool
+
+    def load_config() -> Config:
+        return Config("db://")
+
+    def create_pool(config: tidi.Injected[Config] = tidi.Provider(load_config)) -> Pool:
+        return Pool(config)
+
+    @contextlib.contextmanager
+    def open_repository(
+        pool: tidi.Injected[Pool] = tidi.Provider(create_pool),
+    ) -> t.Iterator[Repository]:
+        yield Repository(pool)
+
+    @tidi.inject
+    def my_func(repository: tidi.Injected[Repository] = tidi.Provider(open_repository)) -> str:
+        return repository.pool.config
+
+    assert my_func() == "db://"
+
+
+def test_initialised_dependencies_are_injected():
+    class Settings(str):
+        ...
+
+    class Service:
+        def __init__(self, settings: tidi.Injected[Settings] = tidi.UNSET) -> None:
+            self.settings = settings
+
+    tidi.register(Settings("registered"))
+
+    @tidi.inject
+    def my_func(service: tidi.Injected[Service] = tidi.UNSET) -> str:
+        return service.settings
+
+    assert my_func() == "registered"
+
+
+def test_shared_dependency_is_resolved_once_per_call():
+    class SharedDependency:
+        ...
+
+    class Dependant:
+        def __init__(self, shared: SharedDependency) -> None:
+            self.shared = shared
+
+    calls = []
+
+    def load_shared() -> SharedDependency:
+        calls.append("shared")
+        return SharedDependency()
+
+    def load_dependant(
+        shared: tidi.Injected[SharedDependency] = tidi.Provider(load_shared),
+    ) -> Dependant:
+        return Dependant(shared)
+
+    @tidi.inject
+    def my_func(
+        a: tidi.Injected[Dependant] = tidi.Provider(load_dependant),
+        b: tidi.Injected[SharedDependency] = tidi.Provider(load_shared),
+    ) -> bool:
+        return a.shared is b
+
+    assert my_func()
+    assert my_func()
+    assert calls == ["shared", "shared"]
+
+
+def test_async_shared_dependency_is_resolved_once_per_call():
+    class AsyncSharedDependency:
+        ...
+
+    class SyncDependant:
+        def __init__(self, shared: AsyncSharedDependency) -> None:
+            self.shared = shared
+
+    calls = []
+
+    async def load_shared() -> AsyncSharedDependency:
+        calls.append("shared")
+        await asyncio.sleep(0)
+        return AsyncSharedDependency()
+
+    def load_dependant(
+        shared: tidi.Injected[AsyncSharedDependency] = tidi.Provider(load_shared),
+    ) -> SyncDependant:
+        return SyncDependant(shared)
+
+    @tidi.inject
+    async def my_func(
+        a: tidi.Injected[SyncDependant] = tidi.Provider(load_dependant),
+        b: tidi.Injected[AsyncSharedDependency] = tidi.Provider(load_shared),
+    ) -> bool:
+        return a.shared is b
+
+    assert asyncio.run(my_func())
+    assert calls == ["shared"]
+
+
+def test_dependency_cycle_fails_when_decorating():
+    class Chicken:
+        def __init__(self, egg=tidi.UNSET) -> None:
+            ...
+
+    class Egg:
+        def __init__(self, chicken: tidi.Injected[Chicken] = tidi.UNSET) -> None:
+            ...
+
+    # what `tidi.Injected[Egg]` is, spelt out as it's used as a value
+    injected_egg = t.Annotated[Egg | tidi.Unset | tidi.Provider, tidi.DEFAULT_RESOLVER_OPTIONS]
+    Chicken.__init__.__annotations__["egg"] = injected_egg
+
+    with pytest.raises(
+        tidi.resolver.DependencyResolutionError, match="Dependency cycle: Egg -> Chicken -> Egg"
+    ):
+
+        @tidi.inject
+        def my_func(egg: tidi.Injected[Egg] = tidi.UNSET):
+            ...
+
+
+def test_parallel_providers_are_called_concurrently():
+    class SlowConnection(str):
+        ...
+
+    class SlowClient(str):
+        ...
+
+    def connect() -> SlowConnection:
+        time.sleep(0.1)
+        return SlowConnection("connection")
+
+    def create_client() -> SlowClient:
+        time.sleep(0.1)
+        return SlowClient("client")
+
+    @tidi.decorator.inject(tidi.default_tidi_registry, parallel=2)
+    def my_func(
+        a: tidi.Injected[SlowConnection] = tidi.Provider(connect),
+        b: tidi.Injected[SlowClient] = tidi.Provider(create_client),
+    ) -> str:
+        return f"{a} {b}"
+
+    start = time.perf_counter()
+    assert my_func() == "connection client"
+    assert time.perf_counter() - start < 0.19
+
+
+def test_parallel_providers_are_exited_in_reverse_and_first_error_raised():
+    class First(str):
+        ...
+
+    class Second(str):
+        ...
+
+    class Broken(str):
+        ...
+
+    events = []
+
+    def recorder(cls: type) -> t.Callable:
+        @contextlib.contextmanager
+        def provide() -> t.Iterator:
+            time.sleep(0.05 if cls is First else 0)
+            try:
+                yield cls(cls.__name__)
+            finally:
+                events.append(f"exit {cls.__name__}")
+
+        return provide
+
+    def break_() -> Broken:
+        raise ValueError("broken")
+
+    @tidi.decorator.inject(tidi.default_tidi_registry, parallel=True)
+    def my_func(
+        a: tidi.Injected[First] = tidi.Provider(recorder(First)),
+        b: tidi.Injected[Second] = tidi.Provider(recorder(Second)),
+        c: tidi.Injected[Broken] = tidi.Provider(break_),
+    ) -> str:
+        return f"{a} {b} {c}"
+
+    @tidi.decorator.inject(tidi.default_tidi_registry, parallel=True)
+    def my_working_func(
+        a: tidi.Injected[First] = tidi.Provider(recorder(First)),
+        b: tidi.Injected[Second] = tidi.Provider(recorder(Second)),
+    ) -> str:
+        return f"{a} {b}"
+
+    with pytest.raises(ValueError, match="broken"):
+        my_func()
+    assert events == ["exit Second", "exit First"]
+
+    events.clear()
+    assert my_working_func() == "First Second"
+    assert events == ["exit Second", "exit First"]
+
+
+def test_parallel_providers_see_the_callers_registrations():
+    class PerThreadSetting(str):
+        ...
+
+    class Client(str):
+        ...
+
+    class OtherClient(str):
+        ...
+
+    def create_client(setting: tidi.Injected[PerThreadSetting] = tidi.UNSET) -> Client:
+        return Client(setting)
+
+    def create_other_client(setting: tidi.Injected[PerThreadSetting] = tidi.UNSET) -> OtherClient:
+        return OtherClient(setting)
+
+    @tidi.decorator.inject(tidi.default_tidi_registry, parallel=2)
+    def my_func(
+        a: tidi.Injected[Client] = tidi.Provider(create_client),
+        b: tidi.Injected[OtherClient] = tidi.Provider(create_other_client),
+    ) -> str:
+        return f"{a} {b}"
+
+    tidi.register(PerThreadSetting("mine"))
+
+    assert my_func() == "mine mine"
+
+
+def test_lazy_dependency_is_only_resolved_when_used():
+    class AuditLogger:
+        def log(self, message: str) -> str:
+            return f"logged {message}"
+
+    calls = []
+
+    def create_audit_logger() -> AuditLogger:
+        calls.append("created")
+        return AuditLogger()
+
+    @tidi.inject
+    def my_func(
+        fail: bool, audit: tidi.Lazy[AuditLogger] = tidi.Provider(create_audit_logger)
+    ) -> str:
+        if fail:
+            return audit.log("failure")
+        return "ok"
+
+    assert my_func(False) == "ok"
+    assert calls == []
+    assert my_func(True) == "logged failure"
+    assert calls == ["created"]
+
+
+def test_lazy_context_manager_is_exited_when_call_returns():
+    class LazyResource(str):
+        ...
+
+    mutatable_var = {"state": "before_entering_context"}
+
+    @contextlib.contextmanager
+    def open_resource() -> t.Iterator[LazyResource]:
+        mutatable_var["state"] = "after_entering_context"
+        yield LazyResource("resource")
+        mutatable_var["state"] = "after_exiting_context"
+
+    @tidi.inject
+    def my_func(resource: tidi.Lazy[LazyResource] = tidi.Provider(open_resource)):
+        assert mutatable_var["state"] == "before_entering_context"
+        assert resource.upper() == "RESOURCE"
+        assert mutatable_var["state"] == "after_entering_context"
+        return resource
+
+    @tidi.inject
+    def my_unused_func(resource: tidi.Lazy[LazyResource] = tidi.Provider(open_resource)):
+        return resource
+
+    assert my_func() == "resource"
+    assert mutatable_var["state"] == "after_exiting_context"
+
+    escaped = my_unused_func()
+    with pytest.raises(tidi.resolver.DependencyResolutionError):
+        escaped.upper()
+
+
+def test_lazy_async_provider_fails_when_decorating():
+    class LazyAsyncDependency:
+        ...
+
+    async def load() -> LazyAsyncDependency:
+        return LazyAsyncDependency()
+
+    with pytest.raises(tidi.resolver.DependencyResolutionError, match="Lazy"):
+
+        @tidi.inject
+        async def my_func(dep: tidi.Lazy[LazyAsyncDependency] = tidi.Provider(load)):
+            ...
+
+
+def test_preflight_reports_every_problem_at_once():
+    class Missing:
+        ...
+
+    class NeedsArg:
+        def __init__(self, arg: int) -> None:
+            ...
+
+    tidi_registry = tidi.registry.TidiRegistry()
+    registry_only = tidi.resolver.ResolverOptions(use_registry=True, initialise_missing=False)
+
+    @tidi.decorator.inject(tidi_registry)
+    def my_func(
+        missing: t.Annotated[Missing | tidi.Unset, registry_only] = tidi.UNSET,
+        needs_arg: tidi.Injected[NeedsArg] = tidi.UNSET,
+    ):
+        ...
+
+    @tidi.decorator.inject(tidi_registry)
+    def fine_func(missing: t.Annotated[Missing | tidi.Unset, registry_only] = tidi.UNSET):
+        ...
+
+    with pytest.raises(tidi.decorator.PreflightError) as exc_info:
+        tidi.preflight(my_func, fine_func)
+
+    missing, needs_arg, also_missing = exc_info.value.problems
+    assert "my_func, parameter 'missing'" in missing
+    assert "Missing has not been registered" in missing
+    assert "my_func, parameter 'needs_arg'" in needs_arg
+    assert "NeedsArg is unable to be initialised" in needs_arg
+    assert "fine_func, parameter 'missing'" in also_missing
+    tidi_registry.register(Missing())
+    tidi.preflight(fine_func)
+
+
+def test_preflight_warms_singletons():
+    class Expensive:
+        ...
+
+    created = []
+
+    def provide() -> Expensive:
+        created.append(Expensive())
+        return created[-1]
+
+    @tidi.inject
+    def my_func(
+        expensive: t.Annotated[tidi.Injected[Expensive], tidi.Scope.SINGLETON] = tidi.Provider(
+            provide
+        ),
+    ) -> Expensive:
+        return expensive
+
+    tidi.preflight(my_func, warm=True)
+    assert len(created) == 1
+    assert my_func() is created[0]
+    assert len(created) == 1
+
+
+def test_injecting_into_class_keeps_it_a_class():
+    class ClassDependency:
+        ...
+
+    class Base:
+        ...
+
+    @tidi.inject
+    class MyClass(Base):
+        def __init__(self, a: str, b: tidi.Injected[ClassDependency] = tidi.UNSET):
+            self.a = a
+            self.b = b
+
+    obj = MyClass("hello")
+
+    assert isinstance(MyClass, type)
+    assert isinstance(obj, MyClass) and isinstance(obj, Base)
+    assert isinstance(obj.b, ClassDependency)
+    assert MyClass.__init__.__qualname__.endswith("MyClass.__init__")
+
+
+def test_injecting_into_class_without_python_init_raises():
+    class Plain:
+        ...
+
+    class Mapping(dict):
+        ...
+
+    with pytest.raises(tidi.resolver.DependencyResolutionError, match="above `@dataclass`"):
+        tidi.inject(Plain)
+    with pytest.raises(tidi.resolver.DependencyResolutionError):
+        tidi.inject(Mapping)
+    assert Plain.__init__ is object.__init__
+
+
+def test_injecting_below_dataclass_raises():
+    class DataClassDependency:
+        ...
+
+    with pytest.raises(tidi.resolver.DependencyResolutionError, match="above `@dataclass`"):
+
+        @dataclass
+        @tidi.inject
+        class Wrong:
+            db: tidi.Injected[DataClassDependency] = tidi.UNSET
+
+
+def test_injecting_into_dataclass():
+    class DataClassDependency:
+        ...
+
+    class OtherDataClassDependency:
+        ...
+
+    provided = OtherDataClassDependency()
+
+    @tidi.inject
+    @dataclass
+    class MyDataClass:
+        a: str
+        b: tidi.Injected[DataClassDependency] = tidi.UNSET
+        c: tidi.Injected[OtherDataClassDependency] = tidi.Provider(lambda: provided)
+
+    obj = MyDataClass("hello")
+    passed = DataClassDependency()
+
+    assert obj.a == "hello"
+    assert isinstance(obj.b, DataClassDependency)
+    assert obj.c is provided
+    assert MyDataClass("hello", b=passed).b is passed
+    assert dataclasses.is_dataclass(MyDataClass)
+    tidi.preflight(MyDataClass)
+
+
+def test_field_factory_context_manager_stays_open_until_released():
+    class Connection:
+        def __init__(self) -> None:
+            self.closed = False
+
+    @contextlib.contextmanager
+    def connect() -> t.Iterator[Connection]:
+        connection = Connection()
+        yield connection
+        connection.closed = True
+
+    @tidi.inject
+    @dataclass
+    class MyDataClass:
+        connection: Connection = field(default_factory=tidi.field_factory(Connection, connect))
+
+        def close(self) -> None:
+            tidi.release(self)
+
+    obj = MyDataClass()
+    assert not obj.connection.closed
+    obj.close()
+    assert obj.connection.closed
+    obj.close()
+
+
+def test_injected_subclass_and_base_class_context_managers_are_all_exited():
+    class Connection(str):
+        ...
+
+    class Cache(str):
+        ...
+
+    exited = []
+
+    @contextlib.contextmanager
+    def connect() -> t.Iterator[Connection]:
+        yield Connection("connection")
+        exited.append("connection")
+
+    @contextlib.contextmanager
+    def open_cache() -> t.Iterator[Cache]:
+        yield Cache("cache")
+        exited.append("cache")
+
+    @tidi.inject
+    class Base:
+        def __init__(self, connection: tidi.Injected[Connection] = tidi.Provider(connect)):
+            self.connection = connection
+
+    @tidi.inject
+    class Service(Base):
+        def __init__(self, cache: tidi.Injected[Cache] = tidi.Provider(open_cache)):
+            super().__init__()
+            self.cache = cache
+
+    tidi.release(Service())
+    assert exited == ["cache", "connection"]
+
+    Service()  # collected straight away
+    assert exited == ["cache", "connection"] * 2
+
+
+def test_field_factory_context_manager_is_exited_when_instance_is_collected():
+    class Connection:
+        ...
+
+    pool = tidi.Pool(Connection, max_size=1, timeout=0)
+
+    @tidi.inject
+    @dataclass
+    class MyDataClass:
+        connection: Connection = field(default_factory=tidi.field_factory(Connection, pool))
+
+    first = MyDataClass().connection  # the instance is collected straight away
+    assert MyDataClass().connection is first
+    assert pool.idle == 1
+
+
+def test_field_factory_context_manager_requires_injected_class():
+    @contextlib.contextmanager
+    def connect() -> t.Iterator[str]:
+        yield "connection"
+
+    @dataclass
+    class MyDataClass:
+        connection: str = field(default_factory=tidi.field_factory(str, connect))
+
+    with pytest.raises(tidi.resolver.DependencyResolutionError):
+        MyDataClass()
+
+
+def test_bind_resolves_dependencies_once_for_a_batch():
+    class BatchDependency:
+        ...
+
+    entered = []
+    exited = []
+
+    @contextlib.contextmanager
+    def provide() -> t.Iterator[BatchDependency]:
+        entered.append(BatchDependency())
+        yield entered[-1]
+        exited.append(entered[-1])
+
+    @tidi.inject
+    def my_func(record: int, dep: tidi.Injected[BatchDependency] = tidi.Provider(provide)):
+        return record, dep
+
+    with my_func.bind() as bound:
+        results = [bound(record) for record in range(3)]
+        assert not exited
+
+    assert results == [(record, entered[0]) for record in range(3)]
+    assert exited == entered
+
+
+def test_map_streams_results_lazily():
+    class MapDependency:
+        ...
+
+    created = []
+
+    def provide() -> MapDependency:
+        created.append(MapDependency())
+        return created[-1]
+
+    @tidi.inject
+    def my_func(a: int, b: int, dep: tidi.Injected[MapDependency] = tidi.Provider(provide)):
+        return a + b
+
+    results = my_func.map([1, 2, 3], [10, 20, 30])
+    assert not created
+    assert list(results) == [11, 22, 33]
+    assert len(created) == 1
+
+
+def test_async_map_resolves_dependencies_once():
+    class AsyncMapDependency:
+        ...
+
+    created = []
+
+    async def provide() -> AsyncMapDependency:
+        created.append(AsyncMapDependency())
+        return created[-1]
+
+    @tidi.inject
+    async def my_func(
+        record: int, dep: tidi.Injected[AsyncMapDependency] = tidi.Provider(provide)
+    ) -> tuple[int, AsyncMapDependency]:
+        return record, dep
+
+    async def main():
+        return [result async for result in my_func.map(range(3))]
+
+    assert asyncio.run(main()) == [(record, created[0]) for record in range(3)]
+    assert len(created) == 1
+
+
+def test_request_scoped_dependency_is_shared_by_nested_calls():
+    class Session:
+        def __init__(self) -> None:
+            self.closed = False
+
+    sessions = []
+
+    @contextlib.contextmanager
+    def open_session() -> t.Iterator[Session]:
+        sessions.append(Session())
+        yield sessions[-1]
+        sessions[-1].closed = True
+
+    RequestSession = t.Annotated[tidi.Injected[Session], tidi.Scope.REQUEST]
+
+    @tidi.inject
+    def inner(session: RequestSession = tidi.Provider(open_session)) -> Session:
+        return session
+
+    @tidi.inject
+    def outer(session: RequestSession = tidi.Provider(open_session)) -> tuple[Session, Session]:
+        found = inner()
+        assert not session.closed
+        return session, found
+
+    first, second = outer()
+    assert first is second
+    assert first.closed
+    assert len(sessions) == 1
+    assert outer()[0] is not first
+
+
+def test_request_scope_spans_separate_injected_calls():
+    class RequestDependency:
+        ...
+
+    @tidi.inject
+    def my_func(
+        dep: t.Annotated[tidi.Injected[RequestDependency], tidi.Scope.REQUEST] = tidi.UNSET
+    ) -> RequestDependency:
+        return dep
+
+    with tidi.request_scope():
+        first = my_func()
+        assert my_func() is first
+    assert my_func() is not first
+
+
+def test_map_request_scope_is_only_open_for_its_own_calls():
+    class Session:
+        def __init__(self) -> None:
+            self.closed = False
+
+    @contextlib.contextmanager
+    def open_session() -> t.Iterator[Session]:
+        session = Session()
+        yield session
+        session.closed = True
+
+    RequestSession = t.Annotated[tidi.Injected[Session], tidi.Scope.REQUEST]
+
+    @tidi.inject
+    def inner(session: RequestSession = tidi.Provider(open_session)) -> Session:
+        return session
+
+    @tidi.inject
+    def outer(record: int, session: RequestSession = tidi.Provider(open_session)) -> Session:
+        assert inner() is session and not session.closed
+        return session
+
+    first, second = outer.map(range(2)), outer.map(range(2))
+    first_session, second_session = next(first), next(second)
+    assert first_session is not second_session
+    assert inner() not in (first_session, second_session)  # in neither batch's scope
+    first.close()
+    assert first_session.closed
+    assert next(second) is second_session
+    assert not second_session.closed
+
+
+def test_async_request_scoped_dependency_is_shared_by_nested_calls():
+    class AsyncSession:
+        ...
+
+    sessions = []
+
+    @contextlib.asynccontextmanager
+    async def open_session() -> t.AsyncIterator[AsyncSession]:
+        sessions.append(AsyncSession())
+        yield sessions[-1]
+
+    RequestSession = t.Annotated[tidi.Injected[AsyncSession], tidi.Scope.REQUEST]
+
+    @tidi.inject
+    async def inner(session: RequestSession = tidi.Provider(open_session)) -> AsyncSession:
+        return session
+
+    @tidi.inject
+    async def outer(session: RequestSession = tidi.Provider(open_session)) -> bool:
+        return session is await inner()
+
+    assert asyncio.run(outer())
+    assert len(sessions) == 1
+
+
+class ProcessDependency:
+    def __init__(self, value: str = "from a factory") -> None:
+        self.value = value
+
+
+class OtherProcessDependency(ProcessDependency):
+    ...
+
+
+@tidi.inject
+def read_in_worker(
+    suffix: str,
+    dep: tidi.Injected[ProcessDependency] = tidi.UNSET,
+    other: tidi.Injected[OtherProcessDependency] = tidi.UNSET,
+) -> str:
+    return f"{dep.value} & {other.value}{suffix}"
+
+
+def test_process_pool_workers_are_given_the_registry():
+    snapshot = tidi.registry.RegistrySnapshot(
+        instances={ProcessDependency: ProcessDependency("pickled")},
+        factories={OtherProcessDependency: OtherProcessDependency},
+    )
+
+    with tidi.process_pool(1, snapshot, mp_context=multiprocessing.get_context("spawn")) as pool:
+        assert list(pool.map(read_in_worker, "!?")) == [
+            "pickled & from a factory!",
+            "pickled & from a factory?",
+        ]
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="forking isn't supported")
+def test_workers_forked_from_frozen_registry_restore_snapshot():
+    tidi_registry = tidi.registry.TidiRegistry()
+    tidi_registry.register(ProcessDependency("registered"))
+    tidi_registry.freeze()
+    snapshot = tidi.registry.RegistrySnapshot(
+        instances={OtherProcessDependency: OtherProcessDependency("from the snapshot")}
+    )
+
+    @tidi.decorator.inject(tidi_registry)
+    def read(
+        dep: tidi.Injected[ProcessDependency] = tidi.UNSET,
+        other: tidi.Injected[OtherProcessDependency] = tidi.UNSET,
+    ) -> str:
+        return f"{dep.value} & {other.value}"
+
+    read_pipe, write_pipe = os.pipe()
+    pid = os.fork()
+    if pid == 0:  # pragma: no cover, in the child
+        snapshot.restore(tidi_registry)
+        os.write(write_pipe, f"{tidi_registry.frozen}: {read()}".encode())
+        os._exit(0)
+    os.waitpid(pid, 0)
+    reply = os.read(read_pipe, 100)
+    os.close(read_pipe)
+    os.close(write_pipe)
+
+    assert reply == b"True: registered & from the snapshot"
+    assert tidi_registry.get(OtherProcessDependency, None) is None
+
+
+def test_inject_active_uses_activated_child_registry():
+    class TenantDependency(str):
+        ...
+
+    @tidi.inject_active
+    def my_func(dep: tidi.Injected[TenantDependency] = tidi.UNSET) -> str:
+        return dep
+
+    tidi.register(TenantDependency("default"))
+    tenant_registry = tidi.default_tidi_registry.child()
+    tenant_registry.register(TenantDependency("tenant"))
+
+    assert my_func() == "default"
+    with tenant_registry.activate():
+        assert my_func() == "tenant"
+    assert my_func() == "default"